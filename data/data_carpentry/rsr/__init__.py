@@ -0,0 +1,4 @@
+# rsr: local (non-Earth Engine) building blocks for the remote sensing resistance workflow.
+# The Earth Engine versions of these calculations live in rsr/earthengine.py (used by
+# data/data_carpentry/29_ee-get-frap-derived-imagery.py) and in
+# ee-remote-sensing-resistance/rsr-functions.js. Run python -m rsr --help for the command line.
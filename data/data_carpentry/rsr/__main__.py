@@ -0,0 +1,146 @@
+# The command line of the pipeline: python -m rsr <command> ...
+#
+#   export      export every fire's image from Earth Engine (see rsr.earthengine.export_fires())
+#   local       calculate every fire's image with the local backend, tile by tile (see rsr.tiles)
+#   quicklook   render severity quick-looks of per-fire rasters (see rsr.quicklook)
+#   benchmark   benchmark the local backend (see rsr.benchmark)
+#
+# Each command imports what it needs only when it runs, so python -m rsr --help (and a dry run,
+# which only compares the fires with the journal or the rasters already on disk) starts quickly and
+# never talks to Earth Engine.
+#
+#   python -m rsr export --dry-run
+#   python -m rsr export --project my-project
+#   python -m rsr local ../data/local ../data_output/local-rasters --fire-ids 000000000000000002a4
+#   python -m rsr quicklook ../data_output/local-rasters ../data_output/quicklooks
+
+import argparse
+import importlib
+import os
+import sys
+
+METADATA_PATH = '../data_output/ee_fire-samples/fires-strat-samples_metadata_2018_48-day-window_L4578_none-interp_all.csv'
+JOURNAL_PATH = '../data_output/frap-derived-fire-imagery_export-journal.sqlite'
+RASTERS_DIR = '../data_output/wildfire-severity_sierra-nevada-ca-usa_ypmc_1984-2018_rasters'
+
+# Commands that hand their arguments to the main() of a module
+MODULE_COMMANDS = {'quicklook': 'rsr.quicklook', 'benchmark': 'rsr.benchmark'}
+
+
+# add_fire_arguments() adds the arguments that pick the fires and the image to calculate
+def add_fire_arguments(parser):
+    parser.add_argument('--metadata', default=METADATA_PATH, help='the fire metadata .csv')
+    parser.add_argument('--min-year', type=int, default=1984, help='the earliest alarm year')
+    parser.add_argument('--time-window', type=int, default=48, help='days of Landsat imagery before the fire')
+    parser.add_argument('--resample-method', default='none', choices=['none', 'bilinear', 'bicubic'])
+    parser.add_argument('--sats', nargs='+', default=['4', '5', '7', '8'], choices=['4', '5', '7', '8'])
+    parser.add_argument('--full', action='store_true', help='store all 50 bands (rather than the compact layout)')
+    parser.add_argument('--float', action='store_true', help='store float32 (rather than int16) values')
+    parser.add_argument('--dry-run', action='store_true', help='only list the fires left to do')
+
+
+def export(args):
+    from rsr import earthengine
+    from rsr.fires import read_fire_metadata
+
+    if args.project is not None:
+        earthengine.initialize(project=args.project)
+
+    fire_index = read_fire_metadata(args.metadata, min_year=args.min_year)
+    remaining_fire_ids = earthengine.export_fires(fire_index, args.time_window, args.resample_method, args.sats,
+                                                  args.journal, args.rasters_dir, folder=args.folder,
+                                                  compact=not args.full, encoded=not args.float, dry_run=args.dry_run,
+                                                  max_in_flight=args.max_in_flight, n_workers=args.workers)
+
+    if args.dry_run:
+        for fire_id in remaining_fire_ids:
+            print(fire_id)
+
+    return 0
+
+
+def local(args):
+    from rsr.fires import read_fire_metadata
+
+    fire_index = read_fire_metadata(args.metadata, min_year=args.min_year)
+    fire_ids = fire_index.get_fire_ids()
+    alarm_dates = fire_index.get_alarm_dates()
+    wanted = set(args.fire_ids or fire_ids)
+
+    # Rasters are named (and numbered) like the exports from Earth Engine; those already on disk are kept
+    paths = {fire_ids[i]: os.path.join(args.output, str(alarm_dates[i]) + "_" + str(i + 1).zfill(5) + "_" +
+                                       fire_ids[i] + "_epsg3310.tif")
+             for i in range(0, len(fire_ids)) if fire_ids[i] in wanted}
+    remaining_fire_ids = [fire_id for fire_id in fire_ids if fire_id in paths and not os.path.exists(paths[fire_id])]
+    print(str(len(remaining_fire_ids)) + " of " + str(len(paths)) + " fires left to calculate.")
+
+    if args.dry_run:
+        for fire_id in remaining_fire_ids:
+            print(fire_id)
+        return 0
+
+    from rsr.io import LocalSource
+    from rsr.local import read_fires
+    from rsr.sidecar import write_sidecar
+    from rsr.tiles import assess_fire_tiled
+
+    source = LocalSource.from_directory(args.data_dir)
+    os.makedirs(args.output, exist_ok=True)
+
+    for fire in read_fires(args.metadata, args.min_year, remaining_fire_ids):
+        path = assess_fire_tiled(fire, args.time_window, args.resample_method, args.sats, source, paths[fire.fire_id],
+                                 compact=not args.full, encoded=not args.float, tile_size=args.tile_size,
+                                 n_workers=args.workers)
+
+        if path is not None and not args.full:
+            write_sidecar(path, fire.fire_id, fire.alarm_date)
+
+        print(fire.fire_id + ": " + ("no imagery" if path is None else path))
+
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='python -m rsr',
+                                     description='Calculate, export, and check the per-fire imagery.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    export_parser = commands.add_parser('export', help='export every fire from Earth Engine')
+    add_fire_arguments(export_parser)
+    export_parser.add_argument('--journal', default=JOURNAL_PATH, help='the export journal (.sqlite)')
+    export_parser.add_argument('--rasters-dir', default=RASTERS_DIR, help='where the sidecars go')
+    export_parser.add_argument('--folder', default='ee/frap-derived-fire-imagery', help='the Google Drive folder')
+    export_parser.add_argument('--project', help='the Google Cloud project for Earth Engine')
+    export_parser.add_argument('--max-in-flight', type=int, default=20, help='tasks running at once')
+    export_parser.add_argument('--workers', type=int, default=8, help='threads preparing exports')
+    export_parser.set_defaults(run=export)
+
+    local_parser = commands.add_parser('local', help='calculate every fire with the local backend')
+    local_parser.add_argument('data_dir', help='the local data (see rsr.io.LocalSource.from_directory())')
+    local_parser.add_argument('output', help='the directory to write the rasters to')
+    add_fire_arguments(local_parser)
+    local_parser.add_argument('--fire-ids', nargs='+', help='only these fires (system:index)')
+    local_parser.add_argument('--tile-size', type=int, default=512, help='pixels on each side of a tile')
+    local_parser.add_argument('--workers', type=int, help='processes (default: one per CPU)')
+    local_parser.set_defaults(run=local)
+
+    for name, module in MODULE_COMMANDS.items():
+        commands.add_parser(name, help='see python -m ' + module + ' --help', add_help=False)
+
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) > 0 and argv[0] in MODULE_COMMANDS:
+        return importlib.import_module(MODULE_COMMANDS[argv[0]]).main(argv[1:])
+
+    args = get_parser().parse_args(argv)
+
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
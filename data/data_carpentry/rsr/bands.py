@@ -0,0 +1,46 @@
+# Band names for the per-fire rasters.
+#
+# BAND_NAMES is the order of the 50 bands in each exported .geoTIFF (the order in which
+# get_variables() adds them), using the names given to them in
+# 30_configure_frap-derived-imagery-metadata.R and
+# 31_basic-manipulations-of-remote-sensing-resistance-rasters.R
+
+PIXEL_RADII = [1, 2, 3, 4]
+
+# Surface reflectance (and brightness temperature) bands, named as in Landsat 4, 5, and 7
+LANDSAT_BANDS = ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7']
+
+# Landsat 8 bands that match the wavelengths of LANDSAT_BANDS, in the same order
+# (see merge_collections())
+L8_BANDS = ['B2', 'B3', 'B4', 'B5', 'B6', 'B10', 'B7']
+
+SPECTRAL_INDICES = ['ndvi', 'nbr', 'ndmi']
+
+SEVERITY_BANDS = ['rdnbr', 'prefire_nbr', 'postfire_nbr', 'rdndvi', 'rbr', 'prefire_ndvi', 'postfire_ndvi']
+
+NEIGHBORHOOD_BANDS = [name
+                      for pixel_radius in PIXEL_RADII
+                      for name in ['nbhd_sd_ndvi_' + str(pixel_radius), 'nbhd_mean_ndvi_' + str(pixel_radius)]]
+
+DATE_BANDS = ['date', 'ordinal_day', 'alarm_year', 'alarm_month', 'alarm_day']
+
+LONLAT_BANDS = ['longitude', 'latitude']
+
+TERRAIN_BANDS = (['ypmc', 'slope', 'aspect'] +
+                 ['topo_roughness_' + str(pixel_radius) for pixel_radius in PIXEL_RADII] +
+                 ['elevation'])
+
+RAW_BANDS = ([band + '_prefire' for band in LANDSAT_BANDS] +
+             [band + '_postfire' for band in LANDSAT_BANDS])
+
+WEATHER_BANDS = ['prefire_erc', 'prefire_fm100', 'prefire_vpd', 'earlyfire_vs', 'earlyfire_hdw', 'earlyfire_vpd']
+
+BAND_NAMES = (SEVERITY_BANDS + NEIGHBORHOOD_BANDS + DATE_BANDS + LONLAT_BANDS + TERRAIN_BANDS +
+              RAW_BANDS + WEATHER_BANDS)
+
+# Bands that are constant across a fire (the date bands) or that follow from each pixel's
+# location (longitude and latitude). The compact layout leaves them out of the rasters and
+# rsr.sidecar rebuilds them when they're needed.
+DERIVED_BANDS = DATE_BANDS + LONLAT_BANDS
+
+COMPACT_BAND_NAMES = [name for name in BAND_NAMES if name not in DERIVED_BANDS]
@@ -0,0 +1,199 @@
+# Benchmarks of each stage of the local backend on synthetic fires (see rsr.synthetic), with
+# regression checks against an earlier run.
+#
+# Each stage is one of the calculations behind the get_* functions in
+# rsr/earthengine.py, timed on its own on a synthetic fire of each size:
+#
+#   mask            mask_cloud_water_snow() on the stack of pre-fire scenes
+#   indices         get_spectral_stack() (NDVI, NBR, NDMI for every scene)
+#   composite       get_median_composite() of the spectral stack
+#   neighborhood    get_neighborhood_stats() of pre-fire NDVI for every pixel radius
+#   terrain         get_topography() (reads and warps the DEM and the mask)
+#   weather         get_weather() (reads, warps, and composites GRIDMET)
+#   get_variables   the whole of assess_whole_fire() for the fire
+#
+# Every stage runs repeat times; the results record the fastest and the median time and the peak
+# memory allocated by the stage (from tracemalloc, in a separate run, so it covers NumPy arrays
+# and Python objects but not memory that GDAL allocates itself). The results are written as JSON,
+# and compared with the results of an earlier run (a baseline) to find regressions:
+#
+#   python -m rsr.benchmark --sizes small medium --output benchmark.json
+#   python -m rsr.benchmark --baseline benchmark.json --output benchmark_new.json
+#
+# The second run exits with status 1 if any stage got slower than time_tolerance (25%) or took
+# more memory than memory_tolerance (10%) beyond its baseline. Times are only comparable between
+# runs on the same machine; memory is comparable anywhere.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from rsr import io, local
+from rsr.bands import LANDSAT_BANDS, PIXEL_RADII, SPECTRAL_INDICES
+from rsr.neighborhood import get_neighborhood_stats
+from rsr.synthetic import SEED, SIZES, write_synthetic_source
+
+STAGES = ['mask', 'indices', 'composite', 'neighborhood', 'terrain', 'weather', 'get_variables']
+
+TIME_WINDOW = 48
+RESAMPLE_METHOD = 'none'
+SATS = ['5', '7', '8']
+
+
+# get_stages() returns a dictionary of stage -> function (taking no arguments) for a synthetic fire
+# whose data are in source, with the inputs of the array stages calculated ahead of time (and
+# get_variables reading scenes in blocks of max_block_mb)
+def get_stages(fire, source, max_block_mb=local.MAX_BLOCK_MB):
+    grid = io.get_fire_grid(fire.geometry.bounds)
+    halo_grid = io.buffer_grid(grid, max(PIXEL_RADII) + 1)
+    (prestart, preend), _ = local.get_landsat_windows(fire.alarm_date, TIME_WINDOW)
+
+    scenes = io.filter_scenes(source.scenes, prestart, preend, fire.geometry.bounds, SATS)
+    raw = [local.read_scene(scene, halo_grid, RESAMPLE_METHOD) for scene in scenes]
+    bands = np.stack([scene_bands for scene_bands, _ in raw])
+    pixel_qa = np.stack([scene_qa for _, scene_qa in raw])
+    masked = local.mask_cloud_water_snow(bands.copy(), pixel_qa)
+    spectral = local.get_spectral_stack(masked)
+    ndvi = spectral[:, len(LANDSAT_BANDS) + SPECTRAL_INDICES.index('ndvi')]
+
+    # Masking is in place (and the same every time), so the mask stage reuses one copy of the bands
+    return {'mask': lambda: local.mask_cloud_water_snow(bands, pixel_qa),
+            'indices': lambda: local.get_spectral_stack(masked),
+            'composite': lambda: local.get_median_composite(spectral),
+            'neighborhood': lambda: get_neighborhood_stats(ndvi, PIXEL_RADII),
+            'terrain': lambda: local.get_topography(source, halo_grid, RESAMPLE_METHOD),
+            'weather': lambda: local.get_weather(fire, source, grid, RESAMPLE_METHOD),
+            'get_variables': lambda: local.assess_whole_fire(TIME_WINDOW, RESAMPLE_METHOD, SATS, source,
+                                                             max_block_mb=max_block_mb)(fire)}
+
+
+# time_stage() returns the time in seconds of each of repeat runs of stage
+def time_stage(stage, repeat):
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+# get_peak_memory() returns the peak memory (in MB) allocated during one run of stage
+def get_peak_memory(stage):
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak / 2 ** 20
+
+
+# run_benchmarks() runs every stage in stages on a synthetic fire of each size in sizes and returns
+# the results (a dictionary that can be written as JSON)
+def run_benchmarks(sizes=('small', 'medium'), stages=STAGES, repeat=5, seed=SEED, data_dir=None,
+                   max_block_mb=local.MAX_BLOCK_MB):
+    results = []
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(data_dir, str(size)) if data_dir is not None else tmp
+            fire = write_synthetic_source(directory, size, seed=seed, sensors=SATS)
+            source = io.LocalSource.from_directory(directory)
+            grid = io.get_fire_grid(fire.geometry.bounds)
+            fire_stages = get_stages(fire, source, max_block_mb)
+
+            for name in stages:
+                # One run first, so that files are in the OS cache for every timed run
+                fire_stages[name]()
+                times = time_stage(fire_stages[name], repeat)
+
+                results.append({'stage': name, 'size': str(size), 'n_pixels': grid.n_rows * grid.n_cols,
+                                'seconds_min': min(times), 'seconds_median': float(np.median(times)),
+                                'peak_mb': get_peak_memory(fire_stages[name])})
+
+    return {'seed': seed, 'repeat': repeat, 'max_block_mb': max_block_mb, 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine(), 'results': results}
+
+
+# find_regressions() compares results with the results of a baseline run, stage by stage and size
+# by size, and returns a description of every stage that got slower (by its fastest time) or took
+# more memory than allowed
+def find_regressions(results, baseline, time_tolerance=0.25, memory_tolerance=0.10):
+    baseline_results = {(result['stage'], result['size']): result for result in baseline['results']}
+    regressions = []
+
+    for result in results['results']:
+        before = baseline_results.get((result['stage'], result['size']))
+        if before is None:
+            continue
+
+        name = result['stage'] + ' (' + result['size'] + ')'
+        if result['seconds_min'] > before['seconds_min'] * (1 + time_tolerance):
+            regressions.append('{}: {:.4f} s, was {:.4f} s'.format(name, result['seconds_min'], before['seconds_min']))
+        if result['peak_mb'] > before['peak_mb'] * (1 + memory_tolerance):
+            regressions.append('{}: {:.1f} MB, was {:.1f} MB'.format(name, result['peak_mb'], before['peak_mb']))
+
+    return regressions
+
+
+def format_results(results):
+    lines = ['{:<14} {:<8} {:>10} {:>12} {:>12} {:>10}'.format('stage', 'size', 'pixels', 'min (s)',
+                                                             'median (s)', 'peak (MB)')]
+    for result in results['results']:
+        lines.append('{:<14} {:<8} {:>10} {:>12.4f} {:>12.4f} {:>10.1f}'.format(
+            result['stage'], result['size'], result['n_pixels'], result['seconds_min'],
+            result['seconds_median'], result['peak_mb']))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m rsr.benchmark',
+                                     description='Benchmark the local backend on synthetic fires.')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'],
+                        help='fire sizes: ' + ', '.join(SIZES) + ', or a number of pixels per side')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--data-dir', help='keep the synthetic data in this directory')
+    parser.add_argument('--max-block-mb', type=float, default=local.MAX_BLOCK_MB,
+                        help='memory for the scenes of each block of a composite')
+    parser.add_argument('--output', help='write the results to this .json file')
+    parser.add_argument('--baseline', help='the .json results of an earlier run to check for regressions')
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--memory-tolerance', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    sizes = [size if size in SIZES else int(size) for size in args.sizes]
+    results = run_benchmarks(sizes, args.stages, args.repeat, args.seed, args.data_dir, args.max_block_mb)
+    print(format_results(results))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print('regression: ' + regression)
+
+        return 1 if len(regressions) > 0 else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
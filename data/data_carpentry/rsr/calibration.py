@@ -0,0 +1,45 @@
+# The calibration of remotely sensed severity to field-measured severity (CBI), from
+# analyses/analyses_output/cbi-calibration-model-comparison.csv.
+#
+# Each row of that file is a model CBI = log((severity - a) / b) / c for one severity metric
+# (response), time window, and interpolation, along with the value of the metric at each CBI
+# threshold between severity classes (Koontz et al. (2019)). Like
+# 31_basic-manipulations-of-remote-sensing-resistance-rasters.R, we use the RBR model for a 48 day
+# window with bicubic interpolation by default.
+
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+CALIBRATION_PATH = '../../analyses/analyses_output/cbi-calibration-model-comparison.csv'
+
+# CalibrationModel is one row of the calibration file: the model's coefficients and the value of
+# the severity metric at a CBI of 0 (unchanged), 0.1 (low_sev), 1.25 (mod_sev), and 2.25 (hi_sev)
+CalibrationModel = namedtuple('CalibrationModel', ['response', 'time_window', 'interpolation',
+                                                   'a', 'b', 'c', 'unchanged', 'low_sev', 'mod_sev', 'hi_sev'])
+
+# Severity classes, in the order of get_severity_class()'s values
+SEVERITY_CLASSES = ['unchanged', 'low', 'moderate', 'high']
+
+
+# read_calibration_model() returns the CalibrationModel for a severity metric, time window, and
+# interpolation
+def read_calibration_model(path=CALIBRATION_PATH, response='RBR', time_window=48, interpolation='bicubic'):
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if (row['response'] == response and int(row['time_window']) == time_window and
+                    row['interpolation'] == interpolation):
+                return CalibrationModel(response, time_window, interpolation,
+                                        *[float(row[column]) for column in CalibrationModel._fields[3:]])
+
+    raise ValueError('no calibration model for ' + response + ', ' + str(time_window) + ' days, ' + interpolation)
+
+
+# get_severity_class() returns the severity class (an index into SEVERITY_CLASSES) of every value of
+# the severity metric, or -1 where it is masked (NaN)
+def get_severity_class(severity, model):
+    classes = np.digitize(severity, [model.low_sev, model.mod_sev, model.hi_sev]).astype(np.int8)
+
+    return np.where(np.isnan(severity), -1, classes).astype(np.int8)
+
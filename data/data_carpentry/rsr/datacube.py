@@ -0,0 +1,290 @@
+# A single chunked, compressed HDF5 store ("datacube") holding every per-fire raster, with an
+# index of the fires in it.
+#
+# Once the per-fire rasters are downloaded, any analysis across fires has to list the rasters
+# directory, take each fire id out of a filename, and open ~1,100 GeoTIFFs.
+# build_datacube() packs all of them into one .h5 file instead, and DataCube reads any fire, band,
+# or window of it (or one band across every fire) after opening just that file:
+#
+#   build_datacube(glob.glob(os.path.join(rasters_dir, '*.tif')),
+#                  '../data_output/wildfire-severity_sierra-nevada-ca-usa_ypmc_1984-2018_datacube.h5')
+#   with DataCube(path) as cube:
+#       cube.fires['000000000000000002a4']        the CubeRecord of a fire (alarm date, grid)
+#       cube.fires.with_alarm_date('19870830')   the CubeRecords of the fires with that alarm date
+#       cube.read_band(fire_id, 'rbr')           one band of a fire (rows x cols)
+#       cube.read(fire_id, window=((0, 100), (0, 100)))
+#                                                all 50 bands of the first 100 x 100 pixels
+#       cube.read_pixels('rbr')                  rbr at every pixel inside a perimeter, every fire
+#
+# Layout of the file:
+#   /index/<column>   one row per fire, in order of alarm date: fire_id, alarm_date (milliseconds
+#                     since the epoch), filename, the fire's grid (x_min, y_max, scale, n_rows,
+#                     n_cols), and offset (where the fire's pixels start in each band)
+#   /bands/<band>     one 1-D dataset per band of rsr.bands.COMPACT_BAND_NAMES: the pixels of
+#                     every fire, one fire after another, each fire's pixels in row-major order.
+#                     Each band is stored with the data type, scale, and offset of its BandFormat
+#                     (see rsr.output_format; a uint8 for the ypmc mask) and the nodata value of
+#                     that type, all in the dataset's attributes.
+#   /footprint        a bit for every pixel of every fire (in the same order as the bands), set if
+#                     the pixel is inside its fire's perimeter, packed 8 pixels to a byte
+#
+# Fires have different grids, so the bands are "ragged" arrays rather than fires x rows x cols:
+# a window of a fire is a contiguous run of rows and only the chunks under those rows are read.
+# The date and longitude/latitude bands are rebuilt from the index (as for the compact layout,
+# see rsr.sidecar), so they take no space.
+
+import csv
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from rsr import io
+from rsr.bands import BAND_NAMES, COMPACT_BAND_NAMES, DERIVED_BANDS
+from rsr.fires import FireIndex
+from rsr.local import get_date_bands
+from rsr.output_format import BAND_FORMATS
+from rsr.sidecar import FireRaster, get_raster_fire, rebuild_band
+
+# Pixels per chunk of each band
+CHUNK_SIZE = 2 ** 16
+
+# CubeRecord is a fire in the datacube: its fire id, alarm date (milliseconds since the epoch),
+# position in the datacube (starting at 1), the raster it came from, its grid, and where its
+# pixels start in each band
+CubeRecord = namedtuple('CubeRecord', ['fire_id', 'alarm_date', 'order', 'filename', 'grid', 'offset'])
+
+INDEX_COLUMNS = ['fire_id', 'alarm_date', 'filename', 'x_min', 'y_max', 'scale', 'n_rows', 'n_cols', 'offset']
+
+
+# get_nodata() returns the nodata value of a storage data type: the smallest int16 or the
+# largest uint8
+def get_nodata(dtype):
+    return -32768 if dtype == 'int16' else 255
+
+
+# encode_band() converts one band (float, NaN where masked) to its stored values in the data type
+# of its BandFormat
+def encode_band(values, name):
+    band_format = BAND_FORMATS[name]
+    nodata = get_nodata(band_format.dtype)
+    info = np.iinfo(band_format.dtype)
+    lowest, highest = (info.min + 1, info.max) if nodata == info.min else (info.min, info.max - 1)
+
+    with np.errstate(invalid='ignore'):
+        stored = np.clip(np.round((values - band_format.offset) / band_format.scale), lowest, highest)
+
+    return np.where(np.isnan(values), nodata, stored).astype(band_format.dtype)
+
+
+# decode_band() converts stored values of one band back to float32, with NaN where masked
+def decode_band(stored, name):
+    band_format = BAND_FORMATS[name]
+    values = stored * band_format.scale + band_format.offset
+
+    return np.where(stored == get_nodata(band_format.dtype), np.nan, values).astype(np.float32)
+
+
+# write_index_csv() writes the index of a datacube to a .csv file (INDEX_COLUMNS), so the fire ids
+# of the rasters can be looked up without parsing filenames (see
+# 30_configure_frap-derived-imagery-metadata.R)
+def write_index_csv(path, fires):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_COLUMNS)
+
+        for fire in fires:
+            writer.writerow([fire.fire_id, fire.alarm_date, fire.filename, repr(fire.grid.x_min),
+                             repr(fire.grid.y_max), repr(fire.grid.scale), fire.grid.n_rows,
+                             fire.grid.n_cols, fire.offset])
+
+
+# unpack_bits() returns bits start through stop - 1 of a 1-D dataset of packed bits (like
+# /footprint) as a boolean array, reading only the bytes that hold them
+def unpack_bits(dataset, start, stop):
+    packed = dataset[start // 8:(stop + 7) // 8]
+
+    return np.unpackbits(packed)[start % 8:start % 8 + stop - start].astype(bool)
+
+
+# get_index_csv_path() returns the path of the .csv index written alongside a datacube
+def get_index_csv_path(path):
+    return os.path.splitext(path)[0] + '_index.csv'
+
+
+# build_datacube() packs the per-fire rasters in raster_paths (in either layout, float32 or int16)
+# into a datacube at path, one fire at a time, and writes its index to a .csv file alongside it.
+# Returns the index of the fires (a FireIndex of CubeRecords).
+def build_datacube(raster_paths, path, chunk_size=CHUNK_SIZE, compression_level=4):
+    import h5py
+
+    rasters = [FireRaster(raster_path) for raster_path in raster_paths]
+    raster_fires = [get_raster_fire(raster) for raster in rasters]
+    raster_by_id = {fire_id: raster for (fire_id, _), raster in zip(raster_fires, rasters)}
+
+    ordered = FireIndex([CubeRecord(fire_id, alarm_date, None, os.path.basename(raster.path), raster.grid, None)
+                         for (fire_id, alarm_date), raster in zip(raster_fires, rasters)])
+
+    # Each fire's pixels start where the previous fire's end
+    records = []
+    offset = 0
+    for fire in ordered:
+        records.append(fire._replace(offset=offset))
+        offset += fire.grid.n_rows * fire.grid.n_cols
+    fires = FireIndex(records)
+    n_pixels = offset
+
+    chunks = (max(1, min(chunk_size, n_pixels)),)
+    dataset_options = {'chunks': chunks, 'compression': 'gzip', 'compression_opts': compression_level,
+                       'shuffle': True}
+
+    with h5py.File(path, 'w') as f:
+        f.attrs['crs'] = io.CRS
+        f.attrs['band_names'] = COMPACT_BAND_NAMES
+
+        index = f.create_group('index')
+        index['fire_id'] = np.array([fire.fire_id for fire in fires], dtype=h5py.string_dtype())
+        index['alarm_date'] = np.array([fire.alarm_date for fire in fires], dtype=np.int64)
+        index['filename'] = np.array([fire.filename for fire in fires], dtype=h5py.string_dtype())
+        index['x_min'] = np.array([fire.grid.x_min for fire in fires], dtype=np.float64)
+        index['y_max'] = np.array([fire.grid.y_max for fire in fires], dtype=np.float64)
+        index['scale'] = np.array([fire.grid.scale for fire in fires], dtype=np.float64)
+        index['n_rows'] = np.array([fire.grid.n_rows for fire in fires], dtype=np.int64)
+        index['n_cols'] = np.array([fire.grid.n_cols for fire in fires], dtype=np.int64)
+        index['offset'] = np.array([fire.offset for fire in fires], dtype=np.int64)
+
+        bands = f.create_group('bands')
+        for name in COMPACT_BAND_NAMES:
+            band_format = BAND_FORMATS[name]
+            dataset = bands.create_dataset(name, shape=(n_pixels,), dtype=band_format.dtype,
+                                           fillvalue=get_nodata(band_format.dtype), **dataset_options)
+            dataset.attrs['scale'] = band_format.scale
+            dataset.attrs['offset'] = band_format.offset
+            dataset.attrs['nodata'] = get_nodata(band_format.dtype)
+
+        n_bytes = (n_pixels + 7) // 8
+        footprint = f.create_dataset('footprint', shape=(n_bytes,), dtype='uint8', fillvalue=0,
+                                     **dict(dataset_options, chunks=(max(1, min(chunk_size // 8, n_bytes)),)))
+
+        # Fires don't start on a byte boundary, so the bits left over from one fire's footprint are
+        # packed along with the next fire's
+        leftover = np.array([], dtype=bool)
+        for fire in fires:
+            values = raster_by_id[fire.fire_id].read(COMPACT_BAND_NAMES)
+            start, stop = fire.offset, fire.offset + fire.grid.n_rows * fire.grid.n_cols
+
+            for name, band in zip(COMPACT_BAND_NAMES, values):
+                bands[name][start:stop] = encode_band(band, name).ravel()
+
+            bits = np.concatenate([leftover, np.any(~np.isnan(values), axis=0).ravel()])
+            first_byte, n_whole = (start - len(leftover)) // 8, len(bits) // 8
+            footprint[first_byte:first_byte + n_whole] = np.packbits(bits[:n_whole * 8])
+            leftover = bits[n_whole * 8:]
+
+        if len(leftover) > 0:
+            footprint[-1] = np.packbits(leftover)[0]
+
+    write_index_csv(get_index_csv_path(path), fires)
+
+    return fires
+
+
+# DataCube reads a datacube written by build_datacube(); the file stays open until close() (or
+# the end of a with block)
+class DataCube:
+
+    def __init__(self, path):
+        import h5py
+
+        self.path = path
+        self.file = h5py.File(path, 'r')
+
+        index = {column: self.file['index'][column][()] for column in self.file['index']}
+        fire_ids = [fire_id.decode() if isinstance(fire_id, bytes) else fire_id for fire_id in index['fire_id']]
+        filenames = [name.decode() if isinstance(name, bytes) else name for name in index['filename']]
+
+        self.fires = FireIndex([
+            CubeRecord(fire_ids[i], int(index['alarm_date'][i]), None, filenames[i],
+                       io.Grid(float(index['x_min'][i]), float(index['y_max'][i]), int(index['n_rows'][i]),
+                               int(index['n_cols'][i]), float(index['scale'][i])),
+                       int(index['offset'][i]))
+            for i in range(len(fire_ids))])
+        self.stored_band_names = list(self.file.attrs['band_names'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.fires)
+
+    def __contains__(self, fire_id):
+        return fire_id in self.fires
+
+    def close(self):
+        self.file.close()
+
+    # band_names are the bands that can be read: always the legacy layout
+    @property
+    def band_names(self):
+        return list(BAND_NAMES)
+
+    def get_fire_ids(self):
+        return self.fires.get_fire_ids()
+
+    # get_window_grid() returns the grid of a window ((row_start, row_stop), (col_start, col_stop))
+    # of a fire, or the fire's whole grid if window is None
+    def get_window_grid(self, fire_id, window=None):
+        return io.get_window_grid(self.fires[fire_id].grid, window)
+
+    # _read_rows() reads the rows of a window of a fire from a 1-D dataset (of packed bits, if packed
+    # is True) and returns the window (rows x cols) in the dataset's data type (or as booleans)
+    def _read_rows(self, dataset, fire_id, window, packed=False):
+        fire = self.fires[fire_id]
+        n_rows, n_cols = fire.grid.n_rows, fire.grid.n_cols
+        (row_start, row_stop), (col_start, col_stop) = window or ((0, n_rows), (0, n_cols))
+
+        if not (0 <= row_start <= row_stop <= n_rows and 0 <= col_start <= col_stop <= n_cols):
+            raise ValueError('window ' + str(window) + ' is outside of the grid of fire ' + fire_id)
+
+        start, stop = fire.offset + row_start * n_cols, fire.offset + row_stop * n_cols
+        rows = unpack_bits(dataset, start, stop) if packed else dataset[start:stop]
+
+        return rows.reshape(row_stop - row_start, n_cols)[:, col_start:col_stop]
+
+    # read_footprint() returns True for every pixel of a fire (or a window of it) inside its perimeter
+    def read_footprint(self, fire_id, window=None):
+        return self._read_rows(self.file['footprint'], fire_id, window, packed=True)
+
+    # read_band() returns one band of a fire (or a window of it) as float32, with NaN where masked
+    def read_band(self, fire_id, name, window=None):
+        if name in self.stored_band_names:
+            return decode_band(self._read_rows(self.file['bands'][name], fire_id, window), name)
+
+        if name in DERIVED_BANDS:
+            return rebuild_band(name, self.get_window_grid(fire_id, window),
+                                get_date_bands(self.fires[fire_id].alarm_date),
+                                self.read_footprint(fire_id, window))
+
+        raise KeyError(name)
+
+    # read() returns the bands in band_names (by default, all 50 in the legacy order) of a fire (or a
+    # window of it) as an array (bands x rows x cols)
+    def read(self, fire_id, band_names=BAND_NAMES, window=None):
+        return np.stack([self.read_band(fire_id, name, window) for name in band_names])
+
+    # read_pixels() returns the values of one band at every pixel inside a perimeter, for the fires
+    # in fire_ids (by default, every fire), and the fire id of each of those pixels
+    def read_pixels(self, name, fire_ids=None):
+        fire_ids = self.get_fire_ids() if fire_ids is None else list(fire_ids)
+
+        values = []
+        for fire_id in fire_ids:
+            footprint = self.read_footprint(fire_id)
+            values.append(self.read_band(fire_id, name)[footprint])
+
+        pixel_fire_ids = np.repeat(np.array(fire_ids, dtype=object), [len(v) for v in values])
+
+        return np.concatenate(values) if len(values) > 0 else np.array([], dtype=np.float32), pixel_fire_ids
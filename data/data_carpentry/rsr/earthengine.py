@@ -0,0 +1,1291 @@
+# The Earth Engine backend: the functions that build each fire's image (get_variables(),
+# assess_whole_fire(), and everything they use), the pre-flight counts, the CBI plot values, and
+# the bulk export of every fire (export_fires()), as a module that can be imported (and run with
+# python -m rsr export) rather than only as the cells of 29_ee-get-frap-derived-imagery.py.
+#
+# Importing this module doesn't import the earthengine-api or talk to Earth Engine, so it's quick
+# and works offline. 'ee' below stands in for the earthengine-api: the first time one of its
+# attributes is used, it imports the earthengine-api and calls ee.Initialize() (with the arguments
+# given to initialize(), if it was called first, and only if the session isn't initialized
+# already). The collections and images we use (the Landsat and GRIDMET collections, the DEM, ...)
+# are created the first time they're used, as attributes of 'assets':
+#
+#   from rsr import earthengine
+#   earthengine.initialize(project='my-project')            (optional)
+#   img = earthengine.assess_whole_fire(48, 'none', ['4', '5', '7', '8'])(feature)
+#   earthengine.assets.fire18_1_sn_ypmc                     the FRAP perimeters
+#   earthengine.export_fires(fire_index, 48, 'none', ['4', '5', '7', '8'], journal_path, rasters_dir)
+#
+# The functions are unchanged from the notebook (which now imports them from here), apart from
+# reaching the assets through 'assets'.
+
+import importlib
+import json
+import math
+import os
+import threading
+
+from rsr.bands import BAND_NAMES, COMPACT_BAND_NAMES
+from rsr.fires import chunk
+from rsr.graph import format_graph_summary, summarize_graph
+from rsr.journal import ExportJournal, get_export_params, get_fire_content_hashes
+from rsr.output_format import MAX_STORED, NODATA, get_band_formats
+from rsr.preflight import get_count_names, summarize_preflight, yields_image
+from rsr.scheduler import ExportJob, ExportScheduler
+from rsr.sidecar import write_sidecar
+
+# The Google Drive folder the rasters are exported to
+EXPORT_FOLDER = 'ee/frap-derived-fire-imagery'
+
+# The most a fire's footprint (see get_fire_footprint()) can fall short of its buffer distance, in meters
+FOOTPRINT_MAX_ERROR = 1
+
+# The constructor and id of each asset
+ASSETS = {'elev': ('Image', 'USGS/SRTMGL1_003'),
+          'gridmet': ('ImageCollection', 'IDAHO_EPSCOR/GRIDMET'),
+          'l4sr': ('ImageCollection', 'LANDSAT/LT04/C01/T1_SR'),
+          'l5sr': ('ImageCollection', 'LANDSAT/LT05/C01/T1_SR'),
+          'l7sr': ('ImageCollection', 'LANDSAT/LE07/C01/T1_SR'),
+          'l8sr': ('ImageCollection', 'LANDSAT/LC08/C01/T1_SR'),
+          'mixed_conifer': ('Image', 'users/mkoontz/mixed_conifer'),
+          'sn': ('FeatureCollection', 'users/mkoontz/SierraEcoregion_Jepson'),
+          'fire18_1_sn_ypmc': ('FeatureCollection', 'users/mkoontz/fire18_1_sn_ypmc')}
+
+
+# _EarthEngine is the stand-in for the earthengine-api module (see the top of this file)
+class _EarthEngine:
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+        self._initialize_args = {}
+
+    def _load(self):
+        # The scheduler's worker threads can get here at the same time
+        with self._lock:
+            if self._module is None:
+                module = importlib.import_module('ee')
+                if not module.data.is_initialized():
+                    module.Initialize(**self._initialize_args)
+                self._module = module
+
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+
+# _Assets creates each asset (see ASSETS) the first time it's used
+class _Assets:
+
+    def __getattr__(self, name):
+        if name not in ASSETS:
+            raise AttributeError(name)
+
+        constructor, asset_id = ASSETS[name]
+        asset = getattr(ee, constructor)(asset_id)
+        setattr(self, name, asset)
+
+        return asset
+
+
+ee = _EarthEngine()
+assets = _Assets()
+
+
+# initialize() sets the arguments of ee.Initialize() (like project or credentials) for when Earth
+# Engine is first used, or initializes it now if it's already been used
+def initialize(**kwargs):
+    ee._initialize_args = kwargs
+    if ee._module is not None:
+        ee._module.Initialize(**kwargs)
+
+
+
+
+# This function appends a 'tag' string to a list (for instance band names) and returns a new list
+# Example use is adding "_post" after all default bandnames for a post fire image
+
+def paste(list1, tag):
+    return list1.map(lambda x: ee.String(x).cat(ee.String('_')).cat(ee.String(tag)))
+
+
+def mask_cloud_water_snow(resample_method):
+    def mask_cloud_water_snow_internal(img):
+        # Use the "closure in JavaScript technique to pass arguments to a mapped function
+        # mentioned here: https://groups.google.com/d/msg/google-earth-engine-developers/jB342iaPeX4/KXJYReksDQAJ
+        # demonstrated here: https://code.earthengine.google.com/80b35b7e358e94664dc6107e75a4a43a
+        # A pixel we want to keep (a 1 in the mask) is NOT a cloud (32) AND NOT a cloud shadow (8)
+        # AND NOT water (4) AND NOT snow (16): none of those bits of pixel_qa are set, which one
+        # bitwiseAnd() with all of them (32 + 8 + 4 + 16 = 60) tells us
+        mask = img.select('pixel_qa').bitwiseAnd(60).eq(0)
+
+        # Return an interpolated image with all cloud and cloud shadow pixels masked.
+        # Use interpolation because CBI on-the-ground plots are unlikely to
+        # lie exactly at the center of a pixel. See Cansler MSc thesis (2011)
+        # and Parks et al. (2014)
+
+        # Interpolate (resample) for on-the-ground data (cbi plot) validation
+        # Don't interpolate for analyses with only remote-sensed variables
+
+        export_img = ee.Algorithms.If(resample_method == 'none',
+                                            img.updateMask(mask),
+                                            img.resample(resample_method).updateMask(mask))
+
+        return export_img
+    return mask_cloud_water_snow_internal
+
+
+def rename_l8(image):
+    return image.rename(['B0', 'B1', 'B2', 'B3', 'B4', 'B5', 'B7', 'B6', 'B11', 'sr_aerosol', 'pixel_qa', 'radsat_qa']).select(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'pixel_qa'])
+
+# merge_collections() returns an ImageCollection of merged Surface Reflectance Landsat products
+# including Landsat 4, 5, 7, and 8 for continuous coverage from August 22, 1982 to present Spatial
+# and temporal filtering happens per fire perimeter to reduce computation load That is, for each
+# fire perimeter (with its associated alarm date), the 4 individual collections are heavily
+# subsetted prior to merging. Often, this should result in some of those individual collections
+# having no images (for instance, Landsat 8 imagery doesn't begin until April 11, 2013 so fires
+# prior to this date will work with a mega Image Collection that doesn't have any images from
+# Landsat 8. Additionally, Landsat 8 images will have their bands renamed so they match up with the
+# wavelengths from the L4, 5, and 7 sensors
+
+
+def merge_collections(start, end, bounds, sats):
+# As of 2018-01-24, data are available between 
+#  August 22, 1982 and December 14, 1993
+# https://explorer.earthengine.google.com/#detail/LANDSAT%2FLT04%2FC01%2FT1_SR
+# l4 is the Landsat 4 SR product filtered around the feature's 
+# alarm date IF Landsat 4 is part of the desired final product
+# If not, a blank image collection will be returned
+   
+    if '4' in sats:
+        l4 = assets.l4sr.filterDate(start, end).filterBounds(bounds).select(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'pixel_qa'])
+    if '4' not in sats: 
+        l4 = ee.ImageCollection([])
+  
+  # As of 2018-01-24, data are available between 
+  #  January 1, 1984 to May 5, 2012
+  # https://explorer.earthengine.google.com/#detail/LANDSAT%2FLT05%2FC01%2FT1_SR
+  # l5 is the Landsat 5 SR product filtered around the feature's 
+  # alarm date IF Landsat 5 is part of the desired final product
+  # If not, a blank image collection will be returned
+    if '5' in sats:
+        l5 = assets.l5sr.filterDate(start, end).filterBounds(bounds).select(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'pixel_qa'])
+    if '5' not in sats: 
+        l5 = ee.ImageCollection([])
+        
+  # As of 2018-01-24, data are available between 
+  #  January 1, 1999 and December 21, 2017
+  # https://explorer.earthengine.google.com/#detail/LANDSAT%2FLE07%2FC01%2FT1_SR
+  # l7 is the Landsat 7 SR product filtered around the feature's 
+  # alarm date IF Landsat 7 is part of the desired final product
+  # If not, a blank image collection will be returned
+  
+  # Original band names
+  # Name	Scale Factor	Description
+  # B1	0.0001	Band 1 (blue) surface reflectance, 0.45-0.52 μm
+  # B2	0.0001	Band 2 (green) surface reflectance, 0.52-0.60 μm
+  # B3	0.0001	Band 3 (red) surface reflectance, 0.63-0.69 μm
+  # B4	0.0001	Band 4 (near infrared) surface reflectance, 0.77-0.90 μm
+  # B5	0.0001	Band 5 (shortwave infrared 1) surface reflectance, 1.55-1.75 μm
+  # B6	0.1	Band 6 brightness temperature (Kelvin), 10.40-12.50 μm
+  # B7	0.0001	Band 7 (shortwave infrared 2) surface reflectance, 2.08-2.35 μm
+  # sr_atmos_opacity	0.001	Atmospheric opacity; < 0.1 = clear; 0.1 - 0.3 = average; > 0.3 = hazy
+  # sr_cloud_qa		Cloud quality attributes, see SR Cloud QA table. Note: pixel_qa is likely to present more accurate results than sr_cloud_qa for cloud masking. See page 23 in the LEDAPS product guide.
+  # pixel_qa		Pixel quality attributes generated from the CFMASK algorithm, see Pixel QA table
+  # radsat_qa		Radiometric saturation QA, see Radiometric Saturation QA table
+
+    if '7' in sats:
+        l7 = assets.l7sr.filterDate(start, end).filterBounds(bounds).select(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'pixel_qa'])
+    if '7' not in sats: 
+        l7 = ee.ImageCollection([])
+  
+  # As of 2018-01-24, data are available between 
+  #  April 11, 2013 and January 3, 2018
+  # https://explorer.earthengine.google.com/#detail/LANDSAT%2FLC08%2FC01%2FT1_SR
+  # l8 is the Landsat 8 SR product filtered around the feature's 
+  # alarm date IF Landsat 8 is part of the desired final product
+  # If not, a blank image collection will be returned
+  
+  # Original band names
+  # Name	Scale Factor	Description
+  # B1	0.0001	Band 1 (Ultra Blue) surface reflectance, 0.435-0.451 μm
+  # B2	0.0001	Band 2 (Blue) surface reflectance, 0.452-0.512 μm
+  # B3	0.0001	Band 3 (Green) surface reflectance, 0.533-0.590 μm
+  # B4	0.0001	Band 4 (Red) surface reflectance, 0.636-0.673 μm
+  # B5	0.0001	Band 5 (Near Infrared) surface reflectance, 0.851-0.879 μm
+  # B6	0.0001	Band 6 (Shortwave Infrared 1) surface reflectance, 1.566-1.651 μm
+  # B7	0.0001	Band 7 (Shortwave Infrared 2) surface reflectance, 2.107-2.294 μm
+  # B10	0.1	Band 10 brightness temperature (Kelvin), 10.60-11.19 μm
+  # B11	0.1	Band 11 brightness temperature (Kelvin), 11.50-12.51 μm
+  # sr_aerosol		Aerosol attributes, see Aerosol QA table
+  # pixel_qa		Pixel quality attributes, see Pixel QA table
+  # radsat_qa		Radiometric saturation QA, see Radsat QA table
+
+    if '8' in sats:
+        l8 = assets.l8sr.filterDate(start, end).filterBounds(bounds).select(['B2', 'B3', 'B4', 'B5', 'B6', 'B10', 'B7', 'pixel_qa'], ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'pixel_qa'])
+    if '8' not in sats: 
+        l8 = ee.ImageCollection([])
+
+    raw = l4.merge(l5).merge(l7).merge(l8)
+    
+    return(raw)
+
+
+def get_preFireRaw(feature, timeWindow, resample_method, sats):
+    fireDate = ee.Date(feature.get('alarm_date'))
+    firePerim = feature.geometry()
+
+  # Prefire image collection derivecd by gathering all images "timeWindow"
+  # (a global variable) days before the fire. 
+  # These variables define the time period to grab those images. 
+    preend = fireDate.advance(-1, 'day')
+    prestart = preend.advance(timeWindow * -1, 'day')
+  
+    preFireCollection = merge_collections(prestart, preend, firePerim, sats)
+    
+  # We apply the cloud mask over each of those images
+    preFire = preFireCollection.map(mask_cloud_water_snow(resample_method))
+    
+  # Return the preFire image collection
+    return preFire
+
+
+#  get_postFireRaw() returns a post fire raw image collection. This time we look 1 year after the 
+#  prefire image collection.
+def get_postFireRaw(feature, timeWindow, resample_method, sats):
+    fireDate = ee.Date(feature.get('alarm_date'))
+    firePerim = feature.geometry()
+  
+    # Need to get pre fire reference date in order to advance to 1 year later
+    preend = fireDate.advance(-1, 'day')
+    prestart = preend.advance(timeWindow * -1, 'day')
+  
+    # Post fire image comes from median of images exactly 1 year after pre-fire images
+    poststart = prestart.advance(1, 'year')
+    postend = preend.advance(1, 'year')
+  
+    postFireCollection = merge_collections(poststart, postend, firePerim, sats)
+
+    # We apply the cloud mask over each of those images
+    postFire = postFireCollection.map(mask_cloud_water_snow(resample_method))
+
+    return ee.ImageCollection(postFire)
+
+
+#  This function returns the median values for pre fire bands 1 through 7
+def get_preFireRaw_median(feature, timeWindow, resample_method, sats, context=None):
+    
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+  
+    # The raw band medians come out of the same median composite as the spectral indices
+    preFraw_median = get_composite_bands(context.preFire_composite, 
+                                         ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7'], 
+                                         paste(ee.List(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7']), 'pre'))
+
+    return preFraw_median
+
+
+#  This function returns the median values for post fire bands 1 through 7
+def get_postFireRaw_median(feature, timeWindow, resample_method, sats, context=None):
+    
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+  
+    postFraw_median = get_composite_bands(context.postFire_composite, 
+                                          ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7'], 
+                                          paste(ee.List(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7']), 'post'))
+
+    return postFraw_median
+
+
+# map_resample applies the user-specified resampling method to each
+# image in a collection. It must be called via 'map'
+# The function returns a function, which returns an image
+# I just use this for resampling the GridMet collection because I already include
+# resampling in the cloud mask function which is called on the raw Landsat
+# images.
+def map_resample(resample_method):
+    def map_resample_internal(img):
+        return img.resample(resample_method)
+    return map_resample_internal
+
+
+# get_fire_footprint() returns a fire's perimeter buffered by enough to hold every pixel that the
+# pixels of the export read with the neighborhood statistics: every pixel at least partly inside the
+# perimeter (as clip() keeps them), and every pixel of their windows of the largest of pixel_radii,
+# up to (radius + 1) pixel diagonals away (and a bit more for the buffer's error).
+def get_fire_footprint(feature, pixel_radii=['1', '2', '3', '4'], scale=30):
+    distance = (max(int(pixel_radius) for pixel_radius in pixel_radii) + 1) * scale * math.sqrt(2)
+
+    return feature.geometry().buffer(distance + FOOTPRINT_MAX_ERROR, FOOTPRINT_MAX_ERROR)
+
+
+# clip_to_footprint() clips each image of a collection to a fire's footprint (see
+# get_fire_footprint()), so that nothing is calculated beyond it. It must be called via 'map',
+# after any resampling, so the footprint is applied on the export grid.
+def clip_to_footprint(footprint):
+    def clip_to_footprint_internal(img):
+        return img.clip(footprint)
+    return clip_to_footprint_internal
+
+
+# get_preFireGridmet() returns a collection of raw daily GRIDMET images for gridmet_timeWindow number
+# of days before the fire. This collection can then be used to calculate ERC just before the fire
+# and temperature/precipitation accumulation for a bit longer before the fire
+def get_preFireGridmet(feature, gridmet_timeWindow, resample_method):
+    fireDate = ee.Date(feature.get('alarm_date'))
+    firePerim = feature.geometry()
+
+    #   Prefire image collection derivecd by gathering all images 
+    #   "gridmet_timeWindow" days before the fire. 
+    #   These variables define the time period to grab those images. 
+    prestart = fireDate.advance(gridmet_timeWindow * -1, 'day')
+    preend = fireDate.advance(-1, 'day')
+
+    #   Here is where we subset the Gridmet imagery. We filter the whole collection
+    #   to just the images that were taken between "gridmet_timeWindow" days before the 
+    #   fire started and 1 day before the fire started.
+    preFireGridmetCol = assets.gridmet.filterDate(prestart, preend).filterBounds(firePerim)
+
+    preFireGridmetCol = ee.Algorithms.If(resample_method == 'none',
+                                        preFireGridmetCol,
+                                        preFireGridmetCol.map(map_resample(resample_method)))
+  
+    #   Return the preFire image collection
+    return ee.ImageCollection(preFireGridmetCol)
+
+
+# get_earlyFireGridmet() returns a collection of raw daily GRIDMET images for gridmet_timeWindow number
+# of days after the fire's alarm date. This collection can then be used to calculate 
+# fire weather metrics that make the most sense measured during the fire, like
+# wind speed or the "Hot-dry-windy" index
+def get_earlyFireGridmet(feature, gridmet_timeWindow, resample_method):
+  
+    fireDate = ee.Date(feature.get('alarm_date'))
+    firePerim = feature.geometry()
+
+    #   Prefire image collection derivecd by gathering all images 
+    #   from the fire alarm date until "gridmet_timeWindow" days after
+    #   the fire alarm date.
+    #   These variables define the time period to grab those images. 
+    prestart = fireDate
+    preend = fireDate.advance(gridmet_timeWindow, 'day')
+
+    #   Here is where we subset the Gridmet imagery. We filter the whole collection
+    #   to just the images that were taken between the fire's alarm date and 
+    #   "gridmet_timeWindow" days after the alarm date
+    earlyFireGridmetCol = assets.gridmet.filterDate(prestart, preend).filterBounds(firePerim)
+      
+    earlyFireGridmetCol = ee.Algorithms.If(resample_method == 'none',
+                                        earlyFireGridmetCol,
+                                        earlyFireGridmetCol.map(map_resample(resample_method)))
+  
+    # Return the earlyFire image collection
+    return ee.ImageCollection(earlyFireGridmetCol)
+
+
+# create_kernel() returns an equally-weighted square ee.kernel with the specified number of pixel radius
+
+# Create a kernel of a given pixel radius (number of concentric rings around focal pixel)
+# Importantly, we also give 0 weight to the focal pixel.
+# A radius of 1 pixel yields a 3x3 pixel kernel with a weight of 0 at the center pixel and
+# a weight of 1/8 at every other pixel
+# A radius of 2 pixels yields a 5x5 pixel kernel with a weight of 0 at the center pixel and
+# a weight of 1/24 at every other pixel
+def create_kernel(pixel_radius):
+    pixel_diameter = pixel_radius.multiply(2).add(1)
+    weight_val = ee.Number(1).divide((pixel_diameter.pow(2).subtract(1)))
+    weights = ee.List.repeat(ee.List.repeat(weight_val, pixel_diameter), pixel_diameter)
+  
+    mid_row = ee.List.repeat(weight_val, pixel_radius).cat([0]).cat(ee.List.repeat(weight_val, pixel_radius))
+
+    weights = weights.set(pixel_radius, mid_row)
+
+    kernel = ee.Kernel.fixed(**{
+        'height': pixel_diameter,
+        'width': pixel_diameter,
+        'weights': weights
+      })
+  
+    return kernel
+
+
+# get_median_composite() takes the median for each pixel and each band of a collection of images 
+# and returns a null if the collection was empty
+def get_median_composite(collection):
+    
+    composite = collection.median()
+  
+    composite = ee.Algorithms.If( composite.bandNames(),
+                                    ee.Image(composite), 
+                                    None)
+
+    return ee.Image(composite)
+
+
+# get_composite_bands() selects (and optionally renames) bands from a median composite,
+# passing along a null if the composite itself was null
+def get_composite_bands(composite, bands, new_names=None):
+    
+    if new_names is None:
+        new_names = bands
+
+    composite_bands = ee.Algorithms.If( composite,
+                                        composite.select(bands, new_names), 
+                                        None)
+
+    return ee.Image(composite_bands)
+
+
+# get_NDVI() returns the normalized difference vegetation index (NDVI) for each pixel of an image
+def get_NDVI(img):
+    ndvi = img.normalizedDifference(['B4', 'B3']).rename('ndvi').multiply(1000)
+  
+    return ee.Image(ndvi)
+
+
+# get_preFndvi() maps over the collection of pre-fire images, calculates NDVI on each, and takes the median for each pixel
+def get_preFndvi(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.preFndvi
+
+
+# get_postFndvi() maps over the collection of post-fire images, calculates NDVI on each, and takes the median for each pixel
+def get_postFndvi(feature, timeWindow, resample_method, sats, context=None):
+
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.postFndvi
+
+
+# get_NDMI() returns the normalized difference moisture index (NDMI) for each pixel of an image
+def get_NDMI(img):
+    ndmi = img.normalizedDifference(['B4', 'B5']).rename('ndmi')
+
+    return ee.Image(ndmi)
+
+# get_preFndmi() maps over the collection of pre-fire images, calculates NDMI on each, and takes the median for each pixel
+def get_preFndmi(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.preFndmi
+
+# get_postFndmi() maps over the collection of post-fire images, calculates NDMI on each, and takes the median for each pixel
+def get_postFndmi(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.postFndmi
+
+
+# get_NBR() returns the normalized burn ratio (NBR) for each pixel of an image
+def get_NBR(img):
+    nbr = img.normalizedDifference(['B4', 'B7']).rename('nbr').multiply(1000)
+  
+    return ee.Image(nbr)
+
+
+# get_spectral_stack() returns the raw bands 1 through 7 of an image along with all of the spectral
+# indices (NDVI, NBR, and NDMI) as additional bands. Mapping this over a collection and then taking 
+# a single median yields every raw band and index composite in one reduction, instead of mapping 
+# a separate index function and taking a separate median for each index.
+def get_spectral_stack(img):
+    stack = (img.select(['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7'])
+                .addBands(get_NDVI(img))
+                .addBands(get_NBR(img))
+                .addBands(get_NDMI(img)))
+
+    return ee.Image(stack)
+
+
+# get_preFnbr() maps over the collection of pre-fire images, calculates NBR on each, and takes the median for each pixel
+def get_preFnbr(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.preFnbr
+
+# get_postFnbr() maps over the collection of post-fire images, calculates NBR on each, and takes the median for each pixel
+def get_postFnbr(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.postFnbr
+
+
+def get_dNBR(feature, timeWindow, resample_method, sats, context=None):
+    
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.dNBR
+
+# get_RdNBR() returns the relative differenced normalized burn ratio for each pixel within the fire perimeter
+# For calcuations, see Miller and Thode (2007)
+
+def get_RdNBR(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    preFire_nbr = context.preFnbr
+    delta_nbr = context.dNBR
+  
+    RdNBR = ee.Algorithms.If( delta_nbr,
+                                  delta_nbr.divide((preFire_nbr.abs().divide(1000)).sqrt()).rename('rdnbr'), 
+                                  None)
+
+    return ee.Image(RdNBR)
+
+
+# get_dNDVI() returns the raw difference in NDVI between pre- and post-fire images
+def get_dNDVI(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    return context.dNDVI
+
+# get_RdNDVI() returns the relative differenced normalized difference vegetation index for each pixel within a fire perimeter
+# Same math as in Miller and Thode (2007), but using NDVI instead of NBR
+def get_RdNDVI(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    preFire_ndvi = context.preFndvi
+    delta_ndvi = context.dNDVI
+  
+    RdNDVI = ee.Algorithms.If( delta_ndvi,
+                                  delta_ndvi.divide((preFire_ndvi.abs().divide(1000)).sqrt()).rename('rdndvi'), 
+                                  None)
+
+    return ee.Image(RdNDVI)
+
+
+# get_RBR() returns the relative burn ratio from Parks et al. 2015. Remote Sensing of the Environment))
+def get_RBR(feature, timeWindow, resample_method, sats, context=None):
+  
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats)
+
+    preFire_nbr = context.preFnbr
+    delta_nbr = context.dNBR
+  
+    RBR = ee.Algorithms.If( delta_nbr,
+                                delta_nbr.divide(preFire_nbr.divide(1000).add(1.001)).rename('rbr'), 
+                                None)
+
+    return ee.Image(RBR)
+
+
+# get_neighborhood_stats() returns a function (to be mapped over a collection of single-band NDVI
+# images) that calculates the neighborhood mean and the neighborhood standard deviation of NDVI
+# for every pixel radius in pixel_radii at once.
+# Each radius gets one reduceNeighborhood() pass with a combined mean + standard deviation reducer
+# (sharedInputs means both reducers read the same neighborhood), so we make one pass per radius 
+# instead of one pass per radius per statistic. The resulting image has a 'nbhd_ndvi_<radius>' and
+# a 'het_ndvi_<radius>' band for each radius.
+def get_neighborhood_stats(pixel_radii):
+    
+    reducer = ee.Reducer.mean().combine(**{
+        'reducer2': ee.Reducer.stdDev(),
+        'sharedInputs': True
+      })
+    
+    def get_neighborhood_stats_internal(img):
+        stats = []
+        for pixel_radius in pixel_radii:
+            kernel = create_kernel(ee.Number.parse(ee.String(pixel_radius)))
+            nbhd = img.reduceNeighborhood(reducer, kernel).rename(['nbhd_ndvi_' + pixel_radius, 'het_ndvi_' + pixel_radius])
+            stats.append(nbhd)
+        
+        return ee.Image.cat(stats)
+    return get_neighborhood_stats_internal
+
+
+# get_preFire_neighborhood_stats() returns a composite of the neighborhood means and standard 
+# deviations of NDVI at each of pixel_radii for a fire: the statistics are calculated on each
+# pre-fire image, and all of the bands are reduced together in a single median
+def get_preFire_neighborhood_stats(preFireCol_ndvi, pixel_radii):
+    
+    nbhd_stats = preFireCol_ndvi.map(get_neighborhood_stats(pixel_radii))
+    
+    return get_median_composite(nbhd_stats)
+
+
+# get_hetNDVI() returns the heterogeneity of NDVI within a given pixel radius for each pixel in an image
+def get_hetNDVI(feature, pixel_radius, timeWindow, resample_method, sats, context=None):
+    
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats, pixel_radii=[pixel_radius])
+
+    het = get_composite_bands(context.get_neighborhood_stats(pixel_radius), ['het_ndvi_' + pixel_radius])
+
+    return het
+
+
+# get_focal_mean_NDVI() returns the neighborhood mean of the NDVI for a given pixel radius
+# Could be valuable to account for this if using the neighborhood standard deviation at the same pixel radius
+def get_neighborhood_mean_NDVI(feature, pixel_radius, timeWindow, resample_method, sats, context=None):
+
+    if context is None:
+        context = FireContext(feature, timeWindow, resample_method, sats, pixel_radii=[pixel_radius])
+
+    nbhd_mean = get_composite_bands(context.get_neighborhood_stats(pixel_radius), ['nbhd_ndvi_' + pixel_radius])
+
+    return nbhd_mean
+
+
+# Topographic variables
+
+def get_slope(feature):
+    
+    terrain = ee.Algorithms.Terrain(assets.elev)
+    slope = terrain.select('slope')
+    
+    return(slope)
+
+def get_aspect(feature):
+
+    terrain = ee.Algorithms.Terrain(assets.elev)
+    aspect = terrain.select('aspect')
+    
+    return(aspect)
+
+def get_roughness(feature, pixel_radius, resample_method):
+    
+    pixel_radius_number = ee.Number.parse(ee.String(pixel_radius))
+    
+    kernel = create_kernel(pixel_radius_number)
+    local_elev =  ee.Algorithms.If(resample_method == 'none',
+                                      assets.elev,
+                                      assets.elev.resample(resample_method))
+                                      
+    roughness = ee.Image(local_elev).reduceNeighborhood(ee.Reducer.stdDev(), kernel)
+  
+    roughness = ee.Algorithms.If( roughness.bandNames(),
+                                roughness.rename(ee.String('topo_roughness_').cat(ee.String(pixel_radius))),
+                                None)
+
+    return ee.Image(roughness)
+
+
+# The topographic layers (the ypmc mask, slope, aspect, roughness at each pixel radius, and elevation)
+# don't depend on the fire at all, so rather than running ee.Algorithms.Terrain() and 4 neighborhood
+# reductions of the DEM for every fire, they can be computed once for the whole Sierra Nevada on the 
+# export grid (EPSG:3310, 30 m), stored as an asset, and read from there.
+# Run export_terrain_cache() once and set use_terrain_cache (rsr.earthengine.use_terrain_cache) to True
+# when the export is done. Until then, the layers are computed for each fire as before. The cached layers
+# are computed without resampling the DEM; with another resample_method, the cached layers are resampled
+# instead.
+
+terrain_cache_asset = 'users/mkoontz/sn_terrain_epsg3310'
+use_terrain_cache = False
+
+# get_terrain_layers() returns the topographic layers in the order that get_variables() adds them,
+# from the cache if use_cache (by default, use_terrain_cache) is True
+def get_terrain_layers(resample_method, pixel_radii=['1', '2', '3', '4'], use_cache=None):
+    
+    if use_cache is None:
+        use_cache = use_terrain_cache
+    
+    if use_cache:
+        cached = ee.Image(terrain_cache_asset)
+        
+        # The ypmc mask is never resampled
+        conifer = cached.select(['ypmc']).int()
+        topo = cached.select(['slope', 'aspect'] + ['topo_roughness_' + r for r in pixel_radii] + ['elevation'])
+        
+        topo = ee.Image(ee.Algorithms.If(resample_method == 'none',
+                                         topo,
+                                         topo.resample(resample_method)))
+        return conifer.addBands(topo)
+    
+    slope =  ee.Image(ee.Algorithms.If(resample_method == 'none',
+                                      get_slope(None),
+                                      get_slope(None).resample(resample_method)))
+
+    aspect =  ee.Image(ee.Algorithms.If(resample_method == 'none',
+                                      get_aspect(None),
+                                      get_aspect(None).resample(resample_method)))
+
+    local_elev =  ee.Image(ee.Algorithms.If(resample_method == 'none',
+                                        assets.elev,
+                                        assets.elev.resample(resample_method)))
+
+    conifer = assets.mixed_conifer.select('b1').int().rename('ypmc')
+    
+    terrain = conifer.addBands(slope).addBands(aspect)
+    for pixel_radius in pixel_radii:
+        terrain = terrain.addBands(get_roughness(None, pixel_radius, resample_method))
+    
+    return terrain.addBands(local_elev)
+
+# export_terrain_cache() starts the (one-time) export of the topographic layers for the Sierra Nevada
+# to terrain_cache_asset
+def export_terrain_cache():
+    task = ee.batch.Export.image.toAsset(**{
+        'image': get_terrain_layers('none', use_cache=False).float(),
+        'description': 'sn_terrain_epsg3310',
+        'assetId': terrain_cache_asset,
+        'region': assets.sn.geometry().bounds(),
+        'scale': 30,
+        'crs': 'EPSG:3310',
+        'maxPixels': 1e10
+    })
+    task.start()
+    
+    return task
+
+
+# Weather/fuel condition variables
+
+# get_gridmet_stack() selects the GRIDMET variables we use from a daily image and adds the
+# "Hot Dry Windy" index for that day, so every variable of a window can be reduced in one median
+def get_gridmet_stack(img):
+    
+    return ee.Image(img.select(['erc', 'fm100', 'vpd', 'vs']).addBands(get_hdw(img)))
+
+# get_preFireGridmet_composite() and get_earlyFireGridmet_composite() return a single median composite
+# (erc, fm100, vpd, vs, and hdw) of the daily GRIDMET images in the pre-fire or early-fire window,
+# or a null if there weren't any images in the window. The get_preF*() and get_earlyF*() functions
+# below just select their band from these composites; pass the same composite to each of them with 
+# the 'composite' argument so each window is filtered, resampled, and reduced only once.
+# With a footprint (see get_fire_footprint()), the daily images are clipped to it first.
+def get_preFireGridmet_composite(feature, gridmet_timeWindow, resample_method, footprint=None):
+    
+    preFireGridmet = get_preFireGridmet(feature, gridmet_timeWindow, resample_method)
+    if footprint is not None:
+        preFireGridmet = preFireGridmet.map(clip_to_footprint(footprint))
+    
+    return get_median_composite(preFireGridmet.map(get_gridmet_stack))
+
+def get_earlyFireGridmet_composite(feature, gridmet_timeWindow, resample_method, footprint=None):
+    
+    earlyFireGridmet = get_earlyFireGridmet(feature, gridmet_timeWindow, resample_method)
+    if footprint is not None:
+        earlyFireGridmet = earlyFireGridmet.map(clip_to_footprint(footprint))
+    
+    return get_median_composite(earlyFireGridmet.map(get_gridmet_stack))
+
+
+def get_preFerc(feature, gridmet_timeWindow, resample_method, composite=None):
+
+    if composite is None:
+        composite = get_preFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['erc'], ['preFerc'])
+
+
+def get_preFfm100(feature, gridmet_timeWindow, resample_method, composite=None):
+    
+    if composite is None:
+        composite = get_preFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['fm100'], ['preFfm100'])
+
+
+def get_preFtmmx(feature, gridmet_timeWindow, resample_method):
+    
+    preFtmmx = get_preFireGridmet(feature, gridmet_timeWindow, resample_method).map(lambda img: ee.Image(img.select(['tmmx'])).subtract(273.15)).median()
+  
+    preFtmmx = ee.Algorithms.If( preFtmmx.bandNames(),
+                                            ee.Image(preFtmmx).rename('preFtmmx'),
+                                            None)
+    return ee.Image(preFtmmx)
+
+
+def get_preFvpd(feature, gridmet_timeWindow, resample_method, composite=None):
+    
+    if composite is None:
+        composite = get_preFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['vpd'], ['preFvpd'])
+
+#  Always get the early fire data for the wind speed. No point in knowing
+#  wind speed before the fire.
+def get_earlyFvs(feature, gridmet_timeWindow, resample_method, composite=None):
+
+    if composite is None:
+        composite = get_earlyFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['vs'], ['earlyFvs'])
+
+# The "Hot Dry Windy" index from Srock et al. (2018)
+def get_hdw(img):
+
+    vs = ee.Image(img.select(['vs']))
+    vpd = ee.Image(img.select(['vpd']))
+
+    hdw = vpd.multiply(vs).rename(['hdw'])
+  
+    return ee.Image(hdw)
+
+# The index is calculated for each day before taking the median (see get_gridmet_stack())
+def get_earlyFhdw(feature, gridmet_timeWindow, resample_method, composite=None):
+    
+    if composite is None:
+        composite = get_earlyFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['hdw'], ['earlyFhdw'])
+
+def get_earlyFvpd(feature, gridmet_timeWindow, resample_method, composite=None):
+    
+    if composite is None:
+        composite = get_earlyFireGridmet_composite(feature, gridmet_timeWindow, resample_method)
+
+    return get_composite_bands(composite, ['vpd'], ['earlyFvpd'])
+
+
+# FireContext gathers the Landsat-derived pieces that get_variables() needs for a single fire
+# and builds each of them exactly once: the masked pre- and post-fire collections, the 
+# per-image pre-fire NDVI collection used by the neighborhood functions, one median composite
+# per window (raw bands plus NBR, NDVI, and NDMI), and the differenced images.
+# Without it, every get_*() function called get_preFireRaw()/get_postFireRaw() on its own, so
+# a single fire's expression graph rebuilt the same filtered and masked 4-sensor collection more
+# than 15 times (and dNBR was rebuilt inside both get_RdNBR() and get_RBR()).
+# The neighborhood statistics of pre-fire NDVI for all of pixel_radii are likewise calculated
+# together in one stage (see get_preFire_neighborhood_stats()).
+# Every scene is clipped to the fire's footprint (its perimeter buffered by the largest of
+# pixel_radii, see get_fire_footprint()) as soon as it's masked, so the composites and the
+# neighborhood statistics are only calculated over the fire rather than over whole scenes.
+# Pass the same context to each get_*() function with the 'context' argument to share the work.
+class FireContext:
+    
+    def __init__(self, feature, timeWindow, resample_method, sats, pixel_radii=['1', '2', '3', '4'], footprint=None):
+        self.feature = feature
+        self.timeWindow = timeWindow
+        self.resample_method = resample_method
+        self.sats = sats
+        self.pixel_radii = list(pixel_radii)
+        self.footprint = footprint if footprint is not None else get_fire_footprint(feature, self.pixel_radii)
+
+        # Masked image collections for the pre- and post-fire windows, clipped to the footprint
+        self.preFire = get_preFireRaw(feature, timeWindow, resample_method, sats).map(clip_to_footprint(self.footprint))
+        self.postFire = get_postFireRaw(feature, timeWindow, resample_method, sats).map(clip_to_footprint(self.footprint))
+
+        # NDVI of each pre-fire image (the neighborhood functions work on individual images)
+        self.preFireCol_ndvi = self.preFire.map(get_NDVI)
+        
+        # One median composite per window holding the raw bands 1 through 7 and every 
+        # spectral index, computed in a single pass over the images in that window
+        self.preFire_composite = get_median_composite(self.preFire.map(get_spectral_stack))
+        self.postFire_composite = get_median_composite(self.postFire.map(get_spectral_stack))
+
+        # The index composites are just bands of the window composites
+        self.preFnbr = get_composite_bands(self.preFire_composite, ['nbr'])
+        self.postFnbr = get_composite_bands(self.postFire_composite, ['nbr'])
+        self.preFndvi = get_composite_bands(self.preFire_composite, ['ndvi'])
+        self.postFndvi = get_composite_bands(self.postFire_composite, ['ndvi'])
+        self.preFndmi = get_composite_bands(self.preFire_composite, ['ndmi'])
+        self.postFndmi = get_composite_bands(self.postFire_composite, ['ndmi'])
+
+        # Differenced images, which are null if either the pre- or the post-fire composite is null
+        self.dNBR = ee.Image(ee.Algorithms.If( self.preFnbr,
+                                                ee.Algorithms.If( self.postFnbr, 
+                                                                  self.preFnbr.subtract(self.postFnbr).rename('dnbr'), 
+                                                                  None),
+                                                None))
+
+        self.dNDVI = ee.Image(ee.Algorithms.If( self.preFndvi.bandNames(),
+                                                 ee.Algorithms.If( self.postFndvi.bandNames(), 
+                                                                   self.preFndvi.subtract(self.postFndvi).rename('dndvi'), 
+                                                                   None),
+                                                 None))
+
+        # Neighborhood mean and standard deviation of pre-fire NDVI for every radius at once
+        self.preFire_nbhd = get_preFire_neighborhood_stats(self.preFireCol_ndvi, self.pixel_radii)
+
+    # get_neighborhood_stats() returns the composite that holds the neighborhood statistics for
+    # pixel_radius. Radii that weren't part of this context's pixel_radii get their own stage.
+    def get_neighborhood_stats(self, pixel_radius):
+        if pixel_radius in self.pixel_radii:
+            return self.preFire_nbhd
+
+        return get_preFire_neighborhood_stats(self.preFireCol_ndvi, [pixel_radius])
+
+
+# A computationally lighter-weight version of the function that gets all variables
+# Used to just focus on severity measurements that have demonstrated good 
+# corroboration with field measurements, and excludes texture measurements
+
+# If compact is True, the date bands and the longitude/latitude bands are left out (they're constant
+# across the fire or follow from the geotransform; see rsr/sidecar.py for how they're rebuilt)
+def get_variables(feature, timeWindow, resample_method, sats, compact=False):
+    
+    geo = feature.geometry()
+    
+    # Everything is calculated only over the fire's perimeter buffered by the largest pixel radius
+    footprint = get_fire_footprint(feature, ['1', '2', '3', '4'])
+    
+    # Static features of the point itself
+    lonLat = ee.Image.pixelLonLat()
+    
+    # The ypmc mask, slope, aspect, roughness at each pixel radius, and elevation (from the 
+    # terrain cache if use_terrain_cache is True)
+    terrain = get_terrain_layers(resample_method, pixel_radii=['1', '2', '3', '4']).clip(footprint)
+   
+    # Not dependent on neighborhood size, but derived from the fire information
+    date = ee.Image(ee.Number(feature.get('alarm_date')))
+    
+    ordinal_day = ee.Image(ee.Number(ee.Date(feature.get('alarm_date')).getRelative('day', 'year')))
+    
+    day = ee.Image(ee.Number(ee.Date(feature.get('alarm_date')).get('day')))
+    month = ee.Image(ee.Number(ee.Date(feature.get('alarm_date')).get('month')))
+    year = ee.Image(ee.Number(ee.Date(feature.get('alarm_date')).get('year')))
+    
+    if compact:
+        date_lonLat = ee.Image([])
+    else:
+        date_lonLat = date.addBands(ordinal_day).addBands(year).addBands(month).addBands(day).addBands(lonLat)
+    
+    # Build the masked Landsat collections and the index composites once for this fire
+    # and share them among all of the Landsat-derived variables
+    context = FireContext(feature, timeWindow, resample_method, sats, pixel_radii=['1', '2', '3', '4'], footprint=footprint)
+    
+    preFraw = get_preFireRaw_median(feature, timeWindow, resample_method, sats, context=context)
+    postFraw = get_postFireRaw_median(feature, timeWindow, resample_method, sats, context=context)
+    
+    preFnbr = get_preFnbr(feature, timeWindow, resample_method, sats, context=context)
+    postFnbr = get_postFnbr(feature, timeWindow, resample_method, sats, context=context)
+    rdnbr = get_RdNBR(feature, timeWindow, resample_method, sats, context=context)
+    
+    preFndvi = get_preFndvi(feature, timeWindow, resample_method, sats, context=context)
+    postFndvi = get_postFndvi(feature, timeWindow, resample_method, sats, context=context)
+    rdndvi = get_RdNDVI(feature, timeWindow, resample_method, sats, context=context)
+    
+    rbr = get_RBR(feature, timeWindow, resample_method, sats, context=context)
+    
+    # Variables that depend on neighborhood window size AND on fire information
+    # Radius of 1 pixel = 3x3 window = 90m x 90m = 8100 m^2 = 0.81 ha
+    het_ndvi_1 = get_hetNDVI(feature, '1', timeWindow, resample_method, sats, context=context)
+    nbhd_mean_ndvi_1 = get_neighborhood_mean_NDVI(feature, '1', timeWindow, resample_method, sats, context=context)
+    
+    # Radius of 2 pixels = 5x5 window = 150m x 150m = 22500 m^2 = 2.25 ha
+    het_ndvi_2 = get_hetNDVI(feature, '2', timeWindow, resample_method, sats, context=context)
+    nbhd_mean_ndvi_2 = get_neighborhood_mean_NDVI(feature, '2', timeWindow, resample_method, sats, context=context)
+
+    # Radius of 3 pixels = 7x7 window = 210m x 210m = 44100 m^2 = 4.41 ha
+    het_ndvi_3 = get_hetNDVI(feature, '3', timeWindow, resample_method, sats, context=context)
+    nbhd_mean_ndvi_3 = get_neighborhood_mean_NDVI(feature, '3', timeWindow, resample_method, sats, context=context)
+
+    # Radius of 4 pixels = 9x9 window = 270m x 270m = 72900 m^2 = 7.29 ha
+    het_ndvi_4 = get_hetNDVI(feature, '4', timeWindow, resample_method, sats, context=context)
+    nbhd_mean_ndvi_4 = get_neighborhood_mean_NDVI(feature, '4', timeWindow, resample_method, sats, context=context)
+
+    # weather/fuel condition variables
+      
+    # One median composite of all GRIDMET variables per window
+    preFireGridmet = get_preFireGridmet_composite(feature, 4, resample_method, footprint)
+    earlyFireGridmet = get_earlyFireGridmet_composite(feature, 2, resample_method, footprint)
+    
+    erc = get_preFerc(feature, 4, resample_method, composite=preFireGridmet) # Take the median ERC for the 3 days prior to the fire
+    fm100 = get_preFfm100(feature, 4, resample_method, composite=preFireGridmet) # Take the median 100 hour fuel moisture for 3 days prior to the fire
+    preFvpd = get_preFvpd(feature, 4, resample_method, composite=preFireGridmet) # Take the median Vapor Pressure Deficit for 3 days prior to the fire
+    vs = get_earlyFvs(feature, 2, resample_method, composite=earlyFireGridmet) # median windspeed from the FIRST 2 days of fire
+    hdw = get_earlyFhdw(feature, 2, resample_method, composite=earlyFireGridmet) # median Hot-Dry-Windy index from the FIRST 2 days of fire
+    earlyFvpd = get_earlyFvpd(feature, 2, resample_method, composite=earlyFireGridmet)
+    
+    export_weatherFuel = ee.Algorithms.If(erc,
+          erc
+            .addBands(fm100)
+            .addBands(preFvpd)
+            .addBands(vs)
+            .addBands(hdw)
+            .addBands(earlyFvpd),
+          None)
+
+    #      Create export image
+    #      If the rdnbr variable isn't null, then all other images should have been
+    #      created, since the rdnbr algorithm checks both prefire and postfire imagery
+    #      and returns a null if either aren't present
+  
+    export_img = ee.Algorithms.If(rdnbr, 
+        rdnbr
+        .addBands(preFnbr)
+        .addBands(postFnbr)
+        .addBands(rdndvi)
+        .addBands(rbr)
+        .addBands(preFndvi)
+        .addBands(postFndvi)
+        .addBands(het_ndvi_1)
+        .addBands(nbhd_mean_ndvi_1)
+        .addBands(het_ndvi_2)
+        .addBands(nbhd_mean_ndvi_2)
+        .addBands(het_ndvi_3)
+        .addBands(nbhd_mean_ndvi_3)
+        .addBands(het_ndvi_4)
+        .addBands(nbhd_mean_ndvi_4)
+        .addBands(date_lonLat)
+        .addBands(terrain)
+        .addBands(preFraw)
+        .addBands(postFraw),
+      None)
+
+    export_img = ee.Algorithms.If(export_img,
+                    ee.Algorithms.If(export_weatherFuel,
+                          ee.Image(export_img)
+                            .addBands(export_weatherFuel)
+                            .copyProperties(feature),
+                          None),
+                        None)
+
+    return ee.Image(export_img)
+
+
+def assess_whole_fire(timeWindow, resample_method, sats, compact=False):
+  
+    def assess_whole_fire_internal(feature):
+        geo = feature.geometry()
+        var_img = get_variables(feature, timeWindow, resample_method, sats, compact=compact)
+  
+        export_img = ee.Algorithms.If(var_img, 
+                                      ee.Image(var_img).clip(geo).copyProperties(feature), 
+                                      None)
+
+        return ee.Image(export_img)
+    
+    return assess_whole_fire_internal
+    
+
+
+# assess_whole_fire() returns a null image for a fire whenever there aren't any Landsat scenes in the
+# pre-fire or post-fire window, or there aren't any GRIDMET images in the pre-fire or early-fire window.
+# Rather than evaluating the whole image for each fire to find out (img.getInfo()), we just count the
+# images in each of those windows (no pixels get touched), for all fires in a single request.
+# See rsr/preflight.py for how the counts are used (and for counting from local catalogs instead).
+
+# get_imagery_counts() returns a function to map over the fire perimeters that sets the number of
+# scenes from each Landsat sensor in the pre- and post-fire windows and the number of daily GRIDMET 
+# images in the pre- and early-fire windows as properties of each fire. The windows are the same 
+# as in get_preFireRaw(), get_postFireRaw(), get_preFireGridmet(), and get_earlyFireGridmet()
+def get_imagery_counts(timeWindow, sats, pre_gridmet_timeWindow=4, early_gridmet_timeWindow=2):
+    landsat = {'4': assets.l4sr, '5': assets.l5sr, '7': assets.l7sr, '8': assets.l8sr}
+    
+    def get_imagery_counts_internal(feature):
+        fireDate = ee.Date(feature.get('alarm_date'))
+        firePerim = feature.geometry()
+        
+        preend = fireDate.advance(-1, 'day')
+        prestart = preend.advance(timeWindow * -1, 'day')
+        poststart = prestart.advance(1, 'year')
+        postend = preend.advance(1, 'year')
+        
+        counts = {}
+        for sat in sats:
+            counts['n_preFire_l' + sat] = landsat[sat].filterDate(prestart, preend).filterBounds(firePerim).size()
+            counts['n_postFire_l' + sat] = landsat[sat].filterDate(poststart, postend).filterBounds(firePerim).size()
+        
+        counts['n_preFire_gridmet'] = assets.gridmet.filterDate(fireDate.advance(pre_gridmet_timeWindow * -1, 'day'), preend).filterBounds(firePerim).size()
+        counts['n_earlyFire_gridmet'] = assets.gridmet.filterDate(fireDate, fireDate.advance(early_gridmet_timeWindow, 'day')).filterBounds(firePerim).size()
+        
+        return feature.set(counts)
+    
+    return get_imagery_counts_internal
+
+# preflight_imagery() returns a dictionary of each fire's system:index -> its image counts, for all of 
+# the fires in one getInfo() call (the geometries are dropped so only the counts come back)
+def preflight_imagery(fires, timeWindow, sats):
+    counted = fires.map(get_imagery_counts(timeWindow, sats)).select(get_count_names(sats), None, False)
+    
+    return {ftr['id']: ftr['properties'] for ftr in counted.getInfo()['features']}
+
+
+# Band values at the CBI plots, for calibrating the remotely sensed severity metrics to field
+# measurements. calibrate_cbi() in rsr-functions.js builds a whole image for each plot and reads it
+# with its own reduceRegion(). Plots with the same alarm date share the same scenes, so
+# get_point_values() builds one image per alarm date (over just that date's plots) and reads all
+# of its plots with a single reduceRegions(); the dates are flattened into one FeatureCollection,
+# so one export (or getInfo()) reads every plot of every fire. Plots without imagery are dropped,
+# as they are with calibrate_cbi() (map(..., true)).
+# (rsr/points.py does the same from local data, interpolating from just the pixels around each plot.)
+
+def get_point_values(points, timeWindow, resample_method, sats, scale=30):
+    
+    def get_date_values(alarm_date):
+        date_points = points.filter(ee.Filter.eq('alarm_date', alarm_date))
+        feature = ee.Feature(date_points.geometry(), {'alarm_date': alarm_date})
+        var_img = get_variables(feature, timeWindow, resample_method, sats)
+        
+        return ee.Algorithms.If(var_img,
+                                ee.Image(var_img).reduceRegions(collection=date_points, reducer=ee.Reducer.mean(), scale=scale),
+                                ee.FeatureCollection([]))
+    
+    alarm_dates = points.aggregate_array('alarm_date').distinct()
+    
+    return ee.FeatureCollection(alarm_dates.map(get_date_values)).flatten()
+
+
+# encode_for_export() converts the bands of a fire's image (all 50, or the bands of the compact layout)
+# to their stored int16 values (value = stored * scale + offset, with the scale and offset of each band
+# from rsr/output_format.py)
+def encode_for_export(img, band_names=BAND_NAMES):
+    formats = get_band_formats(band_names)
+    
+    scales = ee.Image.constant([band_format.scale for band_format in formats]).rename(band_names)
+    offsets = ee.Image.constant([band_format.offset for band_format in formats]).rename(band_names)
+    
+    stored = ee.Image(img).rename(band_names).subtract(offsets).divide(scales).round()
+    
+    return stored.clamp(-MAX_STORED, MAX_STORED).toInt16()
+
+
+# load_fire_features() returns a dictionary of system:index -> ee.Feature for the fires in fire_ids.
+# Rather than filtering the whole collection once for every fire, the features are fetched chunk_size 
+# at a time, with a single inList filter (and a single request) per chunk.
+# fires is the collection of fire perimeters (by default, fire18_1_sn_ypmc).
+def load_fire_features(fire_ids, fires=None, chunk_size=100):
+    fire_features = {}
+    
+    if fires is None:
+        fires = assets.fire18_1_sn_ypmc
+    
+    for fire_id_chunk in chunk(list(fire_ids), chunk_size):
+        fire_chunk = fires.filter(ee.Filter.inList('system:index', fire_id_chunk)).getInfo()
+        
+        for ftr in fire_chunk['features']:
+            fire_features[ftr['id']] = ee.Feature(ftr)
+    
+    return fire_features
+
+
+# print_progress() prints each state change of an export
+def print_progress(name, state, task_id, error):
+    print(name + ": " + state + ("" if error is None else " (" + str(error) + ")"))
+
+
+# export_fires() exports an image of every fire in fire_index (a FireIndex, see
+# rsr.fires.read_fire_metadata(), in the order the fires are numbered in the file names) that
+# hasn't been exported yet, or whose content hash changed (see rsr.journal), to the Google Drive
+# folder. Every export is recorded in the journal at journal_path, so running it again picks up
+# where it left off: it first checks on the tasks that were still running and then only submits the
+# fires that haven't been exported (or skipped) yet. The pre-flight counts (see rsr.preflight) skip
+# the fires without imagery; the others are prepared and submitted from a pool of n_workers
+# threads, keeping up to max_in_flight tasks running at once (Earth Engine's limit on concurrent
+# tasks), checking on all of the tasks together every poll_interval seconds, and resubmitting
+# failed tasks up to max_retries times.
+#
+# The rasters are encoded to int16 unless encoded is False, and leave out the bands that are
+# constant across a fire unless compact is False (see rsr.sidecar; the sidecars are written to
+# rasters_dir, where the rasters go when they're downloaded). If log_graph_complexity is True, a
+# one-line summary of the size of each fire's expression graph (see rsr.graph) is printed as the
+# fire is prepared. fires is the collection of fire perimeters (by default, fire18_1_sn_ypmc).
+#
+# With dry_run, nothing is sent to Earth Engine: the fires are only compared with the journal (which
+# might still have tasks running). Returns the system:index of each fire left to export.
+def export_fires(fire_index, timeWindow, resample_method, sats, journal_path, rasters_dir, folder=EXPORT_FOLDER,
+                 compact=True, encoded=True, fires=None, log_graph_complexity=True, dry_run=False,
+                 max_in_flight=20, n_workers=8, poll_interval=30, max_retries=3, backoff=60):
+    fire_ids = fire_index.get_fire_ids()
+    alarm_dates = fire_index.get_alarm_dates()
+    band_names = COMPACT_BAND_NAMES if compact else BAND_NAMES
+
+    journal = ExportJournal(journal_path)
+    export_params = get_export_params(timeWindow, resample_method, sats)
+    content_hashes = get_fire_content_hashes(fire_index, dict(export_params, compact=compact, encoded=encoded))
+
+    if not dry_run:
+        journal.reconcile(ee.batch, export_params)
+
+    fire_diff = journal.diff(content_hashes, export_params)
+    print(", ".join(str(len(fire_diff[change])) + " " + change for change in ['new', 'changed', 'unchanged', 'removed']) + " fires.")
+
+    remaining_fire_ids = set(journal.remaining(fire_ids, export_params, content_hashes))
+    print(str(len(remaining_fire_ids)) + " of " + str(len(fire_ids)) + " fires left to export.")
+
+    if dry_run:
+        journal.close()
+        return [fire_id for fire_id in fire_ids if fire_id in remaining_fire_ids]
+
+    if fires is None:
+        fires = assets.fire18_1_sn_ypmc
+
+    # Count the imagery available to every remaining fire in one request and note which won't yield an image
+    imagery_counts = preflight_imagery(fires.filter(ee.Filter.inList('system:index', list(remaining_fire_ids))), timeWindow, sats)
+    no_imagery = set(summarize_preflight([fire_id for fire_id in fire_ids if fire_id in remaining_fire_ids], imagery_counts, sats))
+    print(str(len(no_imagery)) + " of those fires don't have imagery and will be skipped.")
+
+    # Fetch the features of the fires that will be exported
+    fire_features = load_fire_features([fire_id for fire_id in fire_ids if fire_id in remaining_fire_ids and fire_id not in no_imagery],
+                                       fires)
+
+    # prepare_fire_export() returns a function that builds the export for the i-th fire, or returns
+    # None if there isn't imagery for that fire. The scheduler calls these functions from several threads
+    # at once, so the round trips to the server for different fires overlap.
+    def prepare_fire_export(i):
+        def prepare_fire_export_internal():
+            # The pre-flight counts already tell us whether there's imagery for this fire
+            if not yields_image(imagery_counts.get(fire_ids[i]), sats):
+                return None
+
+            this_fire = ee.FeatureCollection([fire_features[fire_ids[i]]])
+            fire_assessment = this_fire.map(assess_whole_fire(timeWindow, resample_method, sats, compact=compact), True)
+
+            img = ee.Image(fire_assessment.first())
+
+            if log_graph_complexity:
+                print(format_graph_summary(fire_ids[i], summarize_graph(json.loads(img.serialize()))))
+
+            date = alarm_dates[i]
+            id = fire_ids[i]
+
+            fileNamePrefix = str(date) + "_" + str(i + 1).zfill(5) + "_" + id + "_epsg3310"
+
+            if compact:
+                os.makedirs(rasters_dir, exist_ok=True)
+                write_sidecar(os.path.join(rasters_dir, fileNamePrefix + '.tif'), id, fire_index[id].alarm_date,
+                              {'content_hash': content_hashes[id]})
+
+            if not encoded:
+                return {
+                    'image': img.float(),
+                    'description': fileNamePrefix,
+                    'fileNamePrefix': fileNamePrefix,
+                    'folder': folder,
+                    'scale': 30,
+                    'crs': 'EPSG:3310'
+                }
+
+            return {
+                'image': encode_for_export(img, band_names),
+                'description': fileNamePrefix,
+                'fileNamePrefix': fileNamePrefix,
+                'folder': folder,
+                'scale': 30,
+                'crs': 'EPSG:3310',
+                'fileFormat': 'GeoTIFF',
+                'formatOptions': {'cloudOptimized': True, 'noData': NODATA}
+            }
+        return prepare_fire_export_internal
+
+    record_in_journal = journal.on_event(export_params, content_hashes)
+
+    def on_export_event(name, state, task_id, error):
+        record_in_journal(name, state, task_id, error)
+        print_progress(name, state, task_id, error)
+
+    jobs = [ExportJob(fire_ids[i], prepare_fire_export(i)) for i in range(0, len(fire_ids)) if fire_ids[i] in remaining_fire_ids]
+
+    scheduler = ExportScheduler(ee.batch, max_in_flight=max_in_flight, n_workers=n_workers, poll_interval=poll_interval,
+                                max_retries=max_retries, backoff=backoff)
+    scheduler.run(jobs, on_event=on_export_event)
+
+    n_completed = len([state for state, task_id in journal.get_states(export_params).values() if state == 'completed'])
+    print(str(n_completed) + " of " + str(len(fire_ids)) + " fires exported.")
+
+    remaining_fire_ids = journal.remaining(fire_ids, export_params, content_hashes)
+    journal.close()
+
+    return remaining_fire_ids
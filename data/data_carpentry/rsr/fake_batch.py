@@ -0,0 +1,128 @@
+# A local stand-in for ee.batch, for exercising rsr.scheduler.ExportScheduler (and anything else
+# that submits and monitors exports) without an Earth Engine session.
+#
+# FakeBatch has the parts of ee.batch that the scheduler uses: Export.image.toDrive() returns a
+# task with an id and a start() method, and Task.list() returns every task with its current
+# state. Each call waits for 'latency' seconds like a round trip to the server would. A started
+# task is READY until the server has a free slot (at most 'concurrency' tasks RUNNING at once),
+# RUNNING for 'duration' seconds, and then COMPLETED, or FAILED with probability 'failure_rate'.
+# start() raises an exception if 'max_queued' tasks are already READY or RUNNING, as Earth Engine
+# does when too many tasks are queued.
+#
+#   batch = FakeBatch(latency=0.05, duration=0.5, failure_rate=0.1)
+#   scheduler = ExportScheduler(batch, max_in_flight=10, poll_interval=0.1, backoff=0.1)
+#   results = scheduler.run(jobs)
+#   batch.n_started, batch.max_running_at_once
+
+import itertools
+import random
+import threading
+import time
+
+
+class FakeTaskError(Exception):
+    pass
+
+
+class FakeTask:
+
+    def __init__(self, batch, task_id, config):
+        self.batch = batch
+        self.id = task_id
+        self.config = config
+        self.state = 'UNSUBMITTED'
+        self.error_message = None
+        self.started_at = None
+
+    def start(self):
+        self.batch._start(self)
+
+    def status(self):
+        self.batch._wait()
+        self.batch._update()
+        return {'id': self.id, 'state': self.state, 'description': self.config.get('description')}
+
+
+class FakeBatch:
+
+    def __init__(self, latency=0.0, duration=1.0, concurrency=20, failure_rate=0.0,
+                 max_queued=3000, seed=None):
+        self.latency = latency
+        self.duration = duration
+        self.concurrency = concurrency
+        self.failure_rate = failure_rate
+        self.max_queued = max_queued
+
+        self.tasks = []
+        self.n_started = 0
+        self.max_running_at_once = 0
+
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        batch = self
+
+        class Image:
+            @staticmethod
+            def toDrive(**kwargs):
+                batch._wait()
+                with batch._lock:
+                    task = FakeTask(batch, 'FAKE_TASK_' + str(next(batch._ids)), kwargs)
+                    batch.tasks.append(task)
+                return task
+
+            toCloudStorage = toDrive
+            toAsset = toDrive
+
+        class Export:
+            image = Image
+
+        class Task:
+            @staticmethod
+            def list():
+                batch._wait()
+                batch._update()
+                with batch._lock:
+                    return [task for task in batch.tasks if task.state != 'UNSUBMITTED']
+
+        self.Export = Export
+        self.Task = Task
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _start(self, task):
+        self._wait()
+        with self._lock:
+            n_queued = len([t for t in self.tasks if t.state in ('READY', 'RUNNING')])
+            if n_queued >= self.max_queued:
+                raise FakeTaskError('Too many tasks already in the queue (' + str(n_queued) + ').')
+
+            task.state = 'READY'
+            self.n_started += 1
+
+    # _update() moves tasks through READY -> RUNNING -> COMPLETED/FAILED based on elapsed time
+    def _update(self):
+        now = time.monotonic()
+
+        with self._lock:
+            for task in self.tasks:
+                if task.state == 'RUNNING' and now - task.started_at >= self.duration:
+                    if self._random.random() < self.failure_rate:
+                        task.state = 'FAILED'
+                        task.error_message = 'Fake failure.'
+                    else:
+                        task.state = 'COMPLETED'
+
+            n_running = len([task for task in self.tasks if task.state == 'RUNNING'])
+            for task in self.tasks:
+                if n_running >= self.concurrency:
+                    break
+                if task.state == 'READY':
+                    task.state = 'RUNNING'
+                    task.started_at = now
+                    n_running += 1
+
+            self.max_running_at_once = max(self.max_running_at_once, n_running)
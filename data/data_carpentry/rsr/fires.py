@@ -0,0 +1,139 @@
+# The fires to export, read from the fire metadata that Earth Engine exported for the FRAP
+# perimeters (data/data_output/ee_fire-samples/fires-strat-samples_metadata_...csv).
+#
+# 29_ee-get-frap-derived-imagery.py used to have the fire ids and alarm dates pasted in as two
+# long lists (printed by 28_get-fire-ids-and-dates-for-mass-EE-export.R). read_fire_metadata()
+# gets the same lists straight from the metadata .csv: it reads the file one row at a time,
+# keeping just the columns it needs (the .geo column holds each perimeter as GeoJSON and makes up
+# most of the file), orders the fires by alarm date, and indexes them by fire id and alarm date.
+# Each perimeter is reduced to a hash as it's read (see get_geometry_hash()), so that a newer FRAP
+# release can be compared with the fires that were already exported (see rsr.journal).
+#
+#   fire_index = read_fire_metadata(path, min_year=1984)
+#   fire_index.get_fire_ids()             the 'system:index' of each fire, in order of alarm date
+#   fire_index.get_alarm_dates()          the alarm date of each fire as 'YYYYMMDD' (UTC)
+#   fire_index['000000000000000002a4']    the FireRecord of a fire
+#   fire_index.with_alarm_date('19870830') the FireRecords of the fires with that alarm date
+#   fire_index['000000000000000002a4'].geometry_hash   the hash of the fire's perimeter
+
+import csv
+import datetime
+import hashlib
+import json
+import sys
+from collections import namedtuple
+
+# FireRecord is a row of the fire metadata: the Earth Engine 'system:index' of the fire, its
+# alarm date in milliseconds since the epoch, its order in the export (starting at 1; part of
+# each exported file's name), the other columns that were kept, and the hash of its perimeter (or
+# None if the file has no .geo column)
+FireRecord = namedtuple('FireRecord', ['fire_id', 'alarm_date', 'order', 'properties', 'geometry_hash'])
+
+# Columns that hold the fire id (read.csv() in R renames 'system:index' to 'system.index')
+FIRE_ID_COLUMNS = ['system:index', 'system.index']
+
+# Decimal places of the perimeter coordinates (in degrees) that go into a geometry hash: about a
+# centimeter, so that a perimeter that's only been written out again hashes the same
+GEOMETRY_DIGITS = 7
+
+
+# get_print_alarm_date() returns an alarm date (milliseconds since the epoch) as 'YYYYMMDD' in
+# UTC, like print_alarm_date in 28_get-fire-ids-and-dates-for-mass-EE-export.R
+def get_print_alarm_date(alarm_date):
+    dt = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=alarm_date)
+
+    return dt.strftime('%Y%m%d')
+
+
+# round_coordinates() rounds every coordinate in the (nested lists of) coordinates of a GeoJSON
+# geometry to digits decimal places
+def round_coordinates(coordinates, digits=GEOMETRY_DIGITS):
+    if isinstance(coordinates, list):
+        return [round_coordinates(item, digits) for item in coordinates]
+
+    return round(float(coordinates), digits)
+
+
+# get_geometry_hash() returns a hash (SHA-256, as hex) of a GeoJSON geometry (a dict, or the text
+# of the .geo column), from its type and its coordinates rounded to digits decimal places. Other
+# members (like the 'geodesic' flag that Earth Engine adds) don't change the hash.
+def get_geometry_hash(geometry, digits=GEOMETRY_DIGITS):
+    if isinstance(geometry, str):
+        geometry = json.loads(geometry)
+
+    if geometry['type'] == 'GeometryCollection':
+        canonical = {'type': 'GeometryCollection',
+                     'geometries': [get_geometry_hash(part, digits) for part in geometry['geometries']]}
+    else:
+        canonical = {'type': geometry['type'], 'coordinates': round_coordinates(geometry['coordinates'], digits)}
+
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class FireIndex:
+
+    def __init__(self, fires):
+        # Order by alarm date, keeping the order of the file for fires that share an alarm date
+        # (like dplyr::arrange())
+        fires = sorted(fires, key=lambda fire: fire.alarm_date)
+        self.fires = [fire._replace(order=i + 1) for i, fire in enumerate(fires)]
+
+        self._by_id = {fire.fire_id: fire for fire in self.fires}
+        self._by_date = {}
+        for fire in self.fires:
+            self._by_date.setdefault(get_print_alarm_date(fire.alarm_date), []).append(fire)
+
+    def __len__(self):
+        return len(self.fires)
+
+    def __iter__(self):
+        return iter(self.fires)
+
+    def __contains__(self, fire_id):
+        return fire_id in self._by_id
+
+    def __getitem__(self, fire_id):
+        return self._by_id[fire_id]
+
+    def with_alarm_date(self, print_alarm_date):
+        return list(self._by_date.get(print_alarm_date, []))
+
+    def get_fire_ids(self):
+        return [fire.fire_id for fire in self.fires]
+
+    def get_alarm_dates(self):
+        return [get_print_alarm_date(fire.alarm_date) for fire in self.fires]
+
+
+# read_fire_metadata() reads the fire metadata .csv into a FireIndex, keeping the fires whose
+# alarm year (UTC) is at least min_year and, of the other columns, only those in keep_columns (and
+# the hash of the .geo column)
+def read_fire_metadata(path, min_year=1984, keep_columns=()):
+    # The .geo column can be longer than the csv module allows by default
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+    fires = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        id_column = [column for column in FIRE_ID_COLUMNS if column in reader.fieldnames][0]
+
+        for row in reader:
+            # Fires without an alarm date can't be exported
+            if row['alarm_date'] in ('', 'NA'):
+                continue
+
+            alarm_date = int(float(row['alarm_date']))
+            if int(get_print_alarm_date(alarm_date)[:4]) < min_year:
+                continue
+
+            geometry_hash = get_geometry_hash(row['.geo']) if row.get('.geo') not in (None, '') else None
+
+            fires.append(FireRecord(row[id_column], alarm_date, None,
+                                    {column: row[column] for column in keep_columns}, geometry_hash))
+
+    return FireIndex(fires)
+
+
+# chunk() splits a list into lists of at most chunk_size items
+def chunk(items, chunk_size):
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
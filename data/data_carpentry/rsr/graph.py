@@ -0,0 +1,274 @@
+# How complex is the Earth Engine expression graph of a fire's image?
+#
+# Exports sometimes fail with "Computation too complex" or run out of memory, and the image
+# returned by get_variables()/assess_whole_fire() doesn't show why. Its serialized form does:
+# img.serialize() is built on the client, without a call to Earth Engine, and describes every
+# function call needed to compute the image. summarize_graph() reads that description offline and
+# reports:
+#
+#   n_nodes        the size of the graph with every shared value written out (as a tree)
+#   n_unique       the number of distinct nodes (the client already merges identical subtrees)
+#   depth          the longest chain of nested calls
+#   n_repeated     distinct function calls that are used in more than one place, and the ones
+#                  that make up the most of the tree (repeated)
+#   functions      for each function, how many times it's called in the tree and how many distinct
+#                  calls there are (e.g., ImageCollection.merge for merge_collections())
+#   bands          for each output band, the number of distinct nodes it depends on, its share of
+#                  the graph, and the nodes that no other band depends on
+#
+#   summary = summarize_graph(json.loads(img.serialize()))
+#   print(format_graph_summary(fire_id, summary))
+#
+# Bands are found by following the graph down from the image through the calls that build up the
+# bands of an image (addBands(), If(), clip(), copyProperties(), casts, a mapped function) and the
+# band-wise calls applied to a multi-band image (rename(), select(), arithmetic). A band is named
+# by the rename() or select() that made it, or after the function that made it; bands made by the
+# same call (like select() of several bands of a composite) share their nodes.
+#
+# This reads the serialization of the Cloud API (the {"result": ..., "values": ...} form that
+# serialize() returns in current versions of the earthengine-api).
+
+import json
+from collections import Counter, namedtuple
+
+# Calls that pass the bands of one argument through (the function and the argument)
+STRUCTURAL_CALLS = {'Algorithms.If': 'trueCase',
+                    'Image.clip': 'input',
+                    'Element.copyProperties': 'destination',
+                    'Element.set': 'object',
+                    'Element.setMulti': 'object',
+                    'Collection.first': 'collection',
+                    'Collection.map': 'baseAlgorithm',
+                    'Image.float': 'value',
+                    'Image.toInt16': 'value'}
+
+# Calls that apply to every band of one argument
+BANDWISE_CALLS = {'Image.rename': 'input',
+                  'Image.select': 'input',
+                  'Image.round': 'value',
+                  'Image.clamp': 'input',
+                  'Image.add': 'image1',
+                  'Image.subtract': 'image1',
+                  'Image.multiply': 'image1',
+                  'Image.divide': 'image1'}
+
+# Functions reported by format_graph_summary()
+WATCHED_FUNCTIONS = ['ImageCollection.merge', 'ImageCollection.load', 'Collection.map',
+                     'Image.reduceNeighborhood', 'ImageCollection.reduce']
+
+# Node is one node of the graph: its kind (a key of the serialized value, like
+# 'functionInvocationValue'), a label (the function name, or the value of a constant), and its
+# children as (argument name, node id) pairs
+Node = namedtuple('Node', ['kind', 'label', 'children'])
+
+GraphSummary = namedtuple('GraphSummary', ['n_nodes', 'n_unique', 'depth', 'n_repeated', 'repeated',
+                                           'functions', 'bands'])
+
+
+# Graph is the serialized graph with identical subtrees merged into one node (so each distinct
+# subtree has one id)
+class Graph:
+
+    def __init__(self, serialized):
+        self.values = serialized['values']
+        self.nodes = []
+        self._ids = {}
+        self._references = {}
+
+        self.root = self._parse_reference(serialized['result'])
+
+    def _intern(self, node):
+        key = (node.kind, node.label, node.children)
+        if key not in self._ids:
+            self._ids[key] = len(self.nodes)
+            self.nodes.append(node)
+
+        return self._ids[key]
+
+    def _parse_reference(self, reference):
+        if reference not in self._references:
+            self._references[reference] = self._parse(self.values[reference])
+
+        return self._references[reference]
+
+    # _parse() returns the id of a serialized value
+    def _parse(self, value):
+        if 'valueReference' in value:
+            return self._parse_reference(value['valueReference'])
+
+        if 'functionInvocationValue' in value:
+            invocation = value['functionInvocationValue']
+            children = tuple((name, self._parse(argument))
+                             for name, argument in sorted(invocation.get('arguments', {}).items()))
+            if 'functionReference' in invocation:
+                children = (('function', self._parse_reference(invocation['functionReference'])),) + children
+            return self._intern(Node('functionInvocationValue', invocation.get('functionName', '(function)'), children))
+
+        if 'functionDefinitionValue' in value:
+            definition = value['functionDefinitionValue']
+            label = '(' + ', '.join(definition.get('argumentNames', [])) + ')'
+            return self._intern(Node('functionDefinitionValue', label,
+                                     (('body', self._parse_reference(definition['body'])),)))
+
+        if 'arrayValue' in value:
+            children = tuple((str(i), self._parse(item)) for i, item in enumerate(value['arrayValue'].get('values', [])))
+            return self._intern(Node('arrayValue', '', children))
+
+        if 'dictionaryValue' in value:
+            children = tuple((key, self._parse(item)) for key, item in sorted(value['dictionaryValue'].get('values', {}).items()))
+            return self._intern(Node('dictionaryValue', '', children))
+
+        # A constant, an argument of a function definition, or anything else without children
+        kind = next(iter(value)) if len(value) > 0 else 'nullValue'
+        return self._intern(Node(kind, json.dumps(value.get(kind), sort_keys=True), ()))
+
+    # get_order() returns the ids of every node reachable from the root, each after all of its
+    # parents
+    def get_order(self):
+        order, visited = [], set()
+        stack = [(self.root, False)]
+
+        while len(stack) > 0:
+            node_id, expanded = stack.pop()
+            if expanded:
+                order.append(node_id)
+            elif node_id not in visited:
+                visited.add(node_id)
+                stack.append((node_id, True))
+                stack.extend((child, False) for _, child in self.nodes[node_id].children if child not in visited)
+
+        return order[::-1]
+
+    # get_reachable() returns the ids of the nodes reachable from a node (including itself)
+    def get_reachable(self, node_id):
+        reachable, stack = set(), [node_id]
+
+        while len(stack) > 0:
+            node_id = stack.pop()
+            if node_id not in reachable:
+                reachable.add(node_id)
+                stack.extend(child for _, child in self.nodes[node_id].children)
+
+        return reachable
+
+    def _get_argument(self, node, name):
+        return next((child for argument, child in node.children if argument == name), None)
+
+    # _get_constant() returns the value of a constant node, or of an array of constants (the client
+    # writes a list as an array when some of its items are shared with other parts of the graph),
+    # or None
+    def _get_constant(self, node_id):
+        node = self.nodes[node_id]
+
+        if node.kind == 'constantValue':
+            return json.loads(node.label)
+        if node.kind == 'arrayValue':
+            return [self._get_constant(child) for _, child in node.children]
+
+        return None
+
+    # _get_names() returns the list of band names given as an argument, or None
+    def _get_names(self, node, name):
+        child = self._get_argument(node, name)
+        names = self._get_constant(child) if child is not None else None
+
+        return names if isinstance(names, list) and all(isinstance(n, str) for n in names) else None
+
+    # get_bands() returns (band name, node id) for every band of the image at node_id (see the top
+    # of this file for how they're found)
+    def get_bands(self, node_id=None):
+        node_id = self.root if node_id is None else node_id
+        node = self.nodes[node_id]
+
+        if node.kind == 'functionDefinitionValue':
+            return self.get_bands(node.children[0][1])
+
+        if node.kind != 'functionInvocationValue':
+            return [(node.kind, node_id)]
+
+        if node.label == 'Image.addBands':
+            dst, src = self._get_argument(node, 'dstImg'), self._get_argument(node, 'srcImg')
+            if dst is not None and src is not None:
+                return self.get_bands(dst) + self.get_bands(src)
+
+        if node.label in STRUCTURAL_CALLS and self._get_argument(node, STRUCTURAL_CALLS[node.label]) is not None:
+            return self.get_bands(self._get_argument(node, STRUCTURAL_CALLS[node.label]))
+
+        names = None
+        if node.label == 'Image.rename':
+            names = self._get_names(node, 'names')
+        elif node.label == 'Image.select':
+            names = self._get_names(node, 'newNames') or self._get_names(node, 'bandSelectors')
+
+        if node.label in BANDWISE_CALLS and self._get_argument(node, BANDWISE_CALLS[node.label]) is not None:
+            bands = self.get_bands(self._get_argument(node, BANDWISE_CALLS[node.label]))
+            if len(bands) > 1 and (names is None or len(names) == len(bands)):
+                return list(zip(names, [band for _, band in bands])) if names is not None else bands
+
+        # A band (or several, from one call) that this call makes
+        return [(name, node_id) for name in names] if names is not None else [(node.label, node_id)]
+
+
+# summarize_graph() returns the GraphSummary of a serialized image (the parsed JSON of
+# img.serialize()), with the n_top most repeated subtrees
+def summarize_graph(serialized, n_top=5):
+    graph = Graph(serialized)
+    order = graph.get_order()
+
+    # The number of times each node appears in the tree is the number of paths from the root to it
+    occurrences = Counter({graph.root: 1})
+    for node_id in order:
+        for _, child in graph.nodes[node_id].children:
+            occurrences[child] += occurrences[node_id]
+
+    size, depth = {}, {}
+    for node_id in reversed(order):
+        children = [child for _, child in graph.nodes[node_id].children]
+        size[node_id] = 1 + sum(size[child] for child in children)
+        depth[node_id] = 1 + max([depth[child] for child in children], default=0)
+
+    # Calls with more than one parent (or the same parent more than once) are the shared subtrees;
+    # everything below them repeats along with them
+    n_parents = Counter(child for node_id in order for _, child in graph.nodes[node_id].children)
+
+    calls = [node_id for node_id in order if graph.nodes[node_id].kind == 'functionInvocationValue']
+    repeated = sorted([node_id for node_id in calls if n_parents[node_id] > 1],
+                      key=lambda node_id: (occurrences[node_id] - 1) * size[node_id], reverse=True)
+
+    functions = {}
+    for node_id in calls:
+        n_calls, n_unique = functions.get(graph.nodes[node_id].label, (0, 0))
+        functions[graph.nodes[node_id].label] = (n_calls + occurrences[node_id], n_unique + 1)
+
+    # Each band's nodes, and the nodes that only it depends on
+    band_nodes = [(name, graph.get_reachable(node_id)) for name, node_id in graph.get_bands()]
+    n_bands_using = Counter(node_id for _, nodes in band_nodes for node_id in nodes)
+    bands = [{'band': name, 'n_unique': len(nodes), 'share': len(nodes) / len(order),
+              'n_exclusive': len([node_id for node_id in nodes if n_bands_using[node_id] == 1])}
+             for name, nodes in band_nodes]
+
+    return GraphSummary(n_nodes=size[graph.root], n_unique=len(order), depth=depth[graph.root],
+                        n_repeated=len(repeated),
+                        repeated=[{'function': graph.nodes[node_id].label, 'occurrences': occurrences[node_id],
+                                   'n_nodes': size[node_id]} for node_id in repeated[:n_top]],
+                        functions={name: {'n_calls': n_calls, 'n_unique': n_unique}
+                                   for name, (n_calls, n_unique) in sorted(functions.items())},
+                        bands=bands)
+
+
+# format_graph_summary() returns a one-line summary of a GraphSummary for logging during export
+def format_graph_summary(name, summary, watched=WATCHED_FUNCTIONS):
+    parts = ['{} nodes ({} unique)'.format(summary.n_nodes, summary.n_unique),
+             'depth {}'.format(summary.depth),
+             '{} repeated subtrees'.format(summary.n_repeated)]
+
+    for function in watched:
+        if function in summary.functions:
+            counts = summary.functions[function]
+            parts.append('{} x{} ({} unique)'.format(function, counts['n_calls'], counts['n_unique']))
+
+    if len(summary.bands) > 0:
+        largest = max(summary.bands, key=lambda band: band['n_unique'])
+        parts.append('largest band {} {:.0%}'.format(largest['band'], largest['share']))
+
+    return name + ': ' + ', '.join(parts)
@@ -0,0 +1,412 @@
+# On-disk inputs for the local backend.
+#
+# The local backend works on the same export grid as the Earth Engine export: EPSG:3310
+# (California Albers) with 30 m pixels. Every input (Landsat scenes, the SRTM DEM, the
+# yellow pine/mixed-conifer mask, daily GRIDMET images) is read through a warped window onto
+# the grid of the fire being processed, using the same resampling method that the Earth Engine
+# code would use (nearest neighbor for 'none'), so inputs can stay in their native projections.
+#
+# A data directory for the local backend is laid out like this:
+#
+#   landsat/scene_catalog.csv   one row per Landsat surface reflectance scene (see read_scene_catalog())
+#   gridmet/gridmet_catalog.csv one row per daily GRIDMET image (see read_gridmet_catalog()), or
+#   gridmet/erc_1984.nc ...     the yearly GRIDMET netCDF files, as downloaded (see GridmetNetCDF)
+#   srtm.tif                    the SRTM digital elevation model ("USGS/SRTMGL1_003")
+#   mixed_conifer.tif           the yellow pine/mixed-conifer mask ("users/mkoontz/mixed_conifer")
+#   terrain/                    (optional) the terrain cache built by rsr.terrain.build_terrain_cache()
+#
+# Each Landsat scene is a multiband .tif whose band descriptions are the band names in the
+# Earth Engine collections (B1 ... B7 and pixel_qa for Landsat 4, 5, and 7; B1 ... B11 and
+# pixel_qa for Landsat 8). Each daily GRIDMET image is a multiband .tif whose band descriptions
+# are the GRIDMET variable names (erc, fm100, vpd, vs, ...). GRIDMET can instead be given as
+# the yearly netCDF files that GRIDMET is distributed as (one file per variable per year, named
+# like erc_1984.nc), which are read directly.
+#
+# rasterio and pyproj are only needed to read rasters and are imported when first used.
+
+import csv
+import datetime
+import json
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+CRS = 'EPSG:3310'
+SCALE = 30
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+RESAMPLING = {'none': 'nearest', 'bilinear': 'bilinear', 'bicubic': 'cubic'}
+
+# The error (in pixels) allowed when GDAL approximates the transformation between a raster's CRS
+# and CRS. GDAL's default (1/8 of a pixel) interpolates the transformation across each window it
+# warps, so pixels would move slightly with the extent of the grid; this is small enough that
+# every pixel is transformed exactly. (rasterio doesn't accept 0.)
+WARP_TOLERANCE = 1e-9
+
+# The names of the GRIDMET variables inside the yearly netCDF files
+GRIDMET_NETCDF_VARIABLES = {'erc': 'energy_release_component-g',
+                            'fm100': 'dead_fuel_moisture_100hr',
+                            'vpd': 'mean_vapor_pressure_deficit',
+                            'vs': 'wind_speed',
+                            'tmmx': 'air_temperature'}
+
+# GRIDMET netCDF files count days since this date
+GRIDMET_NETCDF_EPOCH = datetime.datetime(1900, 1, 1)
+
+# Grid is the EPSG:3310 grid that a fire's variables are calculated on: the coordinates of the
+# upper-left corner, the number of rows and columns, and the pixel size in meters
+Grid = namedtuple('Grid', ['x_min', 'y_max', 'n_rows', 'n_cols', 'scale'])
+
+# SceneRecord is one row of the Landsat scene catalog. time_start is in milliseconds since the
+# epoch (like 'system:time_start') and the footprint is given in EPSG:3310.
+SceneRecord = namedtuple('SceneRecord', ['scene_id', 'sensor', 'time_start', 'path',
+                                         'x_min', 'y_min', 'x_max', 'y_max'])
+
+# GridmetRecord is one row of the GRIDMET catalog: one daily image
+GridmetRecord = namedtuple('GridmetRecord', ['time_start', 'path'])
+
+
+# get_fire_grid() returns the grid that covers the bounds (x_min, y_min, x_max, y_max) in
+# EPSG:3310, snapped outward to multiples of the pixel size so that every fire's grid lines up
+# with every other fire's grid
+def get_fire_grid(bounds, scale=SCALE):
+    x_min = math.floor(bounds[0] / scale) * scale
+    y_min = math.floor(bounds[1] / scale) * scale
+    x_max = math.ceil(bounds[2] / scale) * scale
+    y_max = math.ceil(bounds[3] / scale) * scale
+
+    return Grid(x_min, y_max, int(round((y_max - y_min) / scale)), int(round((x_max - x_min) / scale)), scale)
+
+
+# buffer_grid() grows a grid by n_pixels on every side (e.g., so that neighborhood statistics at
+# the edge of a fire's grid can see the pixels just outside of it)
+def buffer_grid(grid, n_pixels):
+    return Grid(grid.x_min - n_pixels * grid.scale,
+                grid.y_max + n_pixels * grid.scale,
+                grid.n_rows + 2 * n_pixels,
+                grid.n_cols + 2 * n_pixels,
+                grid.scale)
+
+
+# crop_halo() drops n_pixels from every side of the last two axes of an array that was
+# calculated on buffer_grid(grid, n_pixels), returning the part that lies on grid
+def crop_halo(x, n_pixels):
+    if n_pixels == 0:
+        return x
+
+    return x[..., n_pixels:-n_pixels, n_pixels:-n_pixels]
+
+
+# get_window_grid() returns the grid of a window ((row_start, row_stop), (col_start, col_stop))
+# of a grid, or the grid itself if window is None
+def get_window_grid(grid, window):
+    if window is None:
+        return grid
+
+    (row_start, row_stop), (col_start, col_stop) = window
+
+    return Grid(grid.x_min + col_start * grid.scale, grid.y_max - row_start * grid.scale,
+                row_stop - row_start, col_stop - col_start, grid.scale)
+
+
+def get_grid_bounds(grid):
+    return (grid.x_min, grid.y_max - grid.n_rows * grid.scale,
+            grid.x_min + grid.n_cols * grid.scale, grid.y_max)
+
+
+def get_grid_transform(grid):
+    from affine import Affine
+
+    return Affine(grid.scale, 0, grid.x_min, 0, -grid.scale, grid.y_max)
+
+
+# get_pixel_lonlat() returns the longitude and latitude (EPSG:4326) of every pixel center on a
+# grid, like ee.Image.pixelLonLat()
+def get_pixel_lonlat(grid):
+    from pyproj import Transformer
+
+    x = grid.x_min + (np.arange(grid.n_cols) + 0.5) * grid.scale
+    y = grid.y_max - (np.arange(grid.n_rows) + 0.5) * grid.scale
+    xx, yy = np.meshgrid(x, y)
+
+    transformer = Transformer.from_crs(CRS, 'EPSG:4326', always_xy=True)
+    lon, lat = transformer.transform(xx, yy)
+
+    return lon.astype(np.float32), lat.astype(np.float32)
+
+
+# read_scene_catalog() reads the Landsat scene catalog, a .csv file with the columns
+# scene_id, sensor ('4', '5', '7', or '8'), time_start, path (relative to the catalog),
+# and x_min, y_min, x_max, y_max (the scene footprint in EPSG:3310)
+def read_scene_catalog(path):
+    catalog_dir = os.path.dirname(os.path.abspath(path))
+
+    with open(path, newline='') as f:
+        scenes = [SceneRecord(row['scene_id'],
+                              str(row['sensor']),
+                              int(row['time_start']),
+                              os.path.join(catalog_dir, row['path']),
+                              float(row['x_min']), float(row['y_min']),
+                              float(row['x_max']), float(row['y_max']))
+                  for row in csv.DictReader(f)]
+
+    return sorted(scenes, key=lambda scene: scene.time_start)
+
+
+# filter_scenes() subsets a scene catalog like merge_collections() subsets the Landsat
+# collections: scenes from the sensors in sats, acquired on or after start and before end
+# (milliseconds since the epoch, as in ee.ImageCollection.filterDate()), whose footprint
+# intersects bounds
+def filter_scenes(scenes, start, end, bounds, sats):
+    sats = [str(sat) for sat in sats]
+
+    return [scene for scene in scenes
+            if scene.sensor in sats and
+            start <= scene.time_start < end and
+            scene.x_min < bounds[2] and scene.x_max > bounds[0] and
+            scene.y_min < bounds[3] and scene.y_max > bounds[1]]
+
+
+# read_gridmet_catalog() reads the GRIDMET catalog, a .csv file with the columns time_start
+# and path (relative to the catalog)
+def read_gridmet_catalog(path):
+    catalog_dir = os.path.dirname(os.path.abspath(path))
+
+    with open(path, newline='') as f:
+        days = [GridmetRecord(int(row['time_start']), os.path.join(catalog_dir, row['path']))
+                for row in csv.DictReader(f)]
+
+    return sorted(days, key=lambda day: day.time_start)
+
+
+def filter_days(days, start, end):
+    return [day for day in days if start <= day.time_start < end]
+
+
+# get_warp_scale() returns the number of grid pixels per pixel of an open raster along x and y.
+# GDAL works this out from the part of the raster under each window it warps, so without it the
+# interpolation kernel (and the values of the resampled pixels) would change slightly with the
+# extent of grid; with it, a pixel has the same value whatever window it's read in (see rsr.tiles).
+def get_warp_scale(src, grid, src_crs=None):
+    from rasterio.warp import transform_bounds
+
+    left, bottom, right, top = transform_bounds(src.crs or src_crs, CRS, *src.bounds)
+
+    return (right - left) / src.width / grid.scale, (top - bottom) / src.height / grid.scale
+
+
+# read_raster() reads the bands of a raster (all of them, those whose descriptions are in
+# bands, or those at the 1-based indexes) warped onto grid with the given resampling method,
+# returning a float32 array (bands x rows x cols) with NaN wherever the raster had no data (or an
+# array of dtype with nodata there). src_crs is the raster's CRS, for rasters that don't say what
+# it is.
+def read_raster(path, grid, bands=None, resample_method='none', indexes=None, src_crs=None,
+                dtype='float32', nodata=np.nan):
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.vrt import WarpedVRT
+
+    resampling = getattr(Resampling, RESAMPLING[resample_method])
+
+    with rasterio.open(path) as src:
+        if indexes is None and bands is None:
+            indexes = list(range(1, src.count + 1))
+        elif indexes is None:
+            indexes = [src.descriptions.index(band) + 1 for band in bands]
+
+        x_scale, y_scale = get_warp_scale(src, grid, src_crs)
+        with WarpedVRT(src, src_crs=src.crs or src_crs, crs=CRS, transform=get_grid_transform(grid),
+                       width=grid.n_cols, height=grid.n_rows,
+                       resampling=resampling, src_nodata=src.nodata, nodata=nodata,
+                       dtype=dtype, tolerance=WARP_TOLERANCE, XSCALE=str(x_scale), YSCALE=str(y_scale)) as vrt:
+            return vrt.read(indexes)
+
+
+# GridmetCatalog reads daily GRIDMET images from the .tif files listed in a GRIDMET catalog
+class GridmetCatalog:
+
+    def __init__(self, path):
+        self.days = read_gridmet_catalog(path)
+
+    # filter_days() returns the time_start of each daily image on or after start and before end
+    def filter_days(self, start, end):
+        return [day.time_start for day in filter_days(self.days, start, end)]
+
+    # read_days() returns the variables of the daily images between start and end warped onto
+    # grid (days x variables x rows x cols), or None if there aren't any
+    def read_days(self, start, end, variables, grid, resample_method):
+        days = filter_days(self.days, start, end)
+
+        if len(days) == 0:
+            return None
+
+        return np.stack([read_raster(day.path, grid, variables, resample_method) for day in days])
+
+
+# GridmetNetCDF reads daily GRIDMET images straight from the yearly GRIDMET netCDF files in a
+# directory (one file per variable per year, like erc_1984.nc, with one band per day). Which
+# days are in each file is read from the file's 'day' dimension the first time it's needed.
+class GridmetNetCDF:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._days = {}
+
+    def _get_path(self, variable, year):
+        return os.path.join(self.directory, variable + '_' + str(year) + '.nc')
+
+    # _get_days() returns a dictionary of time_start -> band index for the days in a file
+    def _get_days(self, variable, year):
+        import rasterio
+
+        key = (variable, year)
+        if key not in self._days:
+            days = {}
+            path = self._get_path(variable, year)
+
+            if os.path.exists(path):
+                with rasterio.open('netcdf:' + path + ':' + GRIDMET_NETCDF_VARIABLES[variable]) as src:
+                    for i in range(1, src.count + 1):
+                        day = float(src.tags(i)['NETCDF_DIM_day'])
+                        dt = GRIDMET_NETCDF_EPOCH + datetime.timedelta(days=day)
+                        days[int((dt - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)] = i
+
+            self._days[key] = days
+
+        return self._days[key]
+
+    def _get_years(self, start, end):
+        first = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=start)
+        last = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=end)
+
+        return list(range(first.year, last.year + 1))
+
+    # filter_days() returns the time_start of each day on or after start and before end with an
+    # ERC image (GRIDMET publishes every variable for the same days)
+    def filter_days(self, start, end):
+        return sorted(time_start
+                      for year in self._get_years(start, end)
+                      for time_start in self._get_days('erc', year)
+                      if start <= time_start < end)
+
+    # read_days() is GridmetCatalog.read_days(), reading each variable from its netCDF files and
+    # applying their scale factors and offsets
+    def read_days(self, start, end, variables, grid, resample_method):
+        import rasterio
+
+        days = self.filter_days(start, end)
+
+        if len(days) == 0:
+            return None
+
+        # A day or variable missing from the files stays NaN (masked) rather than whatever was in memory
+        stack = np.full((len(days), len(variables), grid.n_rows, grid.n_cols), np.nan, dtype=np.float32)
+
+        for j, variable in enumerate(variables):
+            for year in self._get_years(start, end):
+                year_days = self._get_days(variable, year)
+                rows = [i for i, day in enumerate(days) if day in year_days]
+
+                if len(rows) == 0:
+                    continue
+
+                path = 'netcdf:' + self._get_path(variable, year) + ':' + GRIDMET_NETCDF_VARIABLES[variable]
+                indexes = [year_days[days[i]] for i in rows]
+
+                with rasterio.open(path) as src:
+                    scale = src.scales[0]
+                    offset = src.offsets[0]
+
+                stack[rows, j] = read_raster(path, grid, resample_method=resample_method,
+                                             indexes=indexes, src_crs='EPSG:4326') * scale + offset
+
+        return stack
+
+
+# get_gridmet_source() returns the GRIDMET reader for a path: a GRIDMET catalog (.csv) or a
+# directory of GRIDMET netCDF files
+def get_gridmet_source(path):
+    if os.path.isdir(path) and not os.path.exists(os.path.join(path, 'gridmet_catalog.csv')):
+        return GridmetNetCDF(path)
+
+    if os.path.isdir(path):
+        path = os.path.join(path, 'gridmet_catalog.csv')
+
+    return GridmetCatalog(path)
+
+
+# TerrainCache reads the static topographic layers (see rsr.terrain) from the terrain cache in a
+# directory: terrain.npy holds the layers (layers x rows x cols, float32) on one EPSG:3310 grid
+# covering the whole region and terrain.json describes that grid. terrain.npy is memory-mapped, so
+# reading a fire's window only touches the part of the file under that window. A pickled cache
+# (sent to another process, see rsr.tiles) maps the file again rather than carrying the layers.
+class TerrainCache:
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'terrain.json')) as f:
+            header = json.load(f)
+
+        self.grid = Grid(header['x_min'], header['y_max'], header['n_rows'], header['n_cols'], header['scale'])
+        self.bands = header['bands']
+        self.resample_method = header['resample_method']
+        self.layers = np.load(os.path.join(directory, 'terrain.npy'), mmap_mode='r')
+
+    def __getstate__(self):
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+    # _get_window() returns the (row, col) offset of grid within the cache grid, or None if grid
+    # isn't aligned with the cache grid or isn't entirely inside it
+    def _get_window(self, grid):
+        if grid.scale != self.grid.scale:
+            return None
+
+        col = (grid.x_min - self.grid.x_min) / grid.scale
+        row = (self.grid.y_max - grid.y_max) / grid.scale
+        if col != int(col) or row != int(row):
+            return None
+
+        row, col = int(row), int(col)
+        if row < 0 or col < 0 or row + grid.n_rows > self.grid.n_rows or col + grid.n_cols > self.grid.n_cols:
+            return None
+
+        return row, col
+
+    # covers() returns True if the cache can provide the layers for grid with resample_method
+    def covers(self, grid, resample_method):
+        return resample_method == self.resample_method and self._get_window(grid) is not None
+
+    # read() returns a dictionary of layer -> array (rows x cols) for grid
+    def read(self, grid):
+        row, col = self._get_window(grid)
+        window = np.array(self.layers[:, row:row + grid.n_rows, col:col + grid.n_cols])
+
+        return dict(zip(self.bands, window))
+
+
+# LocalSource points the local backend at its inputs (see the layout at the top of this file).
+# gridmet is a GRIDMET catalog (.csv) or a directory of GRIDMET netCDF files.
+class LocalSource:
+
+    def __init__(self, scene_catalog, elevation, mixed_conifer, gridmet, terrain=None):
+        self.scenes = read_scene_catalog(scene_catalog)
+        self.elevation = elevation
+        self.mixed_conifer = mixed_conifer
+        self.gridmet = get_gridmet_source(gridmet)
+        self.terrain = None if terrain is None else TerrainCache(terrain)
+
+    @classmethod
+    def from_directory(cls, data_dir):
+        terrain = os.path.join(data_dir, 'terrain')
+
+        return cls(scene_catalog=os.path.join(data_dir, 'landsat', 'scene_catalog.csv'),
+                   elevation=os.path.join(data_dir, 'srtm.tif'),
+                   mixed_conifer=os.path.join(data_dir, 'mixed_conifer.tif'),
+                   gridmet=os.path.join(data_dir, 'gridmet'),
+                   terrain=terrain if os.path.exists(os.path.join(terrain, 'terrain.json')) else None)
@@ -0,0 +1,277 @@
+# An on-disk journal of per-fire exports, so that a bulk export can pick up where it left off.
+#
+# Every fire is recorded under its Earth Engine 'system:index' together with the export
+# parameters (timeWindow, resample_method, and sats), so exports of the same fire with
+# different parameters are tracked separately. Each record holds the fire's latest state:
+#
+#   skipped    there was no imagery to export (assess_whole_fire() returned null)
+#   submitted  the export task was started (task_id says which one)
+#   completed  the export task finished successfully
+#   failed     the export task (or preparing it) failed
+#
+# After an interruption, reconcile() asks Earth Engine (in a single request) what happened to
+# every task that was still 'submitted', and remaining() returns only the fires that still need
+# to be exported. Each state change is committed as soon as it happens, so the journal is
+# up to date even if the process is killed.
+#
+# Each record can also hold the content hash of what was exported (see get_content_hash()): the
+# fire's perimeter, its alarm date, the export parameters, and PIPELINE_VERSION. Every finished
+# export (completed or skipped) with a content hash is also recorded under that hash in a second
+# table of outputs, with the fire_id it was exported as only as a label. Re-uploading a FRAP
+# release gives its fires new system:index values, so when a newer release comes out its fires are
+# looked up by content hash: remaining() returns only the fires whose hash has no output yet (new
+# fires, and those whose perimeter or alarm date changed), and diff() says which fires are new,
+# changed, unchanged, or gone, so an annual update exports only the fires that need it.
+#
+#   content_hashes = get_fire_content_hashes(fire_index, params)
+#   journal.remaining(fire_ids, params, content_hashes)
+
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+
+from rsr.scheduler import FINISHED_STATES, get_state_name
+
+# Fires in these states don't need to be exported again
+DONE_STATES = ['skipped', 'completed']
+
+# The version of the calculations behind each exported image. Change it whenever a change to
+# assess_whole_fire() (or its output format) changes what is exported, and every fire's content
+# hash changes with it.
+PIPELINE_VERSION = 1
+
+
+# get_export_params() returns the export parameters in the form they are stored in the journal
+def get_export_params(timeWindow, resample_method, sats):
+    return {'timeWindow': int(timeWindow),
+            'resample_method': str(resample_method),
+            'sats': ''.join(sorted(str(sat) for sat in sats))}
+
+
+# get_content_hash() returns the content hash (SHA-256, as hex) of a fire's export: the hash of its
+# perimeter (see rsr.fires.get_geometry_hash()), its alarm date (milliseconds since the epoch), the
+# export parameters (from get_export_params(), plus anything else that changes the output, like
+# the band layout), and the pipeline version
+def get_content_hash(geometry_hash, alarm_date, params, version=PIPELINE_VERSION):
+    content = {'geometry': geometry_hash, 'alarm_date': int(alarm_date), 'params': params, 'version': version}
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+# get_fire_content_hashes() returns a dictionary of fire_id -> content hash for every fire of a
+# FireIndex (see rsr.fires.read_fire_metadata())
+def get_fire_content_hashes(fire_index, params, version=PIPELINE_VERSION):
+    return {fire.fire_id: get_content_hash(fire.geometry_hash, fire.alarm_date, params, version) for fire in fire_index}
+
+
+class ExportJournal:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS exports (
+                                    fire_id TEXT NOT NULL,
+                                    timeWindow INTEGER NOT NULL,
+                                    resample_method TEXT NOT NULL,
+                                    sats TEXT NOT NULL,
+                                    state TEXT NOT NULL,
+                                    task_id TEXT,
+                                    attempts INTEGER NOT NULL DEFAULT 0,
+                                    error TEXT,
+                                    updated TEXT NOT NULL,
+                                    content_hash TEXT,
+                                    PRIMARY KEY (fire_id, timeWindow, resample_method, sats))''')
+
+            # Journals from before content hashes were recorded
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(exports)')]
+            if 'content_hash' not in columns:
+                self._db.execute('ALTER TABLE exports ADD COLUMN content_hash TEXT')
+
+            # The finished exports, by content hash (fire_id is the fire the output was exported as)
+            self._db.execute('''CREATE TABLE IF NOT EXISTS outputs (
+                                    content_hash TEXT PRIMARY KEY,
+                                    fire_id TEXT NOT NULL,
+                                    timeWindow INTEGER NOT NULL,
+                                    resample_method TEXT NOT NULL,
+                                    sats TEXT NOT NULL,
+                                    state TEXT NOT NULL,
+                                    task_id TEXT,
+                                    updated TEXT NOT NULL)''')
+
+            # Journals from before outputs were recorded by content hash
+            self._db.execute('''INSERT OR IGNORE INTO outputs
+                                SELECT content_hash, fire_id, timeWindow, resample_method, sats, state, task_id, updated
+                                FROM exports WHERE content_hash IS NOT NULL AND state IN (?, ?)''', DONE_STATES)
+
+    def close(self):
+        self._db.close()
+
+    # record() sets the state of a fire for a set of export parameters (from get_export_params()),
+    # and the content hash of what is being exported (if it's given)
+    def record(self, fire_id, params, state, task_id=None, error=None, content_hash=None):
+        updated = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        attempts = 1 if state == 'submitted' else 0
+
+        with self._lock, self._db:
+            self._db.execute('''INSERT INTO exports (fire_id, timeWindow, resample_method, sats, state, task_id, attempts, error, updated, content_hash)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (fire_id, timeWindow, resample_method, sats) DO UPDATE SET
+                                    state = excluded.state,
+                                    task_id = COALESCE(excluded.task_id, task_id),
+                                    attempts = attempts + excluded.attempts,
+                                    error = excluded.error,
+                                    updated = excluded.updated,
+                                    content_hash = COALESCE(excluded.content_hash, content_hash)''',
+                             (fire_id, params['timeWindow'], params['resample_method'], params['sats'],
+                              state, task_id, attempts, None if error is None else str(error), updated,
+                              content_hash))
+
+            if state in DONE_STATES:
+                self._record_output(fire_id, params)
+
+    # _record_output() records the finished export of a fire under its content hash (if it has one);
+    # it must be called with the lock held, inside a transaction
+    def _record_output(self, fire_id, params):
+        self._db.execute('''INSERT INTO outputs
+                            SELECT content_hash, fire_id, timeWindow, resample_method, sats, state, task_id, updated
+                            FROM exports
+                            WHERE fire_id = ? AND timeWindow = ? AND resample_method = ? AND sats = ? AND
+                                  content_hash IS NOT NULL
+                            ON CONFLICT (content_hash) DO UPDATE SET
+                                fire_id = excluded.fire_id,
+                                state = excluded.state,
+                                task_id = excluded.task_id,
+                                updated = excluded.updated''',
+                         (fire_id, params['timeWindow'], params['resample_method'], params['sats']))
+
+    # get_states() returns a dictionary of fire_id -> (state, task_id) for a set of export parameters
+    def get_states(self, params):
+        with self._lock:
+            rows = self._db.execute('''SELECT fire_id, state, task_id FROM exports
+                                       WHERE timeWindow = ? AND resample_method = ? AND sats = ?''',
+                                    (params['timeWindow'], params['resample_method'], params['sats'])).fetchall()
+
+        return {fire_id: (state, task_id) for fire_id, state, task_id in rows}
+
+    # get_content_hashes() returns a dictionary of fire_id -> the content hash recorded for each
+    # fire (None for fires recorded without one) for a set of export parameters
+    def get_content_hashes(self, params):
+        with self._lock:
+            rows = self._db.execute('''SELECT fire_id, content_hash FROM exports
+                                       WHERE timeWindow = ? AND resample_method = ? AND sats = ?''',
+                                    (params['timeWindow'], params['resample_method'], params['sats'])).fetchall()
+
+        return dict(rows)
+
+    # get_outputs() returns a dictionary of content hash -> (fire_id, state, task_id) of every
+    # finished export for a set of export parameters, where fire_id is the fire it was exported as
+    def get_outputs(self, params):
+        with self._lock:
+            rows = self._db.execute('''SELECT content_hash, fire_id, state, task_id FROM outputs
+                                       WHERE timeWindow = ? AND resample_method = ? AND sats = ?''',
+                                    (params['timeWindow'], params['resample_method'], params['sats'])).fetchall()
+
+        return {content_hash: (fire_id, state, task_id) for content_hash, fire_id, state, task_id in rows}
+
+    # adopt_content_hashes() records content_hashes (fire_id -> content hash) for the fires that were
+    # exported (or skipped) before content hashes were recorded, and returns how many it recorded.
+    # The hashes must come from the FRAP release those fires were exported from, so that the next
+    # release is compared with what was actually exported.
+    def adopt_content_hashes(self, content_hashes, params):
+        recorded = self.get_content_hashes(params)
+        states = self.get_states(params)
+        adopted = [(content_hash, fire_id) for fire_id, content_hash in content_hashes.items()
+                   if fire_id in recorded and recorded[fire_id] is None and states[fire_id][0] in DONE_STATES]
+
+        with self._lock, self._db:
+            self._db.executemany('''UPDATE exports SET content_hash = ?
+                                    WHERE fire_id = ? AND timeWindow = ? AND resample_method = ? AND sats = ?''',
+                                 [(content_hash, fire_id, params['timeWindow'], params['resample_method'], params['sats'])
+                                  for content_hash, fire_id in adopted])
+
+            for content_hash, fire_id in adopted:
+                self._record_output(fire_id, params)
+
+        return len(adopted)
+
+    # diff() compares content_hashes (fire_id -> content hash, for every fire of a FRAP release) with
+    # the outputs in the journal and returns a dictionary of the fire_ids that are 'unchanged' (their
+    # content hash has an output, whatever fire_id it was exported as), 'changed' (no output for
+    # their content hash, but the same fire_id was recorded before), and 'new' (neither), in the
+    # order of content_hashes, and of the fire_ids that outputs were exported as that are 'removed'
+    # (no fire of content_hashes has their content hash). A re-uploaded release has new fire_ids, so
+    # its changed fires count as new.
+    def diff(self, content_hashes, params):
+        outputs = self.get_outputs(params)
+        recorded = self.get_states(params)
+        release_hashes = set(content_hashes.values())
+
+        return {'new': [fire_id for fire_id, content_hash in content_hashes.items()
+                        if content_hash not in outputs and fire_id not in recorded],
+                'changed': [fire_id for fire_id, content_hash in content_hashes.items()
+                            if content_hash not in outputs and fire_id in recorded],
+                'unchanged': [fire_id for fire_id, content_hash in content_hashes.items() if content_hash in outputs],
+                'removed': [fire_id for content_hash, (fire_id, state, task_id) in outputs.items()
+                            if content_hash not in release_hashes]}
+
+    # reconcile() updates every 'submitted' fire with the state of its task on the server, using
+    # one Task.list() request. Tasks that are still queued or running stay 'submitted'; fires whose
+    # task isn't listed at all (it has aged out of the task list, or was never started because the
+    # run crashed) are recorded as failed, so that remaining() returns them.
+    def reconcile(self, batch, params):
+        submitted = {task_id: fire_id for fire_id, (state, task_id) in self.get_states(params).items()
+                     if state == 'submitted'}
+        if len(submitted) == 0:
+            return
+
+        listed = set()
+        for task in batch.Task.list():
+            listed.add(task.id)
+            state = get_state_name(task.state)
+            if task.id in submitted and state in FINISHED_STATES:
+                self.record(submitted[task.id], params,
+                            'completed' if state == 'COMPLETED' else 'failed',
+                            task.id, getattr(task, 'error_message', None))
+
+        for task_id, fire_id in submitted.items():
+            if task_id not in listed:
+                self.record(fire_id, params, 'failed', task_id, 'task ' + str(task_id) + ' is no longer in the task list')
+
+    # remaining() returns the fire_ids (in their original order) that still need to be exported:
+    # those that haven't been recorded, that failed, or whose task can no longer be found. If
+    # content_hashes (fire_id -> content hash) is given, a fire with a content hash is done only if
+    # there's an output for that hash (under any fire_id), and otherwise needs to be exported unless
+    # its task is still running.
+    def remaining(self, fire_ids, params, content_hashes=None):
+        states = self.get_states(params)
+        outputs = self.get_outputs(params) if content_hashes is not None else {}
+
+        def is_remaining(fire_id):
+            state = states[fire_id][0] if fire_id in states else None
+
+            if content_hashes is not None and content_hashes.get(fire_id) is not None:
+                return content_hashes[fire_id] not in outputs and state != 'submitted'
+
+            return state is None or (state not in DONE_STATES and state != 'submitted')
+
+        return [fire_id for fire_id in fire_ids if is_remaining(fire_id)]
+
+    # on_event() returns a function to pass as on_event to ExportScheduler.run(), which records
+    # each state change of each fire (the scheduler's job names are the fire_ids), along with the
+    # fire's content hash if content_hashes (fire_id -> content hash) is given
+    def on_event(self, params, content_hashes=None):
+        content_hashes = content_hashes or {}
+
+        def on_event_internal(fire_id, state, task_id, error):
+            # A task that is about to be resubmitted is recorded as failed until it is, so an
+            # interruption in between doesn't lose it
+            self.record(fire_id, params, 'failed' if state == 'retrying' else state, task_id, error,
+                        content_hashes.get(fire_id))
+
+        return on_event_internal
@@ -0,0 +1,716 @@
+# A local (NumPy) backend for the variables calculated by get_variables() and
+# assess_whole_fire() in rsr/earthengine.py, so fires can be (re)processed
+# without an Earth Engine session, on our own hardware.
+#
+# The functions here mirror their Earth Engine namesakes and produce the same 50 bands
+# (see rsr.bands.BAND_NAMES) from Landsat surface reflectance scenes, GRIDMET, and SRTM stored
+# on disk (see rsr.io for the layout). Images are NumPy arrays with bands (or scenes) on the
+# leading axes and rows x cols on the last two; masked pixels are NaN. Every calculation is
+# vectorized over whole arrays, except that the Landsat composites are built a block of rows at a
+# time (see get_streaming_composite()), so stacks of scenes of the largest fires fit in memory.
+# assess_whole_fire() calculates only the pixels inside the fire perimeter, reading blocks that
+# follow the perimeter (see get_block_windows()), so the rest of the fire's bounding box is never
+# read or calculated.
+#
+# Known differences from Earth Engine:
+#   - slope and aspect are calculated on the DEM after it has been warped onto the EPSG:3310
+#     30 m grid, rather than in the DEM's native projection and then reprojected
+#   - medians are exact (np.nanmedian); Earth Engine's median reducer can differ slightly
+
+import csv
+import datetime
+import json
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from rsr import io
+from rsr.bands import BAND_NAMES, COMPACT_BAND_NAMES, L8_BANDS, LANDSAT_BANDS, PIXEL_RADII, SPECTRAL_INDICES
+from rsr.fires import FIRE_ID_COLUMNS, read_fire_metadata
+from rsr.neighborhood import get_neighborhood_stats
+
+# pixel_qa bits that mark a pixel we don't want (see mask_cloud_water_snow()). QA_FILL is also
+# the value pixel_qa is read with where a scene has no data.
+QA_FILL = 1
+QA_WATER = 4
+QA_CLOUD_SHADOW = 8
+QA_SNOW = 16
+QA_CLOUD = 32
+QA_MASK = QA_CLOUD | QA_CLOUD_SHADOW | QA_WATER | QA_SNOW
+
+# Memory (in MB) for the scenes of each block of a composite (see get_streaming_composite())
+MAX_BLOCK_MB = 512
+
+# Rows of each block (at most) when only a footprint is calculated, so that the window read for
+# each block follows the footprint (see get_block_windows())
+FOOTPRINT_BLOCK_ROWS = 256
+
+# Fire is a fire perimeter record: the Earth Engine 'system:index' of the feature, its alarm
+# date in milliseconds since the epoch, its perimeter (a shapely geometry in EPSG:3310), and
+# any other properties to carry along to the output (like copyProperties())
+Fire = namedtuple('Fire', ['fire_id', 'alarm_date', 'geometry', 'properties'])
+
+# FireImage is the local equivalent of the ee.Image returned by get_variables()
+FireImage = namedtuple('FireImage', ['bands', 'band_names', 'grid', 'properties'])
+
+
+# Dates ------------------------------------------------------------------
+
+def to_datetime(ms):
+    return datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(milliseconds=ms)
+
+
+def to_ms(dt):
+    return int((dt - datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)) / datetime.timedelta(milliseconds=1))
+
+
+# advance() is ee.Date.advance() for 'day' and 'year' units on dates in milliseconds since the epoch
+def advance(ms, delta, unit):
+    if unit == 'day':
+        return ms + int(delta * io.MS_PER_DAY)
+
+    dt = to_datetime(ms)
+    try:
+        return to_ms(dt.replace(year=dt.year + delta))
+    except ValueError:
+        # February 29th in a year that isn't a leap year
+        return to_ms(dt.replace(year=dt.year + delta, day=28))
+
+
+# get_landsat_windows() returns the (start, end) of the pre-fire and post-fire windows of
+# Landsat imagery, as in get_preFireRaw() and get_postFireRaw()
+def get_landsat_windows(alarm_date, timeWindow):
+    preend = advance(alarm_date, -1, 'day')
+    prestart = advance(preend, timeWindow * -1, 'day')
+
+    poststart = advance(prestart, 1, 'year')
+    postend = advance(preend, 1, 'year')
+
+    return (prestart, preend), (poststart, postend)
+
+
+# get_gridmet_windows() returns the (start, end) of the pre-fire and early-fire windows of
+# GRIDMET imagery, as in get_preFireGridmet() and get_earlyFireGridmet()
+def get_gridmet_windows(alarm_date, pre_timeWindow=4, early_timeWindow=2):
+    pre_window = (advance(alarm_date, pre_timeWindow * -1, 'day'), advance(alarm_date, -1, 'day'))
+    early_window = (alarm_date, advance(alarm_date, early_timeWindow, 'day'))
+
+    return pre_window, early_window
+
+
+# Landsat -----------------------------------------------------------------
+
+# get_qa_lookup() returns a table of every possible pixel_qa value (a 16-bit integer) -> True if a
+# pixel with that value is clear (none of the bits in mask_bits set, and not fill)
+def get_qa_lookup(mask_bits=QA_MASK):
+    values = np.arange(2 ** 16, dtype=np.uint32)
+
+    return ((values & mask_bits) == 0) & ((values & QA_FILL) == 0)
+
+
+QA_LOOKUP = get_qa_lookup()
+
+
+# get_clear_mask() returns True for every clear pixel of pixel_qa (a uint16 array, as read by
+# read_scene()), by looking up each value in QA_LOOKUP
+def get_clear_mask(pixel_qa):
+    return QA_LOOKUP[pixel_qa]
+
+
+# mask_cloud_water_snow() takes bands B1 through B7 of a scene (bands x rows x cols) or a stack
+# of scenes (scenes x bands x rows x cols) as float32 and their pixel_qa (rows x cols or
+# scenes x rows x cols), and sets every cloud, cloud shadow, water, and snow pixel (or pixel
+# without a pixel_qa value) to NaN, in place. Returns the bands.
+def mask_cloud_water_snow(bands, pixel_qa):
+    np.copyto(bands, np.nan, where=~get_clear_mask(pixel_qa)[..., np.newaxis, :, :])
+
+    return bands
+
+
+# read_scene_bands() reads B1 through B7 of one Landsat scene onto a grid as float32, renaming the
+# Landsat 8 bands so they match up with the wavelengths of the Landsat 4, 5, and 7 bands (as
+# merge_collections() does)
+def read_scene_bands(scene, grid, resample_method):
+    bands = L8_BANDS if scene.sensor == '8' else LANDSAT_BANDS
+
+    return io.read_raster(scene.path, grid, bands, resample_method)
+
+
+# read_scene_qa() reads pixel_qa of one Landsat scene onto a grid as uint16 (QA_FILL where the
+# scene has no data). pixel_qa is always read with nearest neighbor resampling because its values
+# are bit flags, so it's the same for every resampling method.
+def read_scene_qa(scene, grid):
+    return io.read_raster(scene.path, grid, ['pixel_qa'], dtype='uint16', nodata=QA_FILL)[0]
+
+
+# read_scene() reads one Landsat scene onto a grid as B1 through B7 and pixel_qa (see
+# read_scene_bands() and read_scene_qa())
+def read_scene(scene, grid, resample_method):
+    return read_scene_bands(scene, grid, resample_method), read_scene_qa(scene, grid)
+
+
+# read_masked_scenes() returns the masked stack of scenes read onto grid (scenes x B1 through B7 x
+# rows x cols), using pixel_qa (scenes x rows x cols) if it has already been read. Each scene is
+# masked as it's read, so the stack is the only full-size array.
+def read_masked_scenes(scenes, grid, resample_method, pixel_qa=None):
+    stack = np.empty((len(scenes), len(LANDSAT_BANDS), grid.n_rows, grid.n_cols), dtype=np.float32)
+    for i, scene in enumerate(scenes):
+        scene_qa = pixel_qa[i] if pixel_qa is not None else read_scene_qa(scene, grid)
+        stack[i] = mask_cloud_water_snow(read_scene_bands(scene, grid, resample_method), scene_qa)
+
+    return stack
+
+
+# merge_collections() returns the masked stack of every scene from the sensors in sats acquired
+# between start and end over bounds (scenes x B1 through B7 x rows x cols), or None if there
+# aren't any such scenes
+def merge_collections(source, start, end, bounds, sats, grid, resample_method):
+    scenes = io.filter_scenes(source.scenes, start, end, bounds, sats)
+
+    if len(scenes) == 0:
+        return None
+
+    return read_masked_scenes(scenes, grid, resample_method)
+
+
+# normalized_difference() is ee.Image.normalizedDifference() for two arrays
+def normalized_difference(a, b):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (a - b) / (a + b)
+
+
+# get_spectral_stack() adds NDVI, NBR (both multiplied by 1000), and NDMI as bands after
+# B1 through B7 of every scene in a stack (so the stack is scenes x 10 x rows x cols)
+def get_spectral_stack(stack):
+    b3, b4, b5, b7 = stack[:, 2], stack[:, 3], stack[:, 4], stack[:, 6]
+
+    ndvi = normalized_difference(b4, b3) * 1000
+    nbr = normalized_difference(b4, b7) * 1000
+    ndmi = normalized_difference(b4, b5)
+
+    return np.concatenate([stack, np.stack([ndvi, nbr, ndmi], axis=1)], axis=1)
+
+
+# get_median_composite() returns the median across scenes (the first axis) for every band and
+# pixel, ignoring masked pixels, or None if there were no scenes. This is np.nanmedian(), but
+# rather than masking the stack it sorts it (NaN sorts last) and takes the middle of the pixels
+# that aren't masked, which is several times faster; pixels that are masked in every scene come
+# out as NaN.
+def get_median_composite(stack):
+    if stack is None or stack.shape[0] == 0:
+        return None
+
+    ordered = np.sort(stack, axis=0)
+    n_valid = np.count_nonzero(~np.isnan(ordered), axis=0)[np.newaxis]
+
+    low = np.take_along_axis(ordered, np.maximum(n_valid - 1, 0) // 2, axis=0)[0]
+    high = np.take_along_axis(ordered, np.minimum(n_valid // 2, stack.shape[0] - 1), axis=0)[0]
+
+    return ((low + high) / 2).astype(np.float32)
+
+
+# get_footprint_composite() is get_median_composite() of just the pixels of a stack where
+# footprint (rows x cols) is True, with NaN elsewhere, or of every pixel if footprint is None
+def get_footprint_composite(stack, footprint=None):
+    if footprint is None:
+        return get_median_composite(stack)
+
+    composite = np.full(stack.shape[1:], np.nan, dtype=np.float32)
+    composite[:, footprint] = get_median_composite(stack[:, :, footprint])
+
+    return composite
+
+
+# get_block_rows() returns the number of rows of grid to composite at a time so that the arrays
+# of a block (for each of n_scenes scenes: B1 through B7, the spectral stack, and 2 *
+# n_nbhd neighborhood statistics, plus the sorted copy in get_median_composite(), all float32, and
+# including halo rows above and below) take up about max_block_mb. Always at least 1 row.
+def get_block_rows(grid, n_scenes, n_nbhd=0, halo=0, max_block_mb=MAX_BLOCK_MB):
+    n_bands = len(LANDSAT_BANDS) + 2 * len(LANDSAT_BANDS + SPECTRAL_INDICES) + 4 * n_nbhd
+    row_mb = n_scenes * n_bands * grid.n_cols * 4 / 2 ** 20
+
+    return int(min(grid.n_rows, max(1, max_block_mb // row_mb - 2 * halo)))
+
+
+# get_block_windows() returns the windows ((row_start, row_stop), (col_start, col_stop)) of blocks
+# of block_rows rows that cover a grid of n_rows x n_cols, or if footprint (rows x cols) is given,
+# that cover just the footprint: each block then spans only the columns from its first to its last
+# pixel of the footprint, and blocks without any pixels of the footprint are left out
+def get_block_windows(n_rows, n_cols, block_rows, footprint=None):
+    windows = []
+    for row_start in range(0, n_rows, block_rows):
+        row_stop = min(row_start + block_rows, n_rows)
+
+        if footprint is None:
+            windows.append(((row_start, row_stop), (0, n_cols)))
+            continue
+
+        cols = np.flatnonzero(footprint[row_start:row_stop].any(axis=0))
+        if len(cols) > 0:
+            windows.append(((row_start, row_stop), (int(cols[0]), int(cols[-1]) + 1)))
+
+    return windows
+
+
+# get_footprint_array() returns an array of shape to fill in block by block: NaN to start with if
+# only a footprint of it will be calculated, and uninitialized otherwise
+def get_footprint_array(shape, footprint=None):
+    if footprint is None:
+        return np.empty(shape, dtype=np.float32)
+
+    return np.full(shape, np.nan, dtype=np.float32)
+
+
+# get_streaming_composites() returns the composites of get_streaming_composite() for several
+# subsets of scenes (a dictionary of key -> the positions of the scenes in the subset) and several
+# resampling methods, as a dictionary of (key, resample_method) -> (composite, nbhd), with
+# (None, None) for a subset without scenes. Each block of each scene is read once per resampling
+# method (and its pixel_qa once), and every subset is composited from the same masked block.
+#
+# If footprint (rows x cols of grid) is given, the composites are calculated only where it's True
+# (and are NaN elsewhere): the blocks (of at most FOOTPRINT_BLOCK_ROWS rows) cover just the
+# footprint (see get_block_windows()), with max(pixel_radii) more rows and columns on every side
+# for the neighborhood statistics. The neighborhood statistics don't depend on the window they're
+# calculated on (see rsr.neighborhood), so the pixels of the footprint come out the same as
+# without one.
+def get_streaming_composites(scenes, subsets, grid, resample_methods, pixel_radii=(), max_block_mb=MAX_BLOCK_MB,
+                             footprint=None):
+    halo = max(pixel_radii, default=0)
+    block_rows = get_block_rows(grid, len(scenes), len(pixel_radii), halo, max_block_mb)
+    if footprint is not None:
+        block_rows = min(block_rows, FOOTPRINT_BLOCK_ROWS)
+    n_bands = len(LANDSAT_BANDS + SPECTRAL_INDICES)
+
+    composites = {}
+    for key, positions in subsets.items():
+        for resample_method in resample_methods:
+            if len(positions) == 0:
+                composites[key, resample_method] = (None, None)
+                continue
+            composites[key, resample_method] = (
+                get_footprint_array((n_bands, grid.n_rows, grid.n_cols), footprint),
+                get_footprint_array((2 * len(pixel_radii), grid.n_rows, grid.n_cols), footprint)
+                if len(pixel_radii) > 0 else None)
+
+    if len(scenes) == 0:
+        return composites
+
+    for (row_start, row_stop), (col_start, col_stop) in get_block_windows(grid.n_rows, grid.n_cols, block_rows,
+                                                                          footprint):
+        read_rows = max(0, row_start - halo), min(grid.n_rows, row_stop + halo)
+        read_cols = max(0, col_start - halo), min(grid.n_cols, col_stop + halo)
+        inner = (slice(row_start - read_rows[0], row_stop - read_rows[0]),
+                 slice(col_start - read_cols[0], col_stop - read_cols[0]))
+        inside = footprint[row_start:row_stop, col_start:col_stop] if footprint is not None else None
+
+        block_grid = io.get_window_grid(grid, (read_rows, read_cols))
+        pixel_qa = [read_scene_qa(scene, block_grid) for scene in scenes]
+
+        for resample_method in resample_methods:
+            stack = get_spectral_stack(read_masked_scenes(scenes, block_grid, resample_method, pixel_qa))
+
+            nbhd_stack = None
+            if len(pixel_radii) > 0:
+                # Neighborhood mean and standard deviation of NDVI on each scene, for every radius,
+                # reduced in a single median
+                ndvi = stack[:, len(LANDSAT_BANDS) + SPECTRAL_INDICES.index('ndvi')]
+                nbhd_stats = get_neighborhood_stats(ndvi, pixel_radii)
+                nbhd_stack = np.stack([stat[(slice(None),) + inner] for pixel_radius in pixel_radii
+                                       for stat in reversed(nbhd_stats[pixel_radius])], axis=1)
+
+            for key, positions in subsets.items():
+                composite, nbhd = composites[key, resample_method]
+                if composite is None:
+                    continue
+
+                composite[:, row_start:row_stop, col_start:col_stop] = get_footprint_composite(
+                    stack[(slice(None), slice(None)) + inner][positions], inside)
+                if nbhd is not None:
+                    nbhd[:, row_start:row_stop, col_start:col_stop] = get_footprint_composite(nbhd_stack[positions],
+                                                                                               inside)
+
+    return composites
+
+
+# get_streaming_composite() returns the median composite of the spectral stack (B1 through B7 and
+# every index) of scenes on grid and, if there are pixel_radii, the median composite of the
+# neighborhood (sd, mean) of NDVI for each radius (or None). Rather than reading whole scenes,
+# it reads every scene one block of rows at a time (see get_block_rows()), with
+# max(pixel_radii) more rows on either side for the neighborhood statistics, so memory use
+# doesn't depend on the size of the fire or the number of scenes beyond the composites
+# themselves. With a footprint, only its pixels are calculated (see get_streaming_composites()).
+def get_streaming_composite(scenes, grid, resample_method, pixel_radii=(), max_block_mb=MAX_BLOCK_MB,
+                            footprint=None):
+    composites = get_streaming_composites(scenes, {None: np.arange(len(scenes))}, grid, [resample_method],
+                                          pixel_radii, max_block_mb, footprint)
+
+    return composites[None, resample_method]
+
+
+# FireContext mirrors FireContext in rsr/earthengine.py: it builds one median
+# composite per window of scenes (raw bands plus every index) and the neighborhood statistics of
+# pre-fire NDVI for all radii, reading the scenes in blocks that take up about max_block_mb (see
+# get_streaming_composite()).
+# Everything is calculated on grid, which should include a halo of at least max(pixel_radii)
+# pixels around the area of interest (see get_variables()), or only where footprint (rows x cols
+# of grid) is True, if it's given.
+class FireContext:
+
+    def __init__(self, fire, timeWindow, resample_method, sats, source, grid, pixel_radii=PIXEL_RADII,
+                 max_block_mb=MAX_BLOCK_MB, footprint=None):
+        self.fire = fire
+        self.grid = grid
+        self.pixel_radii = list(pixel_radii)
+
+        bounds = fire.geometry.bounds
+        (prestart, preend), (poststart, postend) = get_landsat_windows(fire.alarm_date, timeWindow)
+
+        pre_scenes = io.filter_scenes(source.scenes, prestart, preend, bounds, sats)
+        post_scenes = io.filter_scenes(source.scenes, poststart, postend, bounds, sats)
+
+        self.preFire_composite = None
+        self.postFire_composite = None
+        self.preFire_nbhd = None
+
+        if len(pre_scenes) > 0:
+            self.preFire_composite, self.preFire_nbhd = get_streaming_composite(
+                pre_scenes, grid, resample_method, self.pixel_radii, max_block_mb, footprint)
+
+        if len(post_scenes) > 0:
+            self.postFire_composite, _ = get_streaming_composite(post_scenes, grid, resample_method,
+                                                                 max_block_mb=max_block_mb, footprint=footprint)
+
+    # from_composites() returns a FireContext with composites that have already been built (see
+    # rsr.sweep)
+    @classmethod
+    def from_composites(cls, fire, grid, preFire_composite, preFire_nbhd, postFire_composite,
+                        pixel_radii=PIXEL_RADII):
+        context = cls.__new__(cls)
+        context.fire = fire
+        context.grid = grid
+        context.pixel_radii = list(pixel_radii)
+        context.preFire_composite = preFire_composite
+        context.preFire_nbhd = preFire_nbhd
+        context.postFire_composite = postFire_composite
+
+        return context
+
+    def get_composite_band(self, composite, band):
+        if composite is None:
+            return None
+
+        return composite[(LANDSAT_BANDS + SPECTRAL_INDICES).index(band)]
+
+    @property
+    def has_imagery(self):
+        return self.preFire_composite is not None and self.postFire_composite is not None
+
+    # get_neighborhood_stats() returns the (sd, mean) composites of pre-fire NDVI for pixel_radius
+    def get_neighborhood_stats(self, pixel_radius):
+        i = self.pixel_radii.index(pixel_radius)
+
+        return self.preFire_nbhd[2 * i], self.preFire_nbhd[2 * i + 1]
+
+
+# get_severity() returns the pre- and post-fire index composites and the severity metrics
+# calculated from them (RdNBR and RBR from NBR, RdNDVI from NDVI) as a dictionary of arrays
+def get_severity(context):
+    preFnbr = context.get_composite_band(context.preFire_composite, 'nbr')
+    postFnbr = context.get_composite_band(context.postFire_composite, 'nbr')
+    preFndvi = context.get_composite_band(context.preFire_composite, 'ndvi')
+    postFndvi = context.get_composite_band(context.postFire_composite, 'ndvi')
+
+    dNBR = preFnbr - postFnbr
+    dNDVI = preFndvi - postFndvi
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Miller and Thode (2007)
+        rdnbr = dNBR / np.sqrt(np.abs(preFnbr) / 1000)
+        rdndvi = dNDVI / np.sqrt(np.abs(preFndvi) / 1000)
+        # Parks et al. (2014)
+        rbr = dNBR / (preFnbr / 1000 + 1.001)
+
+    return {'rdnbr': rdnbr, 'prefire_nbr': preFnbr, 'postfire_nbr': postFnbr,
+            'rdndvi': rdndvi, 'rbr': rbr, 'prefire_ndvi': preFndvi, 'postfire_ndvi': postFndvi}
+
+
+# Terrain -----------------------------------------------------------------
+
+# get_terrain() returns slope and aspect (in degrees, aspect clockwise from north) of an
+# elevation array on a grid with pixels of scale meters. Like ee.Algorithms.Terrain(), the
+# gradient comes from the 4-connected neighbors of each pixel, so the outermost pixels are NaN.
+def get_terrain(elev, scale):
+    dzdx = np.full(elev.shape, np.nan, dtype=np.float64)
+    dzdy = np.full(elev.shape, np.nan, dtype=np.float64)
+
+    # Rows run from north to south, so the northward gradient is (row above - row below)
+    dzdx[1:-1, 1:-1] = (elev[1:-1, 2:] - elev[1:-1, :-2]) / (2 * scale)
+    dzdy[1:-1, 1:-1] = (elev[:-2, 1:-1] - elev[2:, 1:-1]) / (2 * scale)
+
+    slope = np.degrees(np.arctan(np.hypot(dzdx, dzdy)))
+    # The aspect is the direction that the slope faces (downhill)
+    aspect = np.mod(np.degrees(np.arctan2(-dzdx, -dzdy)), 360)
+
+    return slope.astype(np.float32), aspect.astype(np.float32)
+
+
+# get_topography() returns the ypmc mask, slope, aspect, topographic roughness for each pixel
+# radius, and elevation for a grid (which should include a halo of at least max(pixel_radii) + 1
+# pixels)
+def get_topography(source, grid, resample_method, pixel_radii=PIXEL_RADII):
+    elev = io.read_raster(source.elevation, grid, resample_method=resample_method)[0]
+    conifer = io.read_raster(source.mixed_conifer, grid)[0]
+
+    slope, aspect = get_terrain(elev, grid.scale)
+    roughness = get_neighborhood_stats(elev, pixel_radii)
+
+    topography = {'ypmc': np.trunc(conifer), 'slope': slope, 'aspect': aspect}
+    for pixel_radius in pixel_radii:
+        topography['topo_roughness_' + str(pixel_radius)] = roughness[pixel_radius][1]
+    topography['elevation'] = elev
+
+    return topography
+
+
+# Weather -----------------------------------------------------------------
+
+# GRIDMET variables in each window's composite; hdw, the "Hot Dry Windy" index from Srock et al.
+# (2018), is derived from vpd and vs (see get_gridmet_stack())
+GRIDMET_VARIABLES = ['erc', 'fm100', 'vpd', 'vs']
+GRIDMET_BANDS = GRIDMET_VARIABLES + ['hdw']
+
+
+# get_gridmet_stack() adds hdw to every daily image of a stack (days x GRIDMET_VARIABLES x rows
+# x cols), so it's calculated for each day before taking the median
+def get_gridmet_stack(daily):
+    hdw = daily[:, GRIDMET_VARIABLES.index('vpd')] * daily[:, GRIDMET_VARIABLES.index('vs')]
+
+    return np.concatenate([daily, hdw[:, np.newaxis]], axis=1)
+
+
+# get_gridmet_composite() mirrors get_gridmet_composite(): it reads the GRIDMET_VARIABLES of every
+# daily image between start and end (warped onto grid) and reduces all of GRIDMET_BANDS in a
+# single median, returning a dictionary of band -> median, or None if there are no daily images.
+# If footprint (rows x cols of grid) is given, the images are read and reduced only for its blocks
+# (see get_block_windows()), and the medians are NaN outside of it.
+def get_gridmet_composite(source, start, end, grid, resample_method, footprint=None):
+    block_rows = grid.n_rows if footprint is None else FOOTPRINT_BLOCK_ROWS
+    composite = get_footprint_array((len(GRIDMET_BANDS), grid.n_rows, grid.n_cols), footprint)
+
+    for window in get_block_windows(grid.n_rows, grid.n_cols, block_rows, footprint):
+        daily = source.gridmet.read_days(start, end, GRIDMET_VARIABLES, io.get_window_grid(grid, window),
+                                         resample_method)
+
+        # The same days cover every block
+        if daily is None:
+            return None
+
+        (row_start, row_stop), (col_start, col_stop) = window
+        inside = footprint[row_start:row_stop, col_start:col_stop] if footprint is not None else None
+        composite[:, row_start:row_stop, col_start:col_stop] = get_footprint_composite(get_gridmet_stack(daily), inside)
+
+    return dict(zip(GRIDMET_BANDS, composite))
+
+
+# get_weather() returns the fire weather/fuel condition variables: median ERC, 100-hour fuel
+# moisture, and vapor pressure deficit for the 3 days prior to the fire and median wind speed,
+# hot-dry-windy index, and vapor pressure deficit for the first 2 days of the fire (only where
+# footprint is True, if it's given)
+def get_weather(fire, source, grid, resample_method, footprint=None):
+    pre_window, early_window = get_gridmet_windows(fire.alarm_date)
+
+    pre = get_gridmet_composite(source, pre_window[0], pre_window[1], grid, resample_method, footprint)
+    early = get_gridmet_composite(source, early_window[0], early_window[1], grid, resample_method, footprint)
+
+    if pre is None or early is None:
+        return None
+
+    return {'prefire_erc': pre['erc'], 'prefire_fm100': pre['fm100'], 'prefire_vpd': pre['vpd'],
+            'earlyfire_vs': early['vs'], 'earlyfire_hdw': early['hdw'], 'earlyfire_vpd': early['vpd']}
+
+
+# Dates --------------------------------------------------------------------
+
+# get_date_bands() returns the values of the alarm date bands (constant across a fire):
+# milliseconds since the epoch, day of the year (starting at 0, as ee.Date.getRelative()),
+# year, month, and day of the month
+def get_date_bands(alarm_date):
+    dt = to_datetime(alarm_date)
+
+    return {'date': alarm_date,
+            'ordinal_day': dt.timetuple().tm_yday - 1,
+            'alarm_year': dt.year,
+            'alarm_month': dt.month,
+            'alarm_day': dt.day}
+
+
+# All variables --------------------------------------------------------------
+
+# get_grid_topography() returns the topographic layers of get_topography() on grid (without a
+# halo), straight from the terrain cache when there is one for this grid. Otherwise, if footprint
+# (rows x cols of grid) is given, they're calculated only for its blocks (see get_block_windows(),
+# each with its own halo), and are NaN outside of it.
+def get_grid_topography(source, grid, resample_method, footprint=None):
+    if source.terrain is not None and source.terrain.covers(grid, resample_method):
+        return source.terrain.read(grid)
+
+    halo = max(PIXEL_RADII) + 1
+    if footprint is None:
+        topography = get_topography(source, io.buffer_grid(grid, halo), resample_method)
+
+        return {name: io.crop_halo(value, halo) for name, value in topography.items()}
+
+    topography = {}
+    for window in get_block_windows(grid.n_rows, grid.n_cols, FOOTPRINT_BLOCK_ROWS, footprint):
+        block = get_topography(source, io.buffer_grid(io.get_window_grid(grid, window), halo), resample_method)
+
+        (row_start, row_stop), (col_start, col_stop) = window
+        inside = footprint[row_start:row_stop, col_start:col_stop]
+        for name, value in block.items():
+            if name not in topography:
+                topography[name] = get_footprint_array((grid.n_rows, grid.n_cols), footprint)
+            topography[name][row_start:row_stop, col_start:col_stop] = np.where(inside, io.crop_halo(value, halo),
+                                                                                 np.nan)
+
+    return topography
+
+
+# get_fire_image() puts together the FireImage of get_variables() from a fire's FireContext (on
+# grid with a halo of halo pixels), weather, and topography (on grid)
+def get_fire_image(fire, context, weather, topography, grid, halo, compact=False):
+    variables = {name: io.crop_halo(value, halo) for name, value in get_severity(context).items()}
+
+    for pixel_radius in PIXEL_RADII:
+        het, nbhd_mean = context.get_neighborhood_stats(pixel_radius)
+        variables['nbhd_sd_ndvi_' + str(pixel_radius)] = io.crop_halo(het, halo)
+        variables['nbhd_mean_ndvi_' + str(pixel_radius)] = io.crop_halo(nbhd_mean, halo)
+
+    if not compact:
+        variables.update(get_date_bands(fire.alarm_date))
+        variables['longitude'], variables['latitude'] = io.get_pixel_lonlat(grid)
+
+    variables.update(topography)
+
+    for i, band in enumerate(LANDSAT_BANDS):
+        variables[band + '_prefire'] = io.crop_halo(context.preFire_composite[i], halo)
+        variables[band + '_postfire'] = io.crop_halo(context.postFire_composite[i], halo)
+
+    variables.update(weather)
+
+    band_names = COMPACT_BAND_NAMES if compact else BAND_NAMES
+
+    shape = (grid.n_rows, grid.n_cols)
+    bands = np.stack([np.broadcast_to(np.asarray(variables[name], dtype=np.float32), shape)
+                      for name in band_names])
+
+    properties = dict(fire.properties)
+    properties.update({'system:index': fire.fire_id, 'alarm_date': fire.alarm_date})
+
+    return FireImage(bands, list(band_names), grid, properties)
+
+
+# get_variables() is the local version of get_variables(): it returns a FireImage with all 50
+# bands (in the order of rsr.bands.BAND_NAMES) on the fire's EPSG:3310 30 m grid, or None if
+# there isn't Landsat imagery both before and after the fire or there isn't GRIDMET imagery.
+# If compact is True, the date, longitude, and latitude bands are left out
+# (rsr.bands.COMPACT_BAND_NAMES; see rsr.sidecar). max_block_mb bounds the memory used for the
+# scenes of each block of the Landsat composites (see get_streaming_composite()).
+# If perimeter_only is True, the bands are only calculated for the pixels covered by the fire
+# perimeter (see get_perimeter_mask()), and only the pixels of the scenes, GRIDMET, and the DEM
+# within the halo of those are read; the bands that depend on them are NaN elsewhere (and
+# get_variables() returns None if no pixel of grid is inside the perimeter).
+def get_variables(fire, timeWindow, resample_method, sats, source, grid=None, compact=False,
+                  max_block_mb=MAX_BLOCK_MB, perimeter_only=False):
+    if grid is None:
+        grid = io.get_fire_grid(fire.geometry.bounds)
+
+    # Neighborhood statistics and terrain at the edge of the grid need the pixels just beyond it
+    halo = max(PIXEL_RADII) + 1
+    halo_grid = io.buffer_grid(grid, halo)
+    footprint = get_perimeter_mask(fire.geometry, halo_grid) if perimeter_only else None
+    grid_footprint = io.crop_halo(footprint, halo) if perimeter_only else None
+
+    context = FireContext(fire, timeWindow, resample_method, sats, source, halo_grid, max_block_mb=max_block_mb,
+                          footprint=footprint)
+    if not context.has_imagery:
+        return None
+
+    weather = get_weather(fire, source, grid, resample_method, grid_footprint)
+    if weather is None:
+        return None
+
+    return get_fire_image(fire, context, weather, get_grid_topography(source, grid, resample_method, grid_footprint),
+                          grid, halo, compact)
+
+
+# get_perimeter_mask() returns True for every pixel of grid that geometry covers at least in part,
+# as Earth Engine's clip() keeps them (see assess_whole_fire() in rsr/earthengine.py), rather than
+# only those whose center is inside it. (A pixel that the perimeter only touches at an edge or a
+# corner is kept too, where clip() would mask it.)
+def get_perimeter_mask(geometry, grid):
+    from rasterio.features import geometry_mask
+
+    return geometry_mask([geometry], out_shape=(grid.n_rows, grid.n_cols),
+                         transform=io.get_grid_transform(grid), all_touched=True, invert=True)
+
+
+# mask_to_perimeter() masks out every pixel of a FireImage that the fire perimeter doesn't cover
+def mask_to_perimeter(var_img, geometry):
+    inside = get_perimeter_mask(geometry, var_img.grid)
+
+    return var_img._replace(bands=np.where(inside, var_img.bands, np.nan).astype(np.float32))
+
+
+# assess_whole_fire() mirrors assess_whole_fire(): it returns a function that calculates all
+# variables for a fire and masks out every pixel outside of the fire perimeter
+def assess_whole_fire(timeWindow, resample_method, sats, source, compact=False, max_block_mb=MAX_BLOCK_MB):
+
+    def assess_whole_fire_internal(fire):
+        var_img = get_variables(fire, timeWindow, resample_method, sats, source, compact=compact,
+                                max_block_mb=max_block_mb, perimeter_only=True)
+
+        if var_img is None:
+            return None
+
+        return mask_to_perimeter(var_img, fire.geometry)
+
+    return assess_whole_fire_internal
+
+
+# get_fire_perimeter() returns a GeoJSON geometry in EPSG:4326 (a dict, or the text of one, like
+# the .geo column of the fire metadata) as a shapely geometry in EPSG:3310
+def get_fire_perimeter(geometry):
+    import shapely
+    from pyproj import Transformer
+    from shapely.geometry import shape
+
+    if isinstance(geometry, str):
+        geometry = json.loads(geometry)
+
+    transformer = Transformer.from_crs('EPSG:4326', io.CRS, always_xy=True)
+
+    return shapely.transform(shape(geometry), transformer.transform, interleaved=False)
+
+
+# read_fires() returns a Fire for each fire of the fire metadata .csv (see
+# rsr.fires.read_fire_metadata()) with a perimeter in its .geo column, or for just those in
+# fire_ids, in the order of the metadata
+def read_fires(path, min_year=1984, fire_ids=None, keep_columns=()):
+    fire_index = read_fire_metadata(path, min_year, keep_columns)
+    fire_ids = set(fire_index.get_fire_ids() if fire_ids is None else fire_ids)
+
+    # The .geo column can be longer than the csv module allows by default
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+    perimeters = {}
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        id_column = [column for column in FIRE_ID_COLUMNS if column in reader.fieldnames][0]
+
+        for row in reader:
+            if row[id_column] in fire_ids and row[id_column] in fire_index and row.get('.geo') not in (None, ''):
+                perimeters[row[id_column]] = get_fire_perimeter(row['.geo'])
+
+    return [Fire(fire.fire_id, fire.alarm_date, perimeters[fire.fire_id], fire.properties)
+            for fire in fire_index if fire.fire_id in perimeters]
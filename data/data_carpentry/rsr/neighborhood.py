@@ -0,0 +1,124 @@
+# Neighborhood (focal) statistics for the local backend.
+#
+# These match the Earth Engine calculations in get_hetNDVI() and get_neighborhood_mean_NDVI(),
+# which use reduceNeighborhood() with the ring kernels from create_kernel(): a square window
+# with a pixel radius of r (so (2r + 1) x (2r + 1) pixels) in which every pixel gets the same
+# weight except the focal pixel, which gets a weight of 0.
+#
+# Rather than visiting every pixel in every window, we build summed-area tables (2-D cumulative
+# sums) of the values, the squared values, and the count of valid pixels. The sum over any window
+# is then 4 lookups into each table, so the cost per pixel does not grow with the radius, and all
+# radii share the same tables. The focal pixel is removed by subtracting its own contribution
+# from each window sum.
+#
+# The tables are exact: the values are rounded to multiples of 2^-QUANTUM_BITS (about 0.00024,
+# far finer than the scales of the int16 band schema in rsr.output_format) and summed as 64-bit
+# integers. A cumulative sum of floats depends on every pixel above and to the left of a window,
+# so the same pixel would come out differently in a tile (see rsr.tiles) than in the whole fire.
+# The integer sums can overflow over a large area, but they wrap around, and the difference of the
+# 4 lookups is still the exact window sum, so the statistics of a pixel depend only on the pixels in
+# its window: an area processed in tiles or blocks with a halo of max(pixel_radii) pixels (see
+# rsr.tiles and rsr.local.get_streaming_composite()) comes out bit-identical to the area processed
+# whole. The standard deviation comes from the (exact) sum of the squared differences between each
+# neighbor and the focal pixel, so it doesn't lose precision when the spread is small relative to
+# the values (e.g., elevation). The sums only stay exact for values within get_max_value() (about
+# +/-41,000 for radii up to 4, plenty for NDVI * 1000 and elevation in meters); pixels beyond it,
+# or that aren't finite (e.g., NDVI where both bands are 0), are treated as masked.
+#
+# Masked pixels are represented as NaN. They don't contribute to any window, and (like
+# reduceNeighborhood() with its default skipMasked=True) a masked focal pixel gets a NaN output.
+# The standard deviation is the population standard deviation, as from ee.Reducer.stdDev().
+# Pixels beyond the edge of the array are treated as masked, so callers that want values at
+# the edge of an area identical to a larger mosaic should read a halo of max(pixel_radii)
+# pixels around it.
+
+import numpy as np
+
+# Values are rounded to multiples of 2^-QUANTUM_BITS before they're summed
+QUANTUM_BITS = 12
+
+
+# summed_area_table() returns the cumulative sum (int64, wrapping around on overflow) of an
+# integer array over its last two (row and column) axes, with a leading row and column of zeros
+# so that a window sum never needs a special case at the top or left edge
+def summed_area_table(x):
+    shape = x.shape[:-2] + (x.shape[-2] + 1, x.shape[-1] + 1)
+    sat = np.zeros(shape, dtype=np.int64)
+    np.cumsum(x, axis=-2, out=sat[..., 1:, 1:])
+    np.cumsum(sat[..., 1:, 1:], axis=-1, out=sat[..., 1:, 1:])
+
+    return sat
+
+
+# window_sum() returns the sum over the (2 * pixel_radius + 1)-pixel square window centered
+# on each pixel, using a summed-area table from summed_area_table(). Windows are truncated at
+# the edges of the array.
+def window_sum(sat, pixel_radius):
+    n_rows = sat.shape[-2] - 1
+    n_cols = sat.shape[-1] - 1
+
+    top = np.clip(np.arange(n_rows) - pixel_radius, 0, n_rows)
+    bottom = np.clip(np.arange(n_rows) + pixel_radius + 1, 0, n_rows)
+    left = np.clip(np.arange(n_cols) - pixel_radius, 0, n_cols)
+    right = np.clip(np.arange(n_cols) + pixel_radius + 1, 0, n_cols)
+
+    sat_bottom = np.take(sat, bottom, axis=-2)
+    sat_top = np.take(sat, top, axis=-2)
+
+    return (np.take(sat_bottom, right, axis=-1) - np.take(sat_top, right, axis=-1) -
+            np.take(sat_bottom, left, axis=-1) + np.take(sat_top, left, axis=-1))
+
+
+# get_max_value() returns the largest absolute value that the sums for windows of pixel_radius can
+# hold exactly: the sum of the squared differences from the focal pixel has to fit in an int64
+def get_max_value(pixel_radius):
+    n_neighbors = (2 * pixel_radius + 1) ** 2 - 1
+
+    return np.sqrt(2.0 ** 63 / n_neighbors) / 2 / 2 ** QUANTUM_BITS
+
+
+# get_neighborhood_stats() returns the neighborhood mean and standard deviation (excluding the
+# focal pixel) for every pixel and every pixel radius in pixel_radii.
+# x can be a single image (rows x cols) or a stack of images (e.g., scenes x rows x cols);
+# the statistics are calculated separately for each image in a stack.
+# The result is a dictionary keyed by pixel radius, each holding a (mean, sd) tuple of arrays
+# with the same shape as x.
+def get_neighborhood_stats(x, pixel_radii=(1, 2, 3, 4)):
+    x = np.asarray(x, dtype=np.float64)
+    pixel_radii = [int(pixel_radius) for pixel_radius in pixel_radii]
+
+    # Pixels the sums can't hold exactly (including inf and NaN) are masked
+    with np.errstate(invalid='ignore'):
+        valid = np.abs(x) < get_max_value(max(pixel_radii))
+    x = np.where(valid, x, np.nan)
+
+    quantum = 2.0 ** -QUANTUM_BITS
+    q = np.where(valid, np.rint(x / quantum), 0.0).astype(np.int64)
+    count = valid.astype(np.int64)
+
+    sat_sum = summed_area_table(q)
+    sat_sum_sq = summed_area_table(q * q)
+    sat_count = summed_area_table(count)
+
+    stats = {}
+    for pixel_radius in pixel_radii:
+        # Remove the focal pixel's own contribution (it is 0 if the focal pixel is masked)
+        n = window_sum(sat_count, pixel_radius) - count
+        s1 = window_sum(sat_sum, pixel_radius) - q
+        s2 = window_sum(sat_sum_sq, pixel_radius) - q * q
+
+        # The sum of the squared differences between each neighbor and the focal pixel
+        squared_differences = s2 - 2 * q * s1 + n * q * q
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s1 / n
+            # The variance around the mean, from the mean squared difference from the focal pixel
+            var = np.maximum(squared_differences / n - (mean - q) ** 2, 0.0)
+
+        # A single neighbor has no spread; don't let rounding say otherwise
+        var = np.where(n == 1, 0.0, var)
+
+        empty = (n == 0) | ~valid
+        stats[pixel_radius] = (np.where(empty, np.nan, mean * quantum), np.where(empty, np.nan, np.sqrt(var) * quantum))
+
+    return stats
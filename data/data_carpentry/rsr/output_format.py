@@ -0,0 +1,157 @@
+# The storage format of the per-fire rasters: one tiled, compressed Cloud-Optimized GeoTIFF per
+# fire, with every band stored as a scaled 16-bit integer.
+#
+# The rasters used to be exported as float32 (img.float()), so every band, including the ypmc
+# mask (0/1) and the date parts, took 4 bytes per pixel. BAND_FORMATS gives each band a scale and
+# offset instead, chosen so the band's range fits in an int16 at (better than) the precision we
+# use it at:
+#
+#   value = stored * scale + offset
+#
+# A GeoTIFF has a single data type for all of its bands, so every band is stored as int16, with
+# -32768 as nodata; dtype records the narrowest type that holds each band's stored values (e.g.,
+# uint8 for the ypmc mask), which formats that allow a type per band (see rsr.datacube) use.
+# With DEFLATE and a horizontal predictor, the mask and constant bands then take almost no space.
+# Values beyond a band's range are clamped to it (only RdNBR, RdNDVI, and RBR can get there,
+# where the pre-fire NBR or NDVI is close to 0).
+#
+# The scale and offset of each band are written into the GeoTIFF (GDAL's scale/offset band
+# metadata, which GDAL-based readers like terra apply when reading) and into the band schema
+# .csv (write_band_schema()), which 30_configure_frap-derived-imagery-metadata.R adds to the
+# raster band metadata so rasters can be converted back to their units in R.
+
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+from rsr.bands import BAND_NAMES
+from rsr.io import CRS, MS_PER_DAY, get_grid_transform
+
+STORAGE_DTYPE = 'int16'
+NODATA = -32768
+# The largest stored magnitude (NODATA is reserved for masked pixels)
+MAX_STORED = 32767
+
+# BandFormat is the storage format of one band
+BandFormat = namedtuple('BandFormat', ['name', 'dtype', 'scale', 'offset'])
+
+
+def _formats(names, dtype, scale, offset=0.0):
+    return [BandFormat(name, dtype, scale, offset) for name in names]
+
+
+BAND_FORMATS = {band_format.name: band_format for band_format in (
+    # Relative indices can be very large where the pre-fire index is close to 0
+    _formats(['rdnbr', 'rdndvi'], 'int16', 1.0) +
+    _formats(['rbr'], 'int16', 0.1) +
+    # NBR and NDVI (multiplied by 1000) and their neighborhood statistics
+    _formats(['prefire_nbr', 'postfire_nbr', 'prefire_ndvi', 'postfire_ndvi'], 'int16', 0.1) +
+    _formats(['nbhd_sd_ndvi_' + str(r) for r in range(1, 5)], 'int16', 0.1) +
+    _formats(['nbhd_mean_ndvi_' + str(r) for r in range(1, 5)], 'int16', 0.1) +
+    # The alarm date is stored as days since the epoch
+    _formats(['date'], 'int16', float(MS_PER_DAY)) +
+    _formats(['ordinal_day', 'alarm_year'], 'int16', 1.0) +
+    _formats(['alarm_month', 'alarm_day', 'ypmc'], 'uint8', 1.0) +
+    # About 0.00016 degrees (< 18 m) between stored values, centered on California
+    _formats(['longitude'], 'int16', 0.00016, -119.25) +
+    _formats(['latitude'], 'int16', 0.00016, 37.0) +
+    _formats(['slope'], 'int16', 0.01) +
+    _formats(['aspect'], 'int16', 0.02) +
+    _formats(['topo_roughness_' + str(r) for r in range(1, 5)], 'int16', 0.05) +
+    _formats(['elevation'], 'int16', 0.25) +
+    # Surface reflectance (x 10000) and brightness temperature (K x 10); medians of an even number
+    # of scenes end in .5
+    _formats([band + '_' + window for window in ['prefire', 'postfire']
+              for band in ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7']], 'int16', 0.5) +
+    _formats(['prefire_erc', 'prefire_fm100'], 'int16', 0.01) +
+    _formats(['prefire_vpd', 'earlyfire_vpd', 'earlyfire_vs'], 'int16', 0.001) +
+    _formats(['earlyfire_hdw'], 'int16', 0.01))}
+
+
+# get_band_formats() returns the BandFormat of each band in band_names
+def get_band_formats(band_names=BAND_NAMES):
+    return [BAND_FORMATS[name] for name in band_names]
+
+
+# encode() converts a float array of bands (bands x rows x cols, NaN where masked) to its stored
+# int16 values
+def encode(bands, band_names=BAND_NAMES):
+    formats = get_band_formats(band_names)
+    scale = np.array([band_format.scale for band_format in formats])[:, np.newaxis, np.newaxis]
+    offset = np.array([band_format.offset for band_format in formats])[:, np.newaxis, np.newaxis]
+
+    with np.errstate(invalid='ignore'):
+        stored = np.clip(np.round((bands - offset) / scale), -MAX_STORED, MAX_STORED)
+
+    return np.where(np.isnan(bands), NODATA, stored).astype(STORAGE_DTYPE)
+
+
+# decode() converts stored int16 values back to float32 values, with NaN where masked
+def decode(stored, band_names=BAND_NAMES):
+    formats = get_band_formats(band_names)
+    scale = np.array([band_format.scale for band_format in formats])[:, np.newaxis, np.newaxis]
+    offset = np.array([band_format.offset for band_format in formats])[:, np.newaxis, np.newaxis]
+
+    values = stored * scale + offset
+
+    return np.where(stored == NODATA, np.nan, values).astype(np.float32)
+
+
+# write_cog() writes the bands of a FireImage (see rsr.local) to a Cloud-Optimized GeoTIFF,
+# encoded with BAND_FORMATS (or as float32 if encoded is False), with the band names as band
+# descriptions and the fire's properties as dataset tags
+def write_cog(path, image, encoded=True, blocksize=256):
+    from rasterio.io import MemoryFile
+    from rasterio.shutil import copy
+
+    if encoded:
+        data, dtype, nodata = encode(image.bands, image.band_names), STORAGE_DTYPE, NODATA
+    else:
+        data, dtype, nodata = image.bands.astype(np.float32), 'float32', np.nan
+
+    profile = {'driver': 'GTiff', 'width': image.grid.n_cols, 'height': image.grid.n_rows,
+               'count': len(image.band_names), 'dtype': dtype, 'nodata': nodata, 'crs': CRS,
+               'transform': get_grid_transform(image.grid)}
+
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dst:
+            dst.write(data)
+            for i, name in enumerate(image.band_names):
+                dst.set_band_description(i + 1, name)
+            if encoded:
+                formats = get_band_formats(image.band_names)
+                dst.scales = [band_format.scale for band_format in formats]
+                dst.offsets = [band_format.offset for band_format in formats]
+            # GDAL reads a ':' in a tag name as the start of a metadata domain
+            dst.update_tags(**{str(key).replace(':', '_'): str(value) for key, value in image.properties.items()})
+
+            copy(dst, path, driver='COG', COMPRESS='DEFLATE',
+                 PREDICTOR='2' if encoded else '3', BLOCKSIZE=str(blocksize))
+
+
+# read_cog() reads a per-fire raster (encoded or float32) and returns its bands as float32 with
+# NaN where masked, and its band names
+def read_cog(path):
+    import rasterio
+
+    with rasterio.open(path) as src:
+        band_names = list(src.descriptions)
+        data = src.read()
+
+        if src.dtypes[0] == STORAGE_DTYPE:
+            return decode(data, band_names), band_names
+
+        return data.astype(np.float32), band_names
+
+
+# write_band_schema() writes BAND_FORMATS for band_names to a .csv file (band_number, band_name,
+# storage_dtype, dtype, scale, offset, nodata)
+def write_band_schema(path, band_names=BAND_NAMES):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['band_number', 'band_name', 'storage_dtype', 'dtype', 'scale', 'offset', 'nodata'])
+
+        for i, band_format in enumerate(get_band_formats(band_names)):
+            writer.writerow([i + 1, band_format.name, STORAGE_DTYPE, band_format.dtype,
+                             repr(band_format.scale), repr(band_format.offset), NODATA])
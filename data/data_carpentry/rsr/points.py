@@ -0,0 +1,157 @@
+# Band values at points (like the CBI plots), interpolated from just the pixels around each point.
+#
+# calibrate_cbi() in ee-remote-sensing-resistance/rsr-functions.js resamples every Landsat scene
+# before compositing so that the value read at a CBI plot is interpolated rather than the value of
+# the pixel the plot falls in (see mask_cloud_water_snow()). To read a few hundred plots, the local
+# backend would have to resample and composite each fire's whole footprint. extract_points()
+# instead calculates the variables (with get_variables(), and no resampling) on only the
+# kernel-sized window of pixels around each point (plus the halo that get_variables() always adds
+# for the neighborhood statistics and terrain), and then applies the interpolation kernel to every
+# point at once. The points are grouped by alarm date (the plots of a fire) and by
+# POINT_GROUP_SIZE-pixel cell, and the windows of a group are calculated together, as the
+# perimeter of one get_variables() call (see get_variables(..., perimeter_only=True)), so each
+# scene and the GRIDMET and terrain are read once per group rather than once per point:
+#
+#   'none'       the pixel the point falls in (1 x 1)
+#   'bilinear'   the 2 x 2 pixels whose centers surround the point
+#   'bicubic'    the 4 x 4 pixels around the point, with the cubic convolution kernel of Keys (1981)
+#                (a = -0.5, as in GDAL)
+#
+# Interpolating the variables isn't quite the same as calculating them from resampled scenes (a
+# median of interpolated values isn't an interpolated median), but it's the same kernel on the
+# same pixels. A point with a masked pixel anywhere in its window gets NaN.
+#
+#   plots = [Fire(plot_id, alarm_date, Point(x, y), {}) for ...]     (x, y in EPSG:3310)
+#   columns = extract_points(plots, 48, 'bicubic', ['5', '7'], source)
+
+import numpy as np
+
+from rsr import io, local
+from rsr.bands import BAND_NAMES
+
+# Pixels on each side of the window each resampling method reads around a point
+KERNEL_SIZES = {'none': 1, 'bilinear': 2, 'bicubic': 4}
+
+# The parameter of the cubic convolution kernel
+CUBIC_A = -0.5
+
+# Columns of each point, before its bands
+POINT_COLUMNS = ['id', 'alarm_date', 'x', 'y']
+
+# Pixels on each side of the cells that points with the same alarm date are grouped by (so the
+# grid of a group stays small when its points are far apart)
+POINT_GROUP_SIZE = 512
+
+
+# cubic_kernel() is the cubic convolution kernel of Keys (1981) at distances d (in pixels)
+def cubic_kernel(d, a=CUBIC_A):
+    d = np.abs(d)
+
+    return np.where(d <= 1, ((a + 2) * d - (a + 3)) * d * d + 1,
+                    np.where(d < 2, ((a * d - 5 * a) * d + 8 * a) * d - 4 * a, 0))
+
+
+# get_kernel_weights() returns the weights (points x kernel size) of the pixels of each point's
+# window along one axis, where t is the distance (in pixels, from 0 to 1) of each point past the
+# center of the pixel before it
+def get_kernel_weights(t, resample_method):
+    if resample_method == 'none':
+        return np.ones((len(t), 1))
+
+    if resample_method == 'bilinear':
+        return np.stack([1 - t, t], axis=1)
+
+    if resample_method == 'bicubic':
+        return cubic_kernel(np.stack([1 + t, t, 1 - t, 2 - t], axis=1))
+
+    raise ValueError('unknown resample method: ' + str(resample_method))
+
+
+# get_point_windows() returns the first column and row of each point's window (on the grid of
+# every fire, see io.get_fire_grid(), with column 0 starting at x = 0 and row 0 starting at y = 0)
+# and the distances t of get_kernel_weights() for each point's columns and rows
+def get_point_windows(x, y, resample_method, scale=io.SCALE):
+    size = KERNEL_SIZES[resample_method]
+
+    if size == 1:
+        return np.floor(x / scale).astype(np.int64), np.floor(-y / scale).astype(np.int64), np.zeros(len(x)), np.zeros(len(y))
+
+    # Positions in pixels from the center of pixel 0
+    u, v = x / scale - 0.5, -y / scale - 0.5
+    col, row = np.floor(u), np.floor(v)
+
+    return (col.astype(np.int64) - (size // 2 - 1), row.astype(np.int64) - (size // 2 - 1), u - col, v - row)
+
+
+# interpolate() applies the kernel of resample_method to windows (points x bands x size x size),
+# returning the value of every band at each point (points x bands)
+def interpolate(windows, tx, ty, resample_method):
+    wx = get_kernel_weights(tx, resample_method)
+    wy = get_kernel_weights(ty, resample_method)
+
+    return np.einsum('pbij,pi,pj->pb', windows, wy, wx).astype(np.float32)
+
+
+# get_point_groups() returns the positions of the points that are calculated together: those with
+# the same alarm date whose windows start in the same POINT_GROUP_SIZE-pixel cell
+def get_point_groups(points, cols, rows):
+    groups = {}
+    for i, point in enumerate(points):
+        key = (point.alarm_date, int(cols[i]) // POINT_GROUP_SIZE, int(rows[i]) // POINT_GROUP_SIZE)
+        groups.setdefault(key, []).append(i)
+
+    return list(groups.values())
+
+
+# get_group_windows() returns the windows (points x bands x size x size) of the points at
+# positions of a group, from a single get_variables() call on the grid around all of their windows
+# that calculates only the pixels in their windows
+def get_group_windows(points, positions, cols, rows, size, timeWindow, sats, source, band_names):
+    import shapely
+    from shapely.geometry import box
+
+    col_start, row_start = int(cols[positions].min()), int(rows[positions].min())
+    grid = io.Grid(col_start * io.SCALE, -row_start * io.SCALE, int(rows[positions].max()) + size - row_start,
+                   int(cols[positions].max()) + size - col_start, io.SCALE)
+    # Boxes a quarter of a pixel inside each window, so that get_perimeter_mask() doesn't also take the
+    # pixels that the windows' edges touch
+    inset = io.SCALE / 4
+    windows = shapely.union_all([box(cols[i] * io.SCALE + inset, -(rows[i] + size) * io.SCALE + inset,
+                                     (cols[i] + size) * io.SCALE - inset, -rows[i] * io.SCALE - inset)
+                                 for i in positions])
+
+    group = local.Fire(points[positions[0]].fire_id, points[positions[0]].alarm_date, windows, {})
+    var_img = local.get_variables(group, timeWindow, 'none', sats, source, grid=grid, perimeter_only=True)
+
+    if var_img is None:
+        return None
+
+    bands = var_img.bands[[var_img.band_names.index(name) for name in band_names]]
+
+    return np.stack([bands[:, rows[i] - row_start:rows[i] - row_start + size, cols[i] - col_start:cols[i] - col_start + size]
+                     for i in positions])
+
+
+# extract_points() returns the value of every band at every point (Fire records with a shapely
+# Point geometry in EPSG:3310) as a dictionary of column -> array (POINT_COLUMNS and band_names),
+# with NaN for the bands of a point without imagery
+def extract_points(points, timeWindow, resample_method, sats, source, band_names=BAND_NAMES):
+    size = KERNEL_SIZES[resample_method]
+    x = np.array([point.geometry.x for point in points], dtype=np.float64)
+    y = np.array([point.geometry.y for point in points], dtype=np.float64)
+    cols, rows, tx, ty = get_point_windows(x, y, resample_method)
+
+    windows = np.full((len(points), len(band_names), size, size), np.nan, dtype=np.float32)
+    for positions in get_point_groups(points, cols, rows):
+        group_windows = get_group_windows(points, positions, cols, rows, size, timeWindow, sats, source, band_names)
+
+        if group_windows is not None:
+            windows[positions] = group_windows
+
+    columns = {'id': np.array([point.fire_id for point in points], dtype=object),
+               'alarm_date': np.array([point.alarm_date for point in points], dtype=np.int64),
+               'x': x,
+               'y': y}
+    columns.update(zip(band_names, interpolate(windows, tx, ty, resample_method).T))
+
+    return columns
@@ -0,0 +1,68 @@
+# A pre-flight check of which fires will yield an image, without calculating any pixels.
+#
+# assess_whole_fire() returns null for a fire exactly when one of the windows it composites is
+# empty: there are no Landsat scenes (from the sensors in sats) in the pre-fire window or in the
+# post-fire window, or no GRIDMET images in the pre-fire or early-fire window. So rather than
+# evaluating the whole image for every fire (img.getInfo() on ~1,100 fires, ~26 of which come
+# back null), it's enough to count the images in each window.
+#
+# The counts for every fire come either from Earth Engine, all in one request (see
+# get_imagery_counts() and preflight_imagery() in rsr/earthengine.py), or from
+# the local scene and GRIDMET catalogs (count_local_imagery()). Either way, the counts for a fire
+# are a dictionary keyed by the names from get_count_names() and yields_image() decides whether
+# the fire will yield an image.
+
+from rsr import io
+from rsr.local import get_gridmet_windows, get_landsat_windows
+
+
+# get_count_names() returns the names of the counts for a set of sensors: the number of Landsat
+# scenes from each sensor in the pre- and post-fire windows, and the number of daily GRIDMET
+# images in the pre- and early-fire windows
+def get_count_names(sats):
+    return (['n_preFire_l' + str(sat) for sat in sats] +
+            ['n_postFire_l' + str(sat) for sat in sats] +
+            ['n_preFire_gridmet', 'n_earlyFire_gridmet'])
+
+
+# yields_image() returns True if the counts for a fire (or None, for a fire that wasn't found)
+# mean that assess_whole_fire() will return an image for it
+def yields_image(counts, sats):
+    if counts is None:
+        return False
+
+    n_pre = sum(counts['n_preFire_l' + str(sat)] for sat in sats)
+    n_post = sum(counts['n_postFire_l' + str(sat)] for sat in sats)
+
+    return n_pre > 0 and n_post > 0 and counts['n_preFire_gridmet'] > 0 and counts['n_earlyFire_gridmet'] > 0
+
+
+# count_local_imagery() returns the counts for a fire (an rsr.local.Fire) from the catalogs of
+# a LocalSource, using the same windows and footprint test as rsr.local.get_variables()
+def count_local_imagery(fire, timeWindow, sats, source):
+    bounds = fire.geometry.bounds
+    (prestart, preend), (poststart, postend) = get_landsat_windows(fire.alarm_date, timeWindow)
+    pre_window, early_window = get_gridmet_windows(fire.alarm_date)
+
+    pre_scenes = io.filter_scenes(source.scenes, prestart, preend, bounds, sats)
+    post_scenes = io.filter_scenes(source.scenes, poststart, postend, bounds, sats)
+
+    counts = {}
+    for sat in sats:
+        counts['n_preFire_l' + str(sat)] = len([scene for scene in pre_scenes if scene.sensor == str(sat)])
+        counts['n_postFire_l' + str(sat)] = len([scene for scene in post_scenes if scene.sensor == str(sat)])
+
+    counts['n_preFire_gridmet'] = len(source.gridmet.filter_days(pre_window[0], pre_window[1]))
+    counts['n_earlyFire_gridmet'] = len(source.gridmet.filter_days(early_window[0], early_window[1]))
+
+    return counts
+
+
+# preflight_local() returns a dictionary of fire_id -> counts for every fire in fires
+def preflight_local(fires, timeWindow, sats, source):
+    return {fire.fire_id: count_local_imagery(fire, timeWindow, sats, source) for fire in fires}
+
+
+# summarize_preflight() returns the fire_ids (in the order of fire_ids) that won't yield an image
+def summarize_preflight(fire_ids, imagery_counts, sats):
+    return [fire_id for fire_id in fire_ids if not yields_image(imagery_counts.get(fire_id), sats)]
@@ -0,0 +1,218 @@
+# Quick-look images of the severity of every per-fire raster, for checking the whole archive by eye.
+#
+# A preview used to be a getThumbUrl() request per fire (29_ee-get-frap-derived-imagery.py) or a
+# full-resolution levelplot() (31_basic-manipulations-of-remote-sensing-resistance-rasters.R).
+# render_quicklooks() instead renders each fire's rasters on disk, in a pool of processes:
+#
+#   - build_overviews() adds overviews (reduced-resolution copies, halving the resolution each
+#     time) to a raster that doesn't have them yet. Rasters exported as Cloud-Optimized GeoTIFFs
+#     already do; the others are read in full once, the first time.
+#   - render_quicklook() reads RBR and/or RdNBR from the coarsest overview that's still at least
+#     size pixels across (so a quick-look reads a few tiles rather than the whole raster), colors
+#     each pixel by its severity class with the calibrated thresholds (see rsr.calibration), and
+#     writes it as a PNG, transparent outside the perimeter.
+#
+# Every quick-look is listed in an index .csv (quicklooks.csv) with the fire, the overview it was
+# read from, and the share of the fire's pixels in each severity class, so fires with unusual
+# severity can be found without opening every image.
+#
+#   models = {'RBR': read_calibration_model(), 'RdNBR': read_calibration_model(response='RdNBR')}
+#   render_quicklooks(raster_paths, '../data_output/quicklooks', models, n_workers=8)
+#
+#   python -m rsr.quicklook ../data_output/wildfire-severity_..._rasters ../data_output/quicklooks
+
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rsr.calibration import CALIBRATION_PATH, SEVERITY_CLASSES, get_severity_class, read_calibration_model
+from rsr.output_format import decode
+from rsr.sidecar import FireRaster, get_raster_fire
+
+# The band of each severity metric of the calibration
+RESPONSE_BANDS = {'RBR': 'rbr', 'RdNBR': 'rdnbr'}
+
+# The color of each severity class (in the order of SEVERITY_CLASSES), like the palette of RBR_viz
+SEVERITY_COLORS = ['008000', 'ffff00', 'ffa500', 'ff0000']
+
+# Pixels across the longest side of a quick-look (at least)
+QUICKLOOK_SIZE = 256
+
+# Overviews are built down to this many pixels across the longest side
+OVERVIEW_MIN_SIZE = 64
+
+INDEX_COLUMNS = ['fire_id', 'alarm_date', 'response', 'path', 'raster', 'overview', 'n_pixels'] + SEVERITY_CLASSES
+
+
+# get_overview_factors() returns the overview factors (2, 4, 8, ...) of a raster of n_rows x n_cols
+# pixels, down to the first overview whose longest side is at most min_size pixels
+def get_overview_factors(n_rows, n_cols, min_size=OVERVIEW_MIN_SIZE):
+    factors = []
+    factor = 2
+    while max(n_rows, n_cols) / (factor // 2) > min_size:
+        factors.append(factor)
+        factor *= 2
+
+    return factors
+
+
+# build_overviews() adds overviews to the raster at path (with nearest neighbor resampling, which
+# keeps the mask and date bands meaningful) unless it already has them. Returns True if it built them.
+def build_overviews(path, min_size=OVERVIEW_MIN_SIZE):
+    import rasterio
+    from rasterio.enums import Resampling
+
+    with rasterio.open(path) as src:
+        if len(src.overviews(1)) > 0:
+            return False
+        factors = get_overview_factors(src.height, src.width, min_size)
+
+    if len(factors) == 0:
+        return False
+
+    with rasterio.open(path, 'r+') as dst:
+        dst.build_overviews(factors, Resampling.nearest)
+        dst.update_tags(ns='rio_overview', resampling='nearest')
+
+    return True
+
+
+# choose_overview() returns the factor of the coarsest overview of a raster (1 for full
+# resolution) whose longest side is still at least size pixels
+def choose_overview(n_rows, n_cols, factors, size=QUICKLOOK_SIZE):
+    adequate = [factor for factor in factors if max(n_rows, n_cols) / factor >= size]
+
+    return max(adequate, default=1)
+
+
+# read_overview() returns a band of a FireRaster (float32, with NaN where masked) from the coarsest
+# adequate overview, and the overview's factor
+def read_overview(raster, name, size=QUICKLOOK_SIZE):
+    import rasterio
+    from rasterio.enums import Resampling
+
+    with rasterio.open(raster.path) as src:
+        index = raster.stored_band_names.index(name) + 1
+        factor = choose_overview(src.height, src.width, src.overviews(index), size)
+        # GDAL reads from the overview that matches the size asked for
+        out_shape = (-(-src.height // factor), -(-src.width // factor))
+        data = src.read(index, out_shape=out_shape, resampling=Resampling.nearest)
+
+    if raster.encoded:
+        return decode(data[np.newaxis], [name])[0], factor
+
+    return data.astype(np.float32), factor
+
+
+# colorize() returns the RGBA image (4 x rows x cols, uint8) of severity classes (from
+# get_severity_class()), transparent where the class is -1
+def colorize(classes, colors=SEVERITY_COLORS):
+    palette = np.array([[int(color[i:i + 2], 16) for i in (0, 2, 4)] + [255] for color in colors] + [[0, 0, 0, 0]],
+                       dtype=np.uint8)
+
+    # -1 picks the last (transparent) row of the palette
+    return np.moveaxis(palette[classes], -1, 0)
+
+
+# write_png() writes an RGBA image (4 x rows x cols, uint8) to a PNG file
+def write_png(path, rgba):
+    import rasterio
+
+    # No .aux.xml next to the PNG
+    with rasterio.Env(GDAL_PAM_ENABLED='NO'):
+        with rasterio.open(path, 'w', driver='PNG', width=rgba.shape[2], height=rgba.shape[1], count=4,
+                           dtype='uint8') as dst:
+            dst.write(rgba)
+
+
+# render_quicklook() writes a quick-look of each severity metric in models (response ->
+# CalibrationModel) for the raster at path into out_dir (named after the raster and the metric),
+# building its overviews first if build is True. Returns a row of the index for each quick-look.
+def render_quicklook(path, out_dir, models, size=QUICKLOOK_SIZE, build=True):
+    import warnings
+
+    from rasterio.errors import NotGeoreferencedWarning
+
+    if build:
+        build_overviews(path)
+
+    raster = FireRaster(path)
+    fire_id, alarm_date = get_raster_fire(raster)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    rows = []
+    for response, model in models.items():
+        severity, factor = read_overview(raster, RESPONSE_BANDS[response], size)
+        classes = get_severity_class(severity, model)
+
+        png_path = os.path.join(out_dir, name + '_' + response.lower() + '.png')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', NotGeoreferencedWarning)
+            write_png(png_path, colorize(classes))
+
+        n_pixels = int(np.sum(classes >= 0))
+        row = {'fire_id': fire_id, 'alarm_date': alarm_date, 'response': response, 'path': png_path,
+               'raster': path, 'overview': factor, 'n_pixels': n_pixels}
+        row.update({severity_class: float(np.sum(classes == i)) / max(n_pixels, 1)
+                    for i, severity_class in enumerate(SEVERITY_CLASSES)})
+        rows.append(row)
+
+    return rows
+
+
+# _render_quicklook() unpacks the arguments of one fire for the process pool
+def _render_quicklook(args):
+    return render_quicklook(**args)
+
+
+# render_quicklooks() renders the quick-looks of every raster in raster_paths with
+# render_quicklook() in a pool of n_workers processes and writes their index to
+# out_dir/quicklooks.csv (in the order of raster_paths). Returns the path of the index.
+def render_quicklooks(raster_paths, out_dir, models, size=QUICKLOOK_SIZE, build=True, n_workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    index_path = os.path.join(out_dir, 'quicklooks.csv')
+
+    jobs = [{'path': raster_path, 'out_dir': out_dir, 'models': models, 'size': size, 'build': build}
+            for raster_path in raster_paths]
+
+    with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count()) as pool, \
+            open(index_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+        writer.writeheader()
+
+        for rows in pool.map(_render_quicklook, jobs, chunksize=4):
+            writer.writerows(rows)
+
+    return index_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m rsr.quicklook',
+                                     description='Render severity quick-looks of per-fire rasters.')
+    parser.add_argument('rasters', help='a directory of per-fire rasters (.tif)')
+    parser.add_argument('output', help='the directory to write the quick-looks and their index to')
+    parser.add_argument('--responses', nargs='+', default=['RBR'], choices=sorted(RESPONSE_BANDS))
+    parser.add_argument('--calibration', default=CALIBRATION_PATH, help='cbi-calibration-model-comparison.csv')
+    parser.add_argument('--time-window', type=int, default=48, help='the time window of the calibration model')
+    parser.add_argument('--interpolation', default='bicubic', help='the interpolation of the calibration model')
+    parser.add_argument('--size', type=int, default=QUICKLOOK_SIZE, help='pixels across (at least)')
+    parser.add_argument('--no-overviews', action='store_true', help="don't add overviews to the rasters")
+    parser.add_argument('--workers', type=int, help='processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    models = {response: read_calibration_model(args.calibration, response, args.time_window, args.interpolation)
+              for response in args.responses}
+    raster_paths = sorted(glob.glob(os.path.join(args.rasters, '*.tif')))
+
+    print(render_quicklooks(raster_paths, args.output, models, args.size, not args.no_overviews, args.workers))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# Random and stratified pixel samples from every per-fire raster, in parallel, streamed to one
+# columnar table (Parquet or Feather).
+#
+# The samples behind 11_configure-fire-samples.R came from Earth Engine's stratifiedSample() (see
+# get_stratified_samps() in ee-remote-sensing-resistance/rsr-functions.js), and drawing new ones
+# from the downloaded rasters meant reading every raster in full. sample_fire() instead reads just
+# the band that defines the strata, draws the pixels, and then reads only the tiles of the raster
+# that hold at least one drawn pixel. sample_fires() samples the fires in a pool of processes and
+# writes each fire's samples to the table as soon as they're ready (in the order of
+# raster_paths), so memory use depends on the number of workers rather than the number of fires.
+#
+#   model = read_calibration_model()
+#   sample_fires(raster_paths, '../data_output/fire-samples.parquet', n=50, strata='severity',
+#                model=model)
+#
+# strata is one of:
+#   None          a random sample of n pixels from each fire (pixels with an RBR value)
+#   'ypmc'        n pixels (or n[value] pixels) of each value of the ypmc mask, like
+#                 get_stratified_samps() with classBand 'conifer_forest'
+#   'severity'    n pixels (or n[class] pixels) of each severity class of RBR (see
+#                 rsr.calibration.get_severity_class())
+# Every fire is sampled with its own random generator, seeded with seed and the fire's position in
+# raster_paths, so a sample doesn't depend on the number of workers or the order they finish in.
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rsr.bands import BAND_NAMES
+from rsr.calibration import get_severity_class
+from rsr.sidecar import FireRaster, get_raster_fire
+
+SEED = 727
+
+# Columns of each sample, before its bands
+SAMPLE_COLUMNS = ['fire_id', 'alarm_date', 'sample_id', 'stratum', 'row', 'col', 'x', 'y']
+
+
+# get_strata() returns the stratum of every pixel of a fire, -1 where the pixel can't be sampled
+def get_strata(raster, strata, model=None):
+    if strata is None:
+        return np.where(np.isnan(raster.read_band('rbr')), -1, 0)
+
+    if strata == 'ypmc':
+        ypmc = raster.read_band('ypmc')
+        return np.where(np.isnan(ypmc), -1, ypmc).astype(np.int8)
+
+    if strata == 'severity':
+        if model is None:
+            raise ValueError("sampling by severity class needs a calibration model (see rsr.calibration)")
+        return get_severity_class(raster.read_band('rbr'), model)
+
+    raise ValueError('unknown strata: ' + str(strata))
+
+
+# draw_pixels() returns the flat indices of up to n pixels (or n[stratum] pixels) drawn without
+# replacement from each stratum, and the stratum of each pixel
+def draw_pixels(stratum, n, rng):
+    flat = stratum.ravel()
+    values = [value for value in np.unique(flat) if value >= 0]
+
+    indices, strata = [], []
+    for value in values:
+        n_value = n.get(int(value), 0) if isinstance(n, dict) else n
+        candidates = np.flatnonzero(flat == value)
+        drawn = np.sort(rng.choice(candidates, size=min(n_value, len(candidates)), replace=False))
+        indices.append(drawn)
+        strata.append(np.full(len(drawn), value, dtype=np.int8))
+
+    if len(indices) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int8)
+
+    return np.concatenate(indices), np.concatenate(strata)
+
+
+# read_pixels() reads band_names at the pixels (rows, cols) of a raster, one tile at a time and
+# only the tiles that hold at least one of the pixels; returns an array (pixels x bands)
+def read_pixels(raster, rows, cols, band_names):
+    block_rows, block_cols = raster.block_shape
+    values = np.full((len(rows), len(band_names)), np.nan, dtype=np.float32)
+
+    blocks = (rows // block_rows) * (raster.grid.n_cols // block_cols + 1) + cols // block_cols
+    for block in np.unique(blocks):
+        in_block = np.flatnonzero(blocks == block)
+        row_start = rows[in_block[0]] // block_rows * block_rows
+        col_start = cols[in_block[0]] // block_cols * block_cols
+        window = ((row_start, min(row_start + block_rows, raster.grid.n_rows)),
+                  (col_start, min(col_start + block_cols, raster.grid.n_cols)))
+
+        tile = raster.read(band_names, window)
+        values[in_block] = tile[:, rows[in_block] - row_start, cols[in_block] - col_start].T
+
+    return values
+
+
+# sample_fire() draws a sample of pixels from one per-fire raster and returns it as a dictionary of
+# column -> array (SAMPLE_COLUMNS and band_names). If drop_nulls is True, pixels with a NaN in any
+# of band_names are dropped after the draw (so a stratum can come up short).
+def sample_fire(path, n, strata=None, band_names=BAND_NAMES, model=None, seed=SEED, position=0,
+                drop_nulls=True):
+    raster = FireRaster(path)
+    fire_id, alarm_date = get_raster_fire(raster)
+    rng = np.random.default_rng([seed, position])
+
+    stratum = get_strata(raster, strata, model)
+    indices, sample_strata = draw_pixels(stratum, n, rng)
+    rows, cols = np.divmod(indices, raster.grid.n_cols)
+
+    values = read_pixels(raster, rows, cols, band_names)
+
+    keep = ~np.any(np.isnan(values), axis=1) if drop_nulls else np.ones(len(rows), dtype=bool)
+
+    columns = {'fire_id': np.full(keep.sum(), fire_id, dtype=object),
+               'alarm_date': np.full(keep.sum(), alarm_date, dtype=np.int64),
+               'sample_id': np.flatnonzero(keep),
+               'stratum': sample_strata[keep],
+               'row': rows[keep],
+               'col': cols[keep],
+               'x': raster.grid.x_min + (cols[keep] + 0.5) * raster.grid.scale,
+               'y': raster.grid.y_max - (rows[keep] + 0.5) * raster.grid.scale}
+    columns.update(zip(band_names, values[keep].T))
+
+    return columns
+
+
+# _sample_fire() unpacks the arguments of one fire for the process pool
+def _sample_fire(args):
+    return sample_fire(**args)
+
+
+# open_table_writer() opens a Parquet (.parquet) or Feather (.feather or .arrow) file for writing
+# record batches with schema
+def open_table_writer(path, schema):
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if os.path.splitext(path)[1] == '.parquet':
+        return pyarrow.parquet.ParquetWriter(path, schema, compression='zstd')
+
+    return pyarrow.ipc.new_file(path, schema)
+
+
+# sample_fires() samples every raster in raster_paths with sample_fire() in a pool of n_workers
+# processes, keeping at most max_in_flight fires in progress, and streams the samples to a table at
+# path. Returns the number of samples written.
+def sample_fires(raster_paths, path, n, strata=None, band_names=BAND_NAMES, model=None, seed=SEED,
+                 drop_nulls=True, n_workers=None, max_in_flight=None):
+    import pyarrow
+
+    n_workers = n_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * n_workers
+
+    jobs = ({'path': raster_path, 'n': n, 'strata': strata, 'band_names': list(band_names),
+             'model': model, 'seed': seed, 'position': i, 'drop_nulls': drop_nulls}
+            for i, raster_path in enumerate(raster_paths))
+
+    schema = pyarrow.schema([('fire_id', pyarrow.string()), ('alarm_date', pyarrow.int64()),
+                             ('sample_id', pyarrow.int64()), ('stratum', pyarrow.int8()),
+                             ('row', pyarrow.int64()), ('col', pyarrow.int64()),
+                             ('x', pyarrow.float64()), ('y', pyarrow.float64())] +
+                            [(name, pyarrow.float32()) for name in band_names])
+
+    # write() writes one fire's samples and returns the number of samples
+    def write(columns):
+        writer.write_batch(pyarrow.record_batch([columns[name] for name in schema.names], schema=schema))
+        return len(columns['fire_id'])
+
+    n_samples = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as pool, open_table_writer(path, schema) as writer:
+        in_flight = deque()
+
+        for job in jobs:
+            in_flight.append(pool.submit(_sample_fire, job))
+
+            # Write the oldest fire's samples before starting another fire
+            if len(in_flight) >= max_in_flight:
+                n_samples += write(in_flight.popleft().result())
+
+        while len(in_flight) > 0:
+            n_samples += write(in_flight.popleft().result())
+
+    return n_samples
@@ -0,0 +1,209 @@
+# A concurrent scheduler for submitting per-fire exports to Earth Engine.
+#
+# The final cell of 29_ee-get-frap-derived-imagery.py used to build, check, and submit one fire
+# at a time, so most of the hours it took to submit ~1,100 fires were spent waiting on round trips
+# to the server. ExportScheduler instead prepares and submits exports from a pool of threads. It
+# keeps at most max_in_flight tasks running at once (to stay within Earth Engine's limit on
+# concurrent tasks) and checks the states of all of its tasks with a single Task.list() call per
+# poll. Tasks that fail (or that fail to start) are resubmitted, waiting twice as long after
+# each failure: the polling loop hands a job back to the workers once its wait is over, so no
+# worker sits idle through a backoff. A task that doesn't show up in Task.list() for
+# max_missing_polls polls in a row counts as failed, so run() always comes to an end.
+#
+# The scheduler only talks to Earth Engine through the 'batch' object it is given, which is
+# normally ee.batch. rsr.fake_batch.FakeBatch stands in for ee.batch to test the scheduler's
+# throughput and behavior offline.
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# ExportJob is one export to schedule. prepare() is called from a worker thread and returns the
+# keyword arguments for batch.Export.image.toDrive() (e.g., 'image', 'description', ...) or
+# None if there is nothing to export for this job.
+ExportJob = namedtuple('ExportJob', ['name', 'prepare'])
+
+# ExportResult is what happened to a job: its final state ('skipped', 'completed', 'failed', or
+# 'submitted' if run() didn't wait for its task to finish), the id of its last task, the number
+# of times it was submitted, and the last error (if any)
+ExportResult = namedtuple('ExportResult', ['name', 'state', 'task_id', 'attempts', 'error'])
+
+# Task states reported by Earth Engine that mean a task is done running
+FINISHED_STATES = ['COMPLETED', 'FAILED', 'CANCELLED']
+
+
+# get_state_name() returns a task state as a string (newer versions of the Earth Engine API
+# report task states as an enum)
+def get_state_name(state):
+    return getattr(state, 'value', state)
+
+
+# export_to_drive() is the default way to turn the prepared arguments into a task
+def export_to_drive(batch, **kwargs):
+    return batch.Export.image.toDrive(**kwargs)
+
+
+class ExportScheduler:
+
+    # batch: ee.batch (or a stand-in with the same Export.image.toDrive() and Task.list())
+    # max_in_flight: the most tasks that can be submitted but not yet finished at any one time
+    # n_workers: the number of threads preparing and submitting exports
+    # poll_interval: seconds between checks of the task states
+    # max_retries: the number of times to resubmit a job whose task failed or wouldn't start
+    # backoff: seconds to wait before the first resubmission; doubles with each further attempt
+    # max_missing_polls: the number of polls in a row a task can be missing from Task.list()
+    # before it counts as failed
+    # export: the function that creates a task from batch and the prepared arguments
+    def __init__(self, batch, max_in_flight=20, n_workers=8, poll_interval=30, max_retries=3,
+                 backoff=60, max_missing_polls=3, export=export_to_drive):
+        self.batch = batch
+        self.max_in_flight = max_in_flight
+        self.n_workers = n_workers
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_missing_polls = max_missing_polls
+        self.export = export
+
+        self._lock = threading.Lock()
+        self._event_lock = threading.Lock()
+
+    # run() prepares and submits every job and returns a dictionary of ExportResults keyed by
+    # job name. on_event(name, state, task_id, error) is called (from any thread, but never from
+    # two at once) whenever a job is skipped, submitted, completed, retried, or fails.
+    # If wait is False, run() returns as soon as every job has been submitted (or skipped).
+    def run(self, jobs, on_event=None, wait=True):
+        self._on_event = on_event
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        # job name -> 'pending', 'in_flight', or 'done'
+        self._status = {job.name: 'pending' for job in jobs}
+        # task id -> (job, kwargs, attempt)
+        self._in_flight = {}
+        # task id -> the number of polls in a row the task was missing from Task.list()
+        self._missing = {}
+        # (ready time, job, kwargs, attempt) of the jobs waiting out a backoff before resubmission
+        self._waiting = []
+        self._results = {}
+
+        with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+            self._pool = pool
+            futures = [pool.submit(self._prepare_and_start, job) for job in jobs]
+
+            # Check on the tasks while the workers prepare and submit them (finished tasks free
+            # up slots for any workers that are waiting on one)
+            while self._is_running(wait):
+                time.sleep(self.poll_interval)
+                self._poll()
+                self._resubmit_ready()
+
+            # Surface any unexpected errors from the workers
+            for future in futures:
+                future.result()
+
+        with self._lock:
+            for task_id, (job, kwargs, attempt) in self._in_flight.items():
+                self._results[job.name] = ExportResult(job.name, 'submitted', task_id, attempt, None)
+
+        return dict(self._results)
+
+    def _is_running(self, wait):
+        with self._lock:
+            if wait:
+                return any(status != 'done' for status in self._status.values())
+
+            return any(status == 'pending' for status in self._status.values())
+
+    def _emit(self, name, state, task_id=None, error=None):
+        if self._on_event is not None:
+            with self._event_lock:
+                self._on_event(name, state, task_id, error)
+
+    def _prepare_and_start(self, job):
+        try:
+            kwargs = job.prepare()
+        except Exception as e:
+            self._finish(job, 'failed', None, 0, e)
+            return
+
+        if kwargs is None:
+            self._finish(job, 'skipped', None, 0, None)
+            return
+
+        self._start(job, kwargs, 1)
+
+    # _start() waits for a free slot and submits the job
+    def _start(self, job, kwargs, attempt):
+        self._slots.acquire()
+        try:
+            task = self.export(self.batch, **kwargs)
+            task.start()
+        except Exception as e:
+            self._slots.release()
+            self._retry(job, kwargs, attempt, None, e)
+            return
+
+        with self._lock:
+            self._in_flight[task.id] = (job, kwargs, attempt)
+            self._status[job.name] = 'in_flight'
+        self._emit(job.name, 'submitted', task.id, None)
+
+    def _retry(self, job, kwargs, attempt, task_id, error):
+        if attempt > self.max_retries:
+            self._finish(job, 'failed', task_id, attempt, error)
+            return
+
+        with self._lock:
+            self._status[job.name] = 'pending'
+            self._waiting.append((time.monotonic() + self.backoff * 2 ** (attempt - 1), job, kwargs, attempt + 1))
+        self._emit(job.name, 'retrying', task_id, error)
+
+    # _resubmit_ready() hands the jobs whose backoff is over back to the workers
+    def _resubmit_ready(self):
+        now = time.monotonic()
+
+        with self._lock:
+            ready = [waiting for waiting in self._waiting if waiting[0] <= now]
+            self._waiting = [waiting for waiting in self._waiting if waiting[0] > now]
+
+        for ready_at, job, kwargs, attempt in ready:
+            self._pool.submit(self._start, job, kwargs, attempt)
+
+    def _finish(self, job, state, task_id, attempts, error):
+        with self._lock:
+            self._results[job.name] = ExportResult(job.name, state, task_id, attempts, error)
+            self._status[job.name] = 'done'
+        self._emit(job.name, state, task_id, error)
+
+    # _poll() gets the states of all tasks in one request and frees the slots of finished tasks (and
+    # of tasks that have been missing from the list for max_missing_polls polls, which count as failed)
+    def _poll(self):
+        with self._lock:
+            if len(self._in_flight) == 0:
+                return
+
+        states = {task.id: (get_state_name(task.state), getattr(task, 'error_message', None))
+                  for task in self.batch.Task.list()}
+
+        with self._lock:
+            for task_id in self._in_flight:
+                if task_id in states:
+                    self._missing.pop(task_id, None)
+                else:
+                    self._missing[task_id] = self._missing.get(task_id, 0) + 1
+                    if self._missing[task_id] >= self.max_missing_polls:
+                        states[task_id] = ('FAILED', 'task ' + str(task_id) + ' is missing from the task list')
+
+            finished = [(task_id, self._in_flight.pop(task_id), states[task_id])
+                        for task_id in list(self._in_flight)
+                        if task_id in states and states[task_id][0] in FINISHED_STATES]
+            for task_id, in_flight, state in finished:
+                self._missing.pop(task_id, None)
+
+        for task_id, (job, kwargs, attempt), (state, error_message) in finished:
+            self._slots.release()
+
+            if state == 'COMPLETED':
+                self._finish(job, 'completed', task_id, attempt, None)
+            else:
+                self._retry(job, kwargs, attempt, task_id, error_message or state)
@@ -0,0 +1,199 @@
+# Per-fire metadata "sidecars" for rasters in the compact layout, and a reader that rebuilds the
+# legacy 50-band layout from them.
+#
+# Seven of the 50 bands of each per-fire raster don't need to be rasters: the 5 date bands
+# (date, ordinal_day, alarm_year, alarm_month, alarm_day) hold the same value at every pixel of a
+# fire, and longitude and latitude follow from the raster's geotransform. Rasters in the compact
+# layout (rsr.bands.COMPACT_BAND_NAMES) leave them out. The fire id and alarm date go into a
+# small .json file next to the raster instead (the sidecar: the raster's name, with .sidecar.json
+# in place of .tif, so listings of the .tif rasters never pick it up), and FireRaster rebuilds the
+# missing bands (only when asked for them) so code that expects the legacy layout, in the
+# band_names order of
+# 31_basic-manipulations-of-remote-sensing-resistance-rasters.R, keeps working:
+#
+#   raster = FireRaster(path)
+#   raster.read()                      all 50 bands in the order of rsr.bands.BAND_NAMES
+#   raster.read_band('alarm_year')     one band
+#
+# FireRaster reads legacy 50-band rasters (float32 or int16, see rsr.output_format) too.
+
+import datetime
+import json
+import os
+
+import numpy as np
+
+from rsr import io
+from rsr.bands import BAND_NAMES, COMPACT_BAND_NAMES, DATE_BANDS
+from rsr.local import get_date_bands, to_ms
+from rsr.output_format import STORAGE_DTYPE, decode
+
+
+SIDECAR_SUFFIX = '.sidecar.json'
+
+
+def get_sidecar_path(raster_path):
+    return os.path.splitext(raster_path)[0] + SIDECAR_SUFFIX
+
+
+# write_sidecar() writes the sidecar of a raster in the compact layout: the fire's id and alarm
+# date (milliseconds since the epoch), the values of the date bands, the bands in the raster, and
+# any other properties of the fire
+def write_sidecar(raster_path, fire_id, alarm_date, properties=None, band_names=COMPACT_BAND_NAMES):
+    sidecar = {'fire_id': fire_id,
+               'alarm_date': int(alarm_date),
+               'date_bands': get_date_bands(int(alarm_date)),
+               'band_names': list(band_names),
+               'properties': dict(properties or {})}
+
+    with open(get_sidecar_path(raster_path), 'w') as f:
+        json.dump(sidecar, f, indent=2)
+
+
+def read_sidecar(raster_path):
+    with open(get_sidecar_path(raster_path)) as f:
+        return json.load(f)
+
+
+# rebuild_band() returns a band that the compact layout leaves out, on grid: a date band (with
+# its value from date_bands, see rsr.local.get_date_bands()) or longitude or latitude, with values
+# only where footprint is True
+def rebuild_band(name, grid, date_bands, footprint):
+    if name in DATE_BANDS:
+        if date_bands is None:
+            raise ValueError('no alarm date to rebuild the ' + name + ' band from')
+        value = date_bands[name]
+    elif name in ('longitude', 'latitude'):
+        value = io.get_pixel_lonlat(grid)[0 if name == 'longitude' else 1]
+    else:
+        raise KeyError(name)
+
+    return np.where(footprint, value, np.nan).astype(np.float32)
+
+
+# FireRaster is a per-fire raster in either layout that reads (and, for the compact layout,
+# rebuilds) bands on demand
+class FireRaster:
+
+    def __init__(self, path):
+        import rasterio
+
+        self.path = path
+        self.sidecar = read_sidecar(path) if os.path.exists(get_sidecar_path(path)) else None
+
+        with rasterio.open(path) as src:
+            transform = src.transform
+            self.grid = io.Grid(transform.c, transform.f, src.height, src.width, transform.a)
+            self.encoded = src.dtypes[0] == STORAGE_DTYPE
+            descriptions = list(src.descriptions)
+            # (rows, cols) of the raster's tiles (or strips), the smallest unit it can be read in
+            self.block_shape = src.block_shapes[0]
+
+        # The bands stored in the raster: from the sidecar, the band descriptions, or the layout
+        # that has that number of bands
+        if self.sidecar is not None:
+            self.stored_band_names = self.sidecar['band_names']
+        elif all(description in BAND_NAMES for description in descriptions):
+            self.stored_band_names = descriptions
+        else:
+            self.stored_band_names = BAND_NAMES if len(descriptions) == len(BAND_NAMES) else COMPACT_BAND_NAMES
+
+        self._footprint = None
+
+    # band_names are the bands that can be read: always the legacy layout
+    @property
+    def band_names(self):
+        return list(BAND_NAMES)
+
+    # _read_stored() reads bands that are stored in the raster (bands x rows x cols), or just a
+    # window ((row_start, row_stop), (col_start, col_stop)) of them
+    def _read_stored(self, names, window=None):
+        import rasterio
+        from rasterio.windows import Window
+
+        if window is not None:
+            (row_start, row_stop), (col_start, col_stop) = window
+            window = Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+        with rasterio.open(self.path) as src:
+            data = src.read([self.stored_band_names.index(name) + 1 for name in names], window=window)
+
+        if self.encoded:
+            return decode(data, names)
+
+        return data.astype(np.float32)
+
+    # _get_footprint() returns True for every pixel (of a window) with a value in any stored band
+    # (the pixels inside the fire perimeter, where the rebuilt bands have values)
+    def _get_footprint(self, window=None):
+        if window is not None:
+            return np.any(~np.isnan(self._read_stored(self.stored_band_names, window)), axis=0)
+
+        if self._footprint is None:
+            self._footprint = np.any(~np.isnan(self._read_stored(self.stored_band_names)), axis=0)
+
+        return self._footprint
+
+    # _rebuild() returns a band (or a window of it) that isn't stored in the raster
+    def _rebuild(self, name, window=None):
+        if name in DATE_BANDS and self.sidecar is None:
+            raise ValueError(self.path + ' has no ' + name + ' band and no sidecar to rebuild it from')
+
+        date_bands = self.sidecar['date_bands'] if self.sidecar is not None else None
+
+        return rebuild_band(name, io.get_window_grid(self.grid, window), date_bands, self._get_footprint(window))
+
+    # read_band() returns one band (rows x cols, float32 with NaN where masked), or a window of it
+    def read_band(self, name, window=None):
+        if name in self.stored_band_names:
+            return self._read_stored([name], window)[0]
+
+        return self._rebuild(name, window)
+
+    # read() returns the bands in band_names (by default, all 50 in the legacy order) as an array
+    # (bands x rows x cols), or a window ((row_start, row_stop), (col_start, col_stop)) of them
+    def read(self, band_names=BAND_NAMES, window=None):
+        stored_names = [name for name in band_names if name in self.stored_band_names]
+        stored = dict(zip(stored_names, self._read_stored(stored_names, window))) if len(stored_names) > 0 else {}
+
+        return np.stack([stored[name] if name in stored else self._rebuild(name, window) for name in band_names])
+
+
+# get_first_values() returns the values of band_names at the first pixel (in row order) with a value
+# in all of them, reading only those bands, a strip of the raster's blocks at a time (so a raster
+# is only read as far as its first pixel inside the fire)
+def get_first_values(raster, band_names, min_strip_rows=64):
+    block_rows = raster.block_shape[0]
+    strip_rows = block_rows * max(1, -(-min_strip_rows // block_rows))
+
+    for row_start in range(0, raster.grid.n_rows, strip_rows):
+        window = ((row_start, min(row_start + strip_rows, raster.grid.n_rows)), (0, raster.grid.n_cols))
+        values = raster.read(band_names, window).reshape(len(band_names), -1)
+        found = np.flatnonzero(np.all(np.isfinite(values), axis=0))
+
+        if len(found) > 0:
+            return values[:, found[0]]
+
+    raise ValueError(raster.path + ' has no pixel with a value in ' + ', '.join(band_names))
+
+
+# get_raster_fire() returns the fire id and alarm date of a per-fire raster: from its sidecar, its
+# tags (rasters written by rsr.output_format.write_cog()), or its filename
+# (<alarm date>_<order>_<fire id>_epsg3310.tif) and date bands
+def get_raster_fire(raster):
+    import rasterio
+
+    if raster.sidecar is not None:
+        return raster.sidecar['fire_id'], raster.sidecar['alarm_date']
+
+    with rasterio.open(raster.path) as src:
+        tags = src.tags()
+
+    if 'system_index' in tags and 'alarm_date' in tags:
+        return tags['system_index'], int(float(tags['alarm_date']))
+
+    # The date band (milliseconds in a float32) isn't precise enough; the year, month, and day are
+    fire_id = os.path.basename(raster.path).split('_')[2]
+    year, month, day = (int(value) for value in get_first_values(raster, ['alarm_year', 'alarm_month', 'alarm_day']))
+
+    return fire_id, to_ms(datetime.datetime(year, month, day, tzinfo=datetime.timezone.utc))
@@ -0,0 +1,89 @@
+# A parameter sweep of the local backend: every combination of Landsat time window and resampling
+# method for a fire, in one pass.
+#
+# The CBI calibration (07_rsr-sn-cbi-calibration.js, 08_cbi-k-fold-cross-validation.R, and
+# analyses/analyses_output/cbi-calibration-model-comparison.csv) compares several time windows and
+# resampling methods, and running assess_whole_fire() once per configuration reads and masks the
+# same scenes over and over. sweep_fire() instead:
+#
+#   - finds the scenes of the widest time window once; a narrower window has the same end date
+#     (the day before the alarm date, and a year later), so its scenes are the scenes of the
+#     widest window that start on or after its start date
+#   - reads each scene's pixel_qa once and masks every resampling method's bands with it
+#     (pixel_qa is always read with nearest neighbor resampling)
+#   - composites every time window from the same masked block of scenes (see
+#     rsr.local.get_streaming_composites())
+#   - reads the terrain and GRIDMET once per resampling method, since they don't depend on the
+#     time window
+#
+#   images = sweep_fire(fire, TIME_WINDOWS, RESAMPLE_METHODS, ['4', '5', '7', '8'], source)
+#   images[48, 'bicubic']       the same FireImage as assess_whole_fire(48, 'bicubic', ...)(fire)
+
+import numpy as np
+
+from rsr import io, local
+from rsr.bands import PIXEL_RADII
+
+# The time windows and resampling methods compared in the calibration
+TIME_WINDOWS = [16, 32, 48, 64]
+RESAMPLE_METHODS = ['none', 'bilinear', 'bicubic']
+
+
+# get_window_subsets() returns, for each time window, the positions of the scenes (among scenes,
+# the scenes of the widest window) that start on or after the start of that window's pre-fire
+# (if post is False) or post-fire window
+def get_window_subsets(scenes, alarm_date, timeWindows, post=False):
+    subsets = {}
+    for timeWindow in timeWindows:
+        start = local.get_landsat_windows(alarm_date, timeWindow)[1 if post else 0][0]
+        subsets[timeWindow] = np.array([i for i, scene in enumerate(scenes) if scene.time_start >= start],
+                                       dtype=np.int64)
+
+    return subsets
+
+
+# sweep_fire() returns a dictionary of (timeWindow, resample_method) -> the FireImage of
+# assess_whole_fire() for that configuration (or None, as assess_whole_fire() would), for every
+# combination of timeWindows and resample_methods
+def sweep_fire(fire, timeWindows, resample_methods, sats, source, compact=False, max_block_mb=local.MAX_BLOCK_MB):
+    grid = io.get_fire_grid(fire.geometry.bounds)
+    halo = max(PIXEL_RADII) + 1
+    halo_grid = io.buffer_grid(grid, halo)
+
+    bounds = fire.geometry.bounds
+    (prestart, preend), (poststart, postend) = local.get_landsat_windows(fire.alarm_date, max(timeWindows))
+    pre_scenes = io.filter_scenes(source.scenes, prestart, preend, bounds, sats)
+    post_scenes = io.filter_scenes(source.scenes, poststart, postend, bounds, sats)
+
+    # Only the pixels inside the perimeter are calculated (see local.get_variables() with perimeter_only)
+    footprint = local.get_perimeter_mask(fire.geometry, halo_grid)
+    grid_footprint = io.crop_halo(footprint, halo)
+
+    pre = local.get_streaming_composites(pre_scenes, get_window_subsets(pre_scenes, fire.alarm_date, timeWindows),
+                                         halo_grid, resample_methods, PIXEL_RADII, max_block_mb, footprint)
+    post = local.get_streaming_composites(post_scenes,
+                                          get_window_subsets(post_scenes, fire.alarm_date, timeWindows, post=True),
+                                          halo_grid, resample_methods, max_block_mb=max_block_mb, footprint=footprint)
+
+    images = {}
+    for resample_method in resample_methods:
+        weather = local.get_weather(fire, source, grid, resample_method, grid_footprint)
+        topography = None
+
+        for timeWindow in timeWindows:
+            preFire_composite, preFire_nbhd = pre[timeWindow, resample_method]
+            postFire_composite, _ = post[timeWindow, resample_method]
+
+            context = local.FireContext.from_composites(fire, halo_grid, preFire_composite, preFire_nbhd,
+                                                        postFire_composite)
+            if not context.has_imagery or weather is None:
+                images[timeWindow, resample_method] = None
+                continue
+
+            if topography is None:
+                topography = local.get_grid_topography(source, grid, resample_method, grid_footprint)
+
+            var_img = local.get_fire_image(fire, context, weather, topography, grid, halo, compact)
+            images[timeWindow, resample_method] = local.mask_to_perimeter(var_img, fire.geometry)
+
+    return images
@@ -0,0 +1,240 @@
+# Deterministic synthetic inputs for the local backend, for benchmarks (see rsr.benchmark) and
+# for trying out changes without downloading any imagery.
+#
+# write_synthetic_source() writes a complete data directory in the layout of rsr.io (Landsat
+# scenes and their catalog, daily GRIDMET images and their catalog, the DEM, and the yellow
+# pine/mixed-conifer mask) around a synthetic fire of a given size, and returns the fire:
+#
+#   fire = write_synthetic_source(directory, size='medium')
+#   image = assess_whole_fire(48, 'none', ['5', '7', '8'], LocalSource.from_directory(directory))(fire)
+#
+# The same seed always gives the same files. Everything that varies in space (clouds, water,
+# snow, terrain, burn severity, the mask) is smooth noise, so the rasters have patches and edges
+# rather than white noise:
+#   - Landsat scenes alternate between sensors (Landsat 8 scenes have the Landsat 8 band names)
+#     and carry Collection 1 pixel_qa values: clear, water, cloud shadow, snow, and cloud, with a
+#     different amount of cloud in each scene and shadows offset from the clouds
+#   - post-fire scenes have lower NIR and higher SWIR wherever the fire burned
+#   - GRIDMET images are on GRIDMET's own 1/24 degree grid in EPSG:4326, so they are warped like
+#     the real ones
+
+import csv
+import math
+import os
+
+import numpy as np
+
+from rsr import io
+from rsr.bands import L8_BANDS, LANDSAT_BANDS, PIXEL_RADII
+from rsr.local import Fire, advance, get_perimeter_mask
+
+SEED = 727
+
+# Pixels along each side of a synthetic fire's grid
+SIZES = {'small': 128, 'medium': 512, 'large': 1536}
+
+# Upper-left corner (EPSG:3310) of the synthetic data, in the central Sierra Nevada
+ORIGIN = (-30000.0, 60000.0)
+
+ALARM_DATE = 1279152000000  # 2010-07-15
+
+# Collection 1 pixel_qa values for each surface type, for Landsat 4, 5, and 7 and for Landsat 8
+# (which also sets the low cirrus confidence bit)
+PIXEL_QA = {'clear': (66, 322), 'water': (68, 324), 'cloud_shadow': (72, 328),
+            'snow': (80, 336), 'cloud': (224, 480)}
+
+# Typical reflectance (x 10000; brightness temperature in K x 10 for B6) of unburned forest, and
+# the change in each band where the fire burned at the highest severity
+FOREST_REFLECTANCE = np.array([300, 500, 400, 3000, 1800, 2950, 900])
+BURN_CHANGE = np.array([100, 150, 250, -2000, 600, 80, 1400])
+WATER_REFLECTANCE = np.array([200, 300, 250, 150, 80, 2900, 50])
+
+# GRIDMET variables: (mean, day-to-day standard deviation)
+GRIDMET_VALUES = {'erc': (70, 8), 'fm100': (8, 1.5), 'vpd': (2.5, 0.6), 'vs': (4, 1.5)}
+
+
+# smooth_noise() returns a field of values between 0 and 1 (n_rows x n_cols) that varies
+# smoothly over about cell pixels, by bilinear interpolation of random values on a coarse grid
+def smooth_noise(rng, n_rows, n_cols, cell):
+    coarse = rng.random((n_rows // cell + 2, n_cols // cell + 2))
+
+    y, x = np.arange(n_rows) / cell, np.arange(n_cols) / cell
+    y0, x0 = y.astype(int), x.astype(int)
+    fy, fx = (y - y0)[:, np.newaxis], (x - x0)[np.newaxis, :]
+
+    top = coarse[y0][:, x0] * (1 - fx) + coarse[y0][:, x0 + 1] * fx
+    bottom = coarse[y0 + 1][:, x0] * (1 - fx) + coarse[y0 + 1][:, x0 + 1] * fx
+
+    return top * (1 - fy) + bottom * fy
+
+
+# make_pixel_qa() returns the pixel_qa band of one scene: clouds cover about cloud_fraction of
+# the scene, each cloud casts a shadow a few pixels away, and water and snow are where water and
+# snow (boolean arrays) are True
+def make_pixel_qa(rng, n_rows, n_cols, cloud_fraction, water, snow, sensor):
+    qa = {name: values[1 if sensor == '8' else 0] for name, values in PIXEL_QA.items()}
+
+    cover = smooth_noise(rng, n_rows, n_cols, 24)
+    cloud = cover > np.quantile(cover, 1 - cloud_fraction)
+    shadow = np.roll(cloud, (6, -4), axis=(0, 1)) & ~cloud
+
+    pixel_qa = np.full((n_rows, n_cols), qa['clear'], dtype=np.int16)
+    pixel_qa[water] = qa['water']
+    pixel_qa[snow] = qa['snow']
+    pixel_qa[shadow] = qa['cloud_shadow']
+    pixel_qa[cloud] = qa['cloud']
+
+    return pixel_qa
+
+
+# make_landsat_stack() returns a stack of scenes (scenes x B1 through B7 plus pixel_qa x rows x
+# cols, float32), one scene per sensor in sensors, over a surface with burn severity severity
+# (0 to 1; all 0 for pre-fire scenes)
+def make_landsat_stack(rng, sensors, severity, water, snow):
+    n_rows, n_cols = severity.shape
+    scenes = []
+
+    for sensor in sensors:
+        bands = (FOREST_REFLECTANCE[:, np.newaxis, np.newaxis] +
+                 BURN_CHANGE[:, np.newaxis, np.newaxis] * severity +
+                 rng.normal(0, 60, (len(LANDSAT_BANDS), n_rows, n_cols)))
+        bands[:, water] = WATER_REFLECTANCE[:, np.newaxis]
+
+        pixel_qa = make_pixel_qa(rng, n_rows, n_cols, rng.uniform(0, 0.3), water, snow, sensor)
+        scenes.append(np.concatenate([np.round(bands), pixel_qa[np.newaxis]]))
+
+    return np.stack(scenes).astype(np.float32)
+
+
+# make_dem() returns a DEM (rows x cols, meters) of ridges and valleys between about 800 and
+# 2,800 m
+def make_dem(rng, n_rows, n_cols):
+    dem = (1500 * smooth_noise(rng, n_rows, n_cols, 200) + 400 * smooth_noise(rng, n_rows, n_cols, 40) +
+           50 * smooth_noise(rng, n_rows, n_cols, 8))
+
+    return (800 + dem).astype(np.float32)
+
+
+# get_synthetic_grid() returns the grid of the synthetic data for a fire of n_pixels x n_pixels:
+# the fire's grid plus a margin big enough for the halo that get_variables() reads
+def get_synthetic_grid(n_pixels):
+    margin = max(PIXEL_RADII) + 5
+
+    return io.buffer_grid(io.Grid(ORIGIN[0], ORIGIN[1], n_pixels, n_pixels, io.SCALE), margin)
+
+
+# get_synthetic_fire() returns the synthetic fire on a grid: a lobed perimeter filling most of
+# the middle of the grid
+def get_synthetic_fire(rng, grid):
+    from shapely.geometry import Polygon
+
+    x_center = grid.x_min + grid.n_cols * grid.scale / 2
+    y_center = grid.y_max - grid.n_rows * grid.scale / 2
+    radius = 0.4 * min(grid.n_rows, grid.n_cols) * grid.scale
+
+    angles = np.linspace(0, 2 * math.pi, 64, endpoint=False)
+    radii = radius * (1 + 0.15 * np.sin(3 * angles + rng.uniform(0, 2 * math.pi)) + rng.uniform(-0.05, 0.05, len(angles)))
+    perimeter = Polygon(zip(x_center + radii * np.cos(angles), y_center + radii * np.sin(angles)))
+
+    return Fire('synthetic_' + str(grid.n_rows), ALARM_DATE, perimeter, {'fire_name': 'SYNTHETIC'})
+
+
+def write_raster(path, bands, grid=None, band_names=None, dtype='float32', nodata=None, crs=io.CRS, transform=None):
+    import rasterio
+
+    transform = transform if transform is not None else io.get_grid_transform(grid)
+
+    with rasterio.open(path, 'w', driver='GTiff', height=bands.shape[1], width=bands.shape[2],
+                       count=bands.shape[0], dtype=dtype, crs=crs, transform=transform, nodata=nodata,
+                       tiled=True) as dst:
+        dst.write(bands.astype(dtype))
+        for i, name in enumerate(band_names or []):
+            dst.set_band_description(i + 1, name)
+
+
+# write_gridmet() writes a daily GRIDMET image for every day from 6 days before the alarm date to
+# 3 days after it, on the 1/24 degree GRIDMET grid covering grid, and their catalog
+def write_gridmet(rng, directory, grid, alarm_date):
+    from pyproj import Transformer
+    from rasterio.transform import from_origin
+
+    os.makedirs(directory, exist_ok=True)
+
+    x_min, y_min, x_max, y_max = io.get_grid_bounds(grid)
+    transformer = Transformer.from_crs(io.CRS, 'EPSG:4326', always_xy=True)
+    lon, lat = transformer.transform([x_min, x_min, x_max, x_max], [y_min, y_max, y_min, y_max])
+
+    cell = 1 / 24
+    west, north = math.floor(min(lon) / cell - 1) * cell, math.ceil(max(lat) / cell + 1) * cell
+    n_cols = int(math.ceil((max(lon) - west) / cell)) + 2
+    n_rows = int(math.ceil((north - min(lat)) / cell)) + 2
+
+    rows = []
+    for day in range(-6, 4):
+        values = np.stack([np.maximum(mean + sd * (rng.normal() + smooth_noise(rng, n_rows, n_cols, 3) - 0.5), 0)
+                           for mean, sd in GRIDMET_VALUES.values()])
+        path = 'gridmet_' + str(day + 6) + '.tif'
+        write_raster(os.path.join(directory, path), values, band_names=list(GRIDMET_VALUES),
+                     crs='EPSG:4326', transform=from_origin(west, north, cell, cell))
+        rows.append({'time_start': advance(alarm_date, day, 'day'), 'path': path})
+
+    with open(os.path.join(directory, 'gridmet_catalog.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['time_start', 'path'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# write_synthetic_source() writes a data directory for the local backend around a synthetic fire
+# of size (a key of SIZES, or a number of pixels) with n_scenes Landsat scenes in each of the pre-
+# and post-fire windows (for a timeWindow of at least 32 days), taken in turn by the sensors in
+# sensors, and returns the fire
+def write_synthetic_source(directory, size='small', seed=SEED, sensors=('5', '7', '8'), n_scenes=4):
+    rng = np.random.default_rng(seed)
+    grid = get_synthetic_grid(SIZES.get(size, size))
+    fire = get_synthetic_fire(rng, grid)
+    shape = (grid.n_rows, grid.n_cols)
+
+    os.makedirs(os.path.join(directory, 'landsat'), exist_ok=True)
+
+    dem = make_dem(rng, *shape)
+    write_raster(os.path.join(directory, 'srtm.tif'), dem[np.newaxis], grid, ['elevation'])
+
+    conifer = smooth_noise(rng, *shape, 30) > 0.35
+    write_raster(os.path.join(directory, 'mixed_conifer.tif'), conifer[np.newaxis], grid, ['b1'], dtype='uint8')
+
+    severity = smooth_noise(rng, *shape, 16) * get_perimeter_mask(fire.geometry, grid)
+    water = smooth_noise(rng, *shape, 40) > 0.93
+    snow = (dem > np.quantile(dem, 0.995)) & ~water
+
+    # Scenes every 8 days, ending the day before the alarm date and a year later
+    scenes = []
+    for window, scene_severity, year in [('pre', np.zeros(shape), 0), ('post', severity, 1)]:
+        scene_sensors = [sensors[i % len(sensors)] for i in range(n_scenes)]
+        stack = make_landsat_stack(rng, scene_sensors, scene_severity, water, snow & (window == 'pre'))
+
+        for i, (sensor, scene) in enumerate(zip(scene_sensors, stack)):
+            time_start = advance(advance(ALARM_DATE, year, 'year'), -2 - 8 * i, 'day')
+            if sensor == '8':
+                # Landsat 8 has its own band names, plus coastal aerosol (B1) and a second thermal band (B11)
+                band_names = ['B1'] + L8_BANDS + ['B11', 'pixel_qa']
+                bands = np.concatenate([scene[:1], scene[:-1], scene[5:6], scene[-1:]])
+            else:
+                band_names = LANDSAT_BANDS + ['pixel_qa']
+                bands = scene
+
+            path = window + '_' + str(i) + '_l' + sensor + '.tif'
+            write_raster(os.path.join(directory, 'landsat', path), bands, grid, band_names,
+                         dtype='int16', nodata=-9999)
+
+            x_min, y_min, x_max, y_max = io.get_grid_bounds(grid)
+            scenes.append({'scene_id': path[:-4], 'sensor': sensor, 'time_start': time_start, 'path': path,
+                           'x_min': x_min, 'y_min': y_min, 'x_max': x_max, 'y_max': y_max})
+
+    with open(os.path.join(directory, 'landsat', 'scene_catalog.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(scenes[0]))
+        writer.writeheader()
+        writer.writerows(scenes)
+
+    write_gridmet(rng, os.path.join(directory, 'gridmet'), grid, ALARM_DATE)
+
+    return fire
@@ -0,0 +1,85 @@
+# The static topographic layers, computed once for a whole region.
+#
+# The ypmc mask, slope, aspect, topographic roughness at each pixel radius, and elevation
+# (rsr.bands.TERRAIN_BANDS) don't depend on the fire, yet get_variables() used to warp the DEM
+# and calculate all of them for every fire. build_terrain_cache() calculates them once on the
+# EPSG:3310 30 m grid covering a region (by default, the extent of the yellow pine/mixed-conifer
+# mask), one tile at a time so the whole region never has to be in memory, and stores them as a
+# memory-mapped terrain cache (see rsr.io.TerrainCache). Fire grids are aligned with the cache
+# grid (see rsr.io.get_fire_grid()), so each fire then just reads its window of the cache.
+#
+# Each tile is calculated with a halo of max(PIXEL_RADII) + 1 pixels, like a fire's grid is in
+# get_variables(), so the cached layers are identical to the ones calculated for each fire.
+#
+#   build_terrain_cache(LocalSource.from_directory(data_dir), os.path.join(data_dir, 'terrain'))
+
+import json
+import os
+
+import numpy as np
+
+from rsr import io
+from rsr.bands import PIXEL_RADII, TERRAIN_BANDS
+from rsr.local import get_topography
+
+
+# get_raster_bounds() returns the bounds of a raster in EPSG:3310
+def get_raster_bounds(path):
+    import rasterio
+    from rasterio.warp import transform_bounds
+
+    with rasterio.open(path) as src:
+        return transform_bounds(src.crs, io.CRS, *src.bounds)
+
+
+# get_tile_grids() splits a grid into tiles of at most tile_size x tile_size pixels, returning the
+# (row, col) offset and grid of each tile
+def get_tile_grids(grid, tile_size):
+    tiles = []
+
+    for row in range(0, grid.n_rows, tile_size):
+        for col in range(0, grid.n_cols, tile_size):
+            tile = io.Grid(grid.x_min + col * grid.scale,
+                           grid.y_max - row * grid.scale,
+                           min(tile_size, grid.n_rows - row),
+                           min(tile_size, grid.n_cols - col),
+                           grid.scale)
+            tiles.append(((row, col), tile))
+
+    return tiles
+
+
+# build_terrain_cache() calculates the topographic layers over bounds (x_min, y_min, x_max, y_max
+# in EPSG:3310) and writes them to a terrain cache in directory. The layers are calculated with
+# resample_method, and the cache is only used for fires processed with the same resample_method.
+def build_terrain_cache(source, directory, bounds=None, resample_method='none', tile_size=1024):
+    if bounds is None:
+        bounds = get_raster_bounds(source.mixed_conifer)
+
+    grid = io.get_fire_grid(bounds)
+    halo = max(PIXEL_RADII) + 1
+
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, 'terrain.json')):
+        os.remove(os.path.join(directory, 'terrain.json'))
+
+    layers = np.lib.format.open_memmap(os.path.join(directory, 'terrain.npy'), mode='w+',
+                                       dtype=np.float32,
+                                       shape=(len(TERRAIN_BANDS), grid.n_rows, grid.n_cols))
+
+    for (row, col), tile in get_tile_grids(grid, tile_size):
+        topography = get_topography(source, io.buffer_grid(tile, halo), resample_method)
+
+        for i, band in enumerate(TERRAIN_BANDS):
+            layers[i, row:row + tile.n_rows, col:col + tile.n_cols] = io.crop_halo(topography[band], halo)
+
+    layers.flush()
+    del layers
+
+    # The header is written last, so an interrupted build doesn't leave a cache that looks usable
+    with open(os.path.join(directory, 'terrain.json'), 'w') as f:
+        json.dump({'x_min': grid.x_min, 'y_max': grid.y_max, 'n_rows': grid.n_rows,
+                   'n_cols': grid.n_cols, 'scale': grid.scale, 'bands': TERRAIN_BANDS,
+                   'resample_method': resample_method}, f, indent=2)
+
+    return io.TerrainCache(directory)
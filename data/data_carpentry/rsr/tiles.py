@@ -0,0 +1,154 @@
+# Tile-parallel processing of large fires with the local backend.
+#
+# The biggest fires cover tens of millions of 30 m pixels, and assess_whole_fire() works through a
+# fire on one core. assess_fire_tiled() splits the fire's EPSG:3310 grid into tiles and calculates
+# each tile with get_variables() in a pool of processes. get_variables() reads every tile with a
+# halo of max(PIXEL_RADII) + 1 pixels (for the neighborhood statistics, the roughness, and the
+# slope and aspect), and the neighborhood statistics of a pixel don't depend on the extent of the
+# array they're calculated on (see rsr.neighborhood), so the pixels along the seams between tiles
+# are the same as those of the fire processed whole. Each tile is written into the fire's raster
+# as soon as it's done (in the same format as rsr.output_format.write_cog(), but written tile by
+# tile as a tiled GeoTIFF rather than copied to a COG at the end), so memory use depends on the
+# number of workers and the tile size rather than the size of the fire.
+#
+# Only the tiles with pixels inside the perimeter are calculated (the others are left as nodata),
+# and within a tile, only those pixels (see local.get_variables() with
+# perimeter_only), so a long, narrow fire running diagonally across its bounding box reads and
+# calculates little more than the fire itself.
+#
+#   assess_fire_tiled(fire, 48, 'none', ['4', '5', '7', '8'], source, path, n_workers=8)
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rsr import io, local
+from rsr.bands import BAND_NAMES, COMPACT_BAND_NAMES
+from rsr.output_format import NODATA, STORAGE_DTYPE, encode, get_band_formats
+
+# Pixels on each side of a tile; a multiple of BLOCKSIZE so that tiles write whole blocks
+TILE_SIZE = 512
+BLOCKSIZE = 256
+
+
+# get_tiles() returns the windows ((row_start, row_stop), (col_start, col_stop)) that split a grid
+# into tiles of tile_size x tile_size pixels (smaller along the bottom and right edges)
+def get_tiles(grid, tile_size=TILE_SIZE):
+    return [((row, min(row + tile_size, grid.n_rows)), (col, min(col + tile_size, grid.n_cols)))
+            for row in range(0, grid.n_rows, tile_size)
+            for col in range(0, grid.n_cols, tile_size)]
+
+
+# assess_tile() returns the bands of one tile of a fire (masked to the perimeter, and encoded with
+# rsr.output_format.encode() if encoded is True), or None if the fire has no imagery
+def assess_tile(fire, timeWindow, resample_method, sats, source, grid, compact=False, encoded=True,
+                max_block_mb=local.MAX_BLOCK_MB):
+    var_img = local.get_variables(fire, timeWindow, resample_method, sats, source, grid=grid, compact=compact,
+                                  max_block_mb=max_block_mb, perimeter_only=True)
+
+    if var_img is None:
+        return None
+
+    var_img = local.mask_to_perimeter(var_img, fire.geometry)
+
+    return encode(var_img.bands, var_img.band_names) if encoded else var_img.bands
+
+
+# get_perimeter_tiles() returns the tiles (from get_tiles()) of grid with at least one pixel covered by
+# geometry (see local.get_perimeter_mask())
+def get_perimeter_tiles(grid, geometry, tile_size=TILE_SIZE):
+    return [window for window in get_tiles(grid, tile_size)
+            if local.get_perimeter_mask(geometry, io.get_window_grid(grid, window)).any()]
+
+
+# _assess_tile() unpacks the arguments of one tile for the process pool
+def _assess_tile(args):
+    return assess_tile(**args)
+
+
+# open_fire_raster() opens a tiled GeoTIFF for the bands of a fire on grid, with the same band
+# descriptions, scales and offsets, and tags as write_cog(). Each band is stored in its own tiles
+# (rather than every band of a pixel together), so reading one band (see rsr.sampler and
+# rsr.quicklook) reads only that band's tiles.
+def open_fire_raster(path, grid, band_names, properties, encoded=True):
+    import rasterio
+
+    profile = {'driver': 'GTiff', 'width': grid.n_cols, 'height': grid.n_rows, 'count': len(band_names),
+               'dtype': STORAGE_DTYPE if encoded else 'float32', 'nodata': NODATA if encoded else np.nan,
+               'crs': io.CRS, 'transform': io.get_grid_transform(grid), 'tiled': True,
+               'blockxsize': BLOCKSIZE, 'blockysize': BLOCKSIZE, 'compress': 'deflate',
+               'predictor': 2 if encoded else 3, 'interleave': 'band', 'bigtiff': 'if_safer'}
+
+    dst = rasterio.open(path, 'w', **profile)
+    for i, name in enumerate(band_names):
+        dst.set_band_description(i + 1, name)
+    if encoded:
+        formats = get_band_formats(band_names)
+        dst.scales = [band_format.scale for band_format in formats]
+        dst.offsets = [band_format.offset for band_format in formats]
+    # GDAL reads a ':' in a tag name as the start of a metadata domain
+    dst.update_tags(**{str(key).replace(':', '_'): str(value) for key, value in properties.items()})
+
+    return dst
+
+
+# assess_fire_tiled() is assess_whole_fire() for one fire, calculated tile by tile in a pool of
+# n_workers processes (keeping at most max_in_flight tiles in progress) and written to a raster at
+# path. Returns path, or None (and writes nothing) if the fire has no imagery.
+def assess_fire_tiled(fire, timeWindow, resample_method, sats, source, path, compact=False, encoded=True,
+                      tile_size=TILE_SIZE, n_workers=None, max_in_flight=None, max_block_mb=local.MAX_BLOCK_MB):
+    from rasterio.windows import Window
+
+    n_workers = n_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * n_workers
+
+    grid = io.get_fire_grid(fire.geometry.bounds)
+    band_names = COMPACT_BAND_NAMES if compact else BAND_NAMES
+    properties = dict(fire.properties)
+    properties.update({'system:index': fire.fire_id, 'alarm_date': fire.alarm_date})
+
+    tiles = get_perimeter_tiles(grid, fire.geometry, tile_size)
+    jobs = ({'fire': fire, 'timeWindow': timeWindow, 'resample_method': resample_method, 'sats': sats,
+             'source': source, 'grid': io.get_window_grid(grid, window), 'compact': compact, 'encoded': encoded,
+             'max_block_mb': max_block_mb}
+            for window in tiles)
+
+    # write() writes one tile into the raster; returns False if the fire has no imagery
+    def write(window, bands):
+        if bands is None:
+            return False
+        (row_start, row_stop), (col_start, col_stop) = window
+        dst.write(bands, window=Window(col_start, row_start, col_stop - col_start, row_stop - row_start))
+        return True
+
+    has_imagery = True
+    with ProcessPoolExecutor(max_workers=n_workers) as pool, \
+            open_fire_raster(path, grid, band_names, properties, encoded) as dst:
+        in_flight = deque()
+
+        for window, job in zip(tiles, jobs):
+            in_flight.append((window, pool.submit(_assess_tile, job)))
+
+            # Write the oldest tile before starting another one
+            if len(in_flight) >= max_in_flight:
+                window, future = in_flight.popleft()
+                has_imagery = write(window, future.result())
+                if not has_imagery:
+                    break
+
+        while has_imagery and len(in_flight) > 0:
+            window, future = in_flight.popleft()
+            has_imagery = write(window, future.result())
+
+        for _, future in in_flight:
+            future.cancel()
+
+    # Every tile of a fire has the same scenes and GRIDMET days (they're found from the fire's
+    # bounds), so either every tile has imagery or none does
+    if not has_imagery:
+        os.remove(path)
+        return None
+
+    return path
@@ -0,0 +1,82 @@
+from rsr.fires import FireIndex, FireRecord
+from rsr.journal import ExportJournal, get_export_params, get_fire_content_hashes
+
+PARAMS = get_export_params(48, 'none', ['4', '5', '7', '8'])
+
+
+def get_fire_index(fires):
+    return FireIndex([FireRecord(fire_id, alarm_date, None, {}, geometry_hash)
+                      for fire_id, alarm_date, geometry_hash in fires])
+
+
+# export() records every fire of content_hashes as submitted and then completed, as the scheduler does
+def export(journal, fire_ids, content_hashes):
+    record = journal.on_event(PARAMS, content_hashes)
+    for fire_id in fire_ids:
+        record(fire_id, 'submitted', 'TASK_' + fire_id, None)
+        record(fire_id, 'completed', 'TASK_' + fire_id, None)
+
+
+def test_reuploaded_release_matched_by_content_hash(tmp_path):
+    journal = ExportJournal(str(tmp_path / 'journal.sqlite'))
+
+    old_hashes = get_fire_content_hashes(get_fire_index([('0000000000000000029f', 1000, 'geometry a'),
+                                                         ('000000000000000002a0', 2000, 'geometry b'),
+                                                         ('000000000000000002a1', 3000, 'geometry c')]), PARAMS)
+    export(journal, list(old_hashes), old_hashes)
+
+    # The same fires (and a new one) in a re-uploaded asset, with new system:index values; fire c's
+    # perimeter changed
+    new_hashes = get_fire_content_hashes(get_fire_index([('00000000000000000011', 1000, 'geometry a'),
+                                                         ('00000000000000000012', 2000, 'geometry b'),
+                                                         ('00000000000000000013', 3000, 'geometry c, revised'),
+                                                         ('00000000000000000014', 4000, 'geometry d')]), PARAMS)
+
+    assert journal.diff(new_hashes, PARAMS) == {'new': ['00000000000000000013', '00000000000000000014'],
+                                                'changed': [],
+                                                'unchanged': ['00000000000000000011', '00000000000000000012'],
+                                                'removed': ['000000000000000002a1']}
+    assert journal.remaining(list(new_hashes), PARAMS, new_hashes) == ['00000000000000000013', '00000000000000000014']
+
+    export(journal, ['00000000000000000013', '00000000000000000014'], new_hashes)
+    assert journal.remaining(list(new_hashes), PARAMS, new_hashes) == []
+
+    journal.close()
+
+
+def test_changed_fire_with_same_id(tmp_path):
+    journal = ExportJournal(str(tmp_path / 'journal.sqlite'))
+
+    old_hashes = get_fire_content_hashes(get_fire_index([('0000000000000000029f', 1000, 'geometry a')]), PARAMS)
+    export(journal, list(old_hashes), old_hashes)
+    new_hashes = get_fire_content_hashes(get_fire_index([('0000000000000000029f', 1500, 'geometry a')]), PARAMS)
+
+    assert journal.diff(new_hashes, PARAMS)['changed'] == ['0000000000000000029f']
+    assert journal.remaining(list(new_hashes), PARAMS, new_hashes) == ['0000000000000000029f']
+
+    journal.close()
+
+
+def test_reconcile_fails_tasks_no_longer_listed(tmp_path):
+    from rsr.fake_batch import FakeBatch
+
+    batch = FakeBatch(duration=3600)
+    tasks = [batch.Export.image.toDrive(description=name) for name in ['finished', 'running']]
+    for task in tasks:
+        task.start()
+    tasks[0].state = 'COMPLETED'
+
+    journal = ExportJournal(str(tmp_path / 'journal.sqlite'))
+    journal.record('0000000000000000029f', PARAMS, 'submitted', tasks[0].id)
+    journal.record('000000000000000002a0', PARAMS, 'submitted', tasks[1].id)
+    journal.record('000000000000000002a1', PARAMS, 'submitted', 'TASK_NO_LONGER_LISTED')
+
+    journal.reconcile(batch, PARAMS)
+
+    states = journal.get_states(PARAMS)
+    assert states['0000000000000000029f'][0] == 'completed'
+    assert states['000000000000000002a0'][0] == 'submitted'
+    assert states['000000000000000002a1'][0] == 'failed'
+    assert journal.remaining(list(states), PARAMS) == ['000000000000000002a1']
+
+    journal.close()
@@ -0,0 +1,14 @@
+from shapely.geometry import box
+
+from rsr import io
+from rsr.local import get_perimeter_mask
+
+
+def test_perimeter_mask_keeps_partly_covered_pixels():
+    grid = io.Grid(0, 300, 10, 10, 30)
+
+    # Covers pixels (row 2-3, col 2-3) fully and a sliver of the pixels around them, whose centers are outside
+    mask = get_perimeter_mask(box(55, 175, 125, 245), grid)
+
+    assert mask.sum() == 16
+    assert mask[1:5, 1:5].all()
@@ -0,0 +1,56 @@
+import numpy as np
+
+from rsr.neighborhood import get_max_value, get_neighborhood_stats
+
+
+def get_ndvi(seed=0):
+    rng = np.random.default_rng(seed)
+    x = 600 + 50 * rng.normal(size=(40, 50))
+    x[rng.random(x.shape) < 0.1] = np.nan
+
+    return x
+
+
+def assert_same_stats(a, b):
+    for pixel_radius in a:
+        for stat_a, stat_b in zip(a[pixel_radius], b[pixel_radius]):
+            np.testing.assert_array_equal(stat_a, stat_b)
+
+
+def test_matches_direct_calculation():
+    x = get_ndvi()
+    stats = get_neighborhood_stats(x, [1, 3])
+
+    for pixel_radius in [1, 3]:
+        mean, sd = stats[pixel_radius]
+        for row, col in [(0, 0), (10, 20), (39, 49), (20, 3)]:
+            window = x[max(0, row - pixel_radius):row + pixel_radius + 1,
+                       max(0, col - pixel_radius):col + pixel_radius + 1].copy()
+            window[min(row, pixel_radius), min(col, pixel_radius)] = np.nan
+
+            if np.isnan(x[row, col]):
+                assert np.isnan(mean[row, col]) and np.isnan(sd[row, col])
+            else:
+                assert abs(mean[row, col] - np.nanmean(window)) < 1e-3
+                assert abs(sd[row, col] - np.nanstd(window)) < 1e-3
+
+
+def test_independent_of_extent():
+    x = get_ndvi()
+    whole = get_neighborhood_stats(x)
+    part = get_neighborhood_stats(x[7:33, 11:45])
+
+    for pixel_radius in whole:
+        for stat_whole, stat_part in zip(whole[pixel_radius], part[pixel_radius]):
+            np.testing.assert_array_equal(stat_whole[11:29, 15:41], stat_part[4:-4, 4:-4])
+
+
+def test_bad_pixels_are_masked():
+    x = get_ndvi()
+    masked = x.copy()
+    masked[5, 5] = masked[20, 30] = masked[30, 10] = np.nan
+
+    for bad in [np.inf, -np.inf, 199000.0, -get_max_value(4)]:
+        bad_x = x.copy()
+        bad_x[5, 5] = bad_x[20, 30] = bad_x[30, 10] = bad
+        assert_same_stats(get_neighborhood_stats(bad_x), get_neighborhood_stats(masked))
@@ -0,0 +1,53 @@
+import time
+
+from rsr.fake_batch import FakeBatch, FakeTask, FakeTaskError
+from rsr.scheduler import ExportJob, ExportScheduler, export_to_drive
+
+
+def get_jobs(n):
+    return [ExportJob('fire_' + str(i), lambda i=i: {'description': 'fire_' + str(i)}) for i in range(n)]
+
+
+def test_all_jobs_complete_with_failures():
+    batch = FakeBatch(duration=0.02, concurrency=4, failure_rate=0.3, seed=1)
+    scheduler = ExportScheduler(batch, max_in_flight=4, n_workers=2, poll_interval=0.01, max_retries=10, backoff=0.01)
+
+    results = scheduler.run(get_jobs(20))
+
+    assert all(result.state == 'completed' for result in results.values())
+    assert batch.max_running_at_once <= 4
+
+
+def test_backoff_does_not_hold_a_worker():
+    batch = FakeBatch(duration=0.01)
+    failed = set()
+
+    # Every job fails to start once; with one worker, the backoffs must run at the same time rather
+    # than one after another
+    def export(batch, **kwargs):
+        if kwargs['description'] not in failed:
+            failed.add(kwargs['description'])
+            raise FakeTaskError('Too many tasks already in the queue.')
+        return export_to_drive(batch, **kwargs)
+
+    scheduler = ExportScheduler(batch, n_workers=1, poll_interval=0.01, backoff=0.3, export=export)
+    t = time.monotonic()
+    results = scheduler.run(get_jobs(4))
+
+    assert all(result.state == 'completed' and result.attempts == 2 for result in results.values())
+    assert time.monotonic() - t < 0.6
+
+
+def test_task_missing_from_list_fails():
+    batch = FakeBatch(duration=0.01)
+
+    # Tasks that start but never show up in Task.list()
+    def export(batch, **kwargs):
+        return FakeTask(batch, 'LOST_' + kwargs['description'], kwargs)
+
+    scheduler = ExportScheduler(batch, poll_interval=0.01, max_retries=1, backoff=0.01, max_missing_polls=3,
+                                export=export)
+    results = scheduler.run(get_jobs(2))
+
+    assert [result.state for result in results.values()] == ['failed', 'failed']
+    assert all(result.attempts == 2 for result in results.values())
@@ -0,0 +1,40 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from rsr.bands import BAND_NAMES
+from rsr.sidecar import FireRaster, get_raster_fire
+
+FIRE_ID = '0000000000000000029f'
+
+
+# write_legacy_raster() writes a 50-band float32 raster like those exported from Earth Engine before
+# sidecars and tags: no values outside a patch of pixels, and nothing but the filename to go on
+def write_legacy_raster(directory, n_rows=200, n_cols=150):
+    path = str(directory / ('19870830_00102_' + FIRE_ID + '_epsg3310.tif'))
+    bands = np.full((len(BAND_NAMES), n_rows, n_cols), np.nan, dtype=np.float32)
+    bands[:, 120:180, 40:90] = 0.5
+    for name, value in [('alarm_year', 1987), ('alarm_month', 8), ('alarm_day', 30)]:
+        bands[BAND_NAMES.index(name), 120:180, 40:90] = value
+
+    with rasterio.open(path, 'w', driver='GTiff', height=n_rows, width=n_cols, count=len(BAND_NAMES),
+                       dtype='float32', crs='EPSG:3310', transform=from_origin(-100000, 100000, 30, 30),
+                       nodata=np.nan, tiled=True, blockxsize=32, blockysize=32) as dst:
+        dst.write(bands)
+
+    return path
+
+
+def test_legacy_raster_fire_from_date_bands(tmp_path, monkeypatch):
+    raster = FireRaster(write_legacy_raster(tmp_path))
+    read_bands = []
+    read_stored = raster._read_stored
+
+    def recording_read_stored(names, window=None):
+        read_bands.extend(names)
+        return read_stored(names, window)
+
+    monkeypatch.setattr(raster, '_read_stored', recording_read_stored)
+
+    assert get_raster_fire(raster) == (FIRE_ID, 557280000000)
+    assert set(read_bands) == {'alarm_year', 'alarm_month', 'alarm_day'}
@@ -34,19 +34,10 @@ var mask_cloud_water_snow = function(resample_method)
   // mentioned here: https://groups.google.com/d/msg/google-earth-engine-developers/jB342iaPeX4/KXJYReksDQAJ
   // demonstrated here: https://code.earthengine.google.com/80b35b7e358e94664dc6107e75a4a43a
   return function(img) {
-    // Each pixel gets a 1 if it is NOT a cloud, and a 0 if it IS a cloud
-    var cloudMask = img.select('pixel_qa').bitwiseAnd(32).eq(0);
-    // Each pixel gets a 1 if it is NOT a cloud shadow, and a 0 if it IS a cloud shadow
-    var cloudShadowMask = img.select('pixel_qa').bitwiseAnd(8).eq(0);
-    // Each pixel gets a 1 if it is NOT water, and a 0 if it IS water
-    var waterMask = img.select('pixel_qa').bitwiseAnd(4).eq(0);
-    // Each pixel gets a 1 if it is NOT snow, and a 0 if it IS snow
-    var snowMask = img.select('pixel_qa').bitwiseAnd(16).eq(0);
-    
-    // For the combined mask (1 is a pixel we want to keep, and a 0 is one we want to mask),
-    // the pixel must both NOT be a cloud AND NOT be a cloud shadow (a 1 for both of the
-    // above masks) in order to be a valid pixel.
-    var mask = cloudMask.and(cloudShadowMask).and(waterMask).and(snowMask);
+    // A pixel we want to keep (a 1 in the mask) is NOT a cloud (32) AND NOT a cloud shadow (8)
+    // AND NOT water (4) AND NOT snow (16): none of those bits of pixel_qa are set, which one
+    // bitwiseAnd() with all of them (32 + 8 + 4 + 16 = 60) tells us
+    var mask = img.select('pixel_qa').bitwiseAnd(60).eq(0);
     
     // Return an interpolated image with all cloud and cloud shadow pixels masked.
     // Use interpolation because CBI on-the-ground plots are unlikely to